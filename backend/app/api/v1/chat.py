@@ -1,12 +1,14 @@
 # backend/app/api/v1/chat.py
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
 import logging
+from pathlib import Path
 from typing import Optional
 
 from app.core.character_chat_service import get_character_chat_service
 from app.core.rag_agent import RAGAgent
-from app.models.characters import get_character_by_id
+from app.models.characters import CHARACTER_VOICE_NAMES, get_character_by_id
 
 # Cấu hình logger
 logger = logging.getLogger(__name__)
@@ -67,22 +69,27 @@ class StartConversationResponse(BaseModel):
     session_id: str
     character_id: str
     character_name: str
+    greeting_audio_url: str | None = None  # Audio sinh sẵn của lời chào (greeting bank)
+    follow_ups: list = []                  # [{"text": ..., "audio_url": ...}]
 
 # --- Helper Functions ---
 
 def get_character_id_from_name(character_name: str) -> str:
     """Convert character name to character ID"""
-    name_to_id = {
-        "gia_cat_luong": "zhuge_liang",
-        "zhuge_liang": "zhuge_liang",
-        "tu_ma_y": "sima_yi", 
-        "sima_yi": "sima_yi"
-    }
+    # Nhận cả character_id lẫn tên voice TTS của nhân vật
+    name_to_id = {character_id: character_id for character_id in CHARACTER_VOICE_NAMES}
+    name_to_id.update({voice: character_id for character_id, voice in CHARACTER_VOICE_NAMES.items()})
     
     # Normalize name
     normalized_name = character_name.lower().replace(" ", "_")
     return name_to_id.get(normalized_name, "zhuge_liang")  # Default to Zhuge Liang
 
+def get_greeting_audio_url(character_id: str, audio_path: Optional[str]) -> Optional[str]:
+    """URL tải audio sinh sẵn của greeting bank (None nếu không có audio)"""
+    if not audio_path:
+        return None
+    return f"/api/v1/chat/greeting-audio/{character_id}/{Path(audio_path).name}"
+
 # --- API Endpoints ---
 
 @router.post("/start", response_model=StartConversationResponse)
@@ -100,7 +107,7 @@ async def start_conversation(request: StartConversationRequest):
             raise HTTPException(status_code=404, detail=f"Character not found: {request.character_name}")
         
         # Start conversation
-        success, greeting, session_id = chat_service.start_conversation(
+        success, greeting, session_id, media = chat_service.start_conversation(
             character_id=character_id,
             session_id=request.session_id
         )
@@ -114,7 +121,12 @@ async def start_conversation(request: StartConversationRequest):
             greeting=greeting,
             session_id=session_id,
             character_id=character_id,
-            character_name=character.name
+            character_name=character.name,
+            greeting_audio_url=get_greeting_audio_url(character_id, media["audio_path"]),
+            follow_ups=[
+                {"text": item["text"], "audio_url": get_greeting_audio_url(character_id, item["audio_path"])}
+                for item in media["follow_ups"]
+            ]
         )
         
     except HTTPException:
@@ -123,6 +135,16 @@ async def start_conversation(request: StartConversationRequest):
         logger.error(f"Error starting conversation: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal error starting conversation")
 
+@router.get("/greeting-audio/{character_id}/{filename}")
+async def get_greeting_audio(character_id: str, filename: str):
+    """
+    Audio sinh sẵn của lời chào / câu hỏi follow-up (URL trả về trong /start)
+    """
+    audio_path = get_rag_enabled_chat_service().greeting_bank.get_audio_path(character_id, filename)
+    if audio_path is None:
+        raise HTTPException(status_code=404, detail="Greeting audio not found")
+    return FileResponse(path=str(audio_path), media_type="audio/wav", filename=filename)
+
 @router.post("/", response_model=ChatResponse)
 async def handle_chat_message(request: ChatRequest):
     """
@@ -143,7 +165,7 @@ async def handle_chat_message(request: ChatRequest):
         # Ensure session exists
         if not request.session_id:
             # Start new conversation if no session
-            success, greeting, session_id = chat_service.start_conversation(character_id)
+            success, greeting, session_id, _ = chat_service.start_conversation(character_id)
             if not success:
                 raise HTTPException(status_code=500, detail="Failed to create session")
         else:
@@ -4,14 +4,17 @@ Optimized TTS API endpoints cho production frontend
 Sử dụng singleton service với caching và async support
 """
 import asyncio
+import itertools
 import logging
 from typing import Dict, List, Optional
 from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
+import numpy as np
 import time
 
 from ...core.tts_service_singleton import get_tts_service
+from ...core.tts_scheduler import TTSQueueFullError
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +28,8 @@ class TTSRequest(BaseModel):
     speed: float = Field(default=1.0, ge=0.5, le=2.0, description="Speech speed multiplier")
     temperature: float = Field(default=0.7, ge=0.1, le=1.0, description="Voice variation")
     use_cache: bool = Field(default=True, description="Use audio cache if available")
+    seed: Optional[int] = Field(default=None, ge=-1, description="Noise seed (None = default seed, -1 = random)")
+    preset: Optional[str] = Field(default=None, description="Sampler preset: fast, balanced, quality, adaptive")
 
 class TTSBatchRequest(BaseModel):
     """Batch TTS synthesis request"""
@@ -39,6 +44,7 @@ class TTSResponse(BaseModel):
     inference_time_seconds: Optional[float] = None
     cache_hit: Optional[bool] = None
     character_used: Optional[str] = None
+    seed: Optional[int] = None
 
 class ServiceStats(BaseModel):
     """Service statistics"""
@@ -49,7 +55,11 @@ class ServiceStats(BaseModel):
     average_inference_time: float
     cached_models: int
     cached_audio_files: int
+    audio_cache: Optional[Dict] = None
+    coalesced_requests: int = 0
+    scheduler: Optional[Dict] = None
     device: str
+    compiled: bool = False
     base_model_loaded: bool
 
 class HealthCheck(BaseModel):
@@ -59,11 +69,51 @@ class HealthCheck(BaseModel):
     uptime: Optional[float] = None
     message: Optional[str] = None
 
+class TrailerStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse gửi thêm HTTP trailers sau body (ASGI extension "http.response.trailers")
+    Server không hỗ trợ trailers thì trả về như StreamingResponse thường
+    """
+    
+    def __init__(self, content, trailers_fn, **kwargs):
+        super().__init__(content, **kwargs)
+        self.trailers_fn = trailers_fn
+    
+    async def __call__(self, scope, receive, send):
+        if "http.response.trailers" not in scope.get("extensions", {}):
+            await super().__call__(scope, receive, send)
+            return
+        
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+            "trailers": True
+        })
+        async for chunk in self.body_iterator:
+            if not isinstance(chunk, bytes):
+                chunk = chunk.encode(self.charset)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+        await send({
+            "type": "http.response.trailers",
+            "headers": [(k.lower().encode(), str(v).encode()) for k, v in self.trailers_fn().items()],
+            "more_trailers": False
+        })
+
 # Dependency injection
 async def get_service():
     """Dependency to get TTS service"""
     return get_tts_service()
 
+def _check_preset(service, preset: Optional[str]):
+    """Preset không hợp lệ là lỗi của client (400), kiểm tra trước khi synthesize"""
+    if preset is not None and preset not in service.config.SAMPLER_PRESETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown preset '{preset}', available: {', '.join(service.config.SAMPLER_PRESETS)}"
+        )
+
 @router.post("/synthesize", response_model=TTSResponse)
 async def synthesize_speech(
     request: TTSRequest,
@@ -74,6 +124,7 @@ async def synthesize_speech(
     Synthesize speech từ text với character voice
     """
     start_time = time.time()
+    _check_preset(service, request.preset)
     
     try:
         logger.info(f"🎤 TTS request: {request.character} - {request.text[:50]}...")
@@ -85,20 +136,23 @@ async def synthesize_speech(
             request.character = "gia_cat_luong"
         
         # Synthesize speech
-        audio_bytes = await service.synthesize_speech_async(
+        seed = service.resolve_seed(request.seed)
+        audio_bytes, cache_tier = await service.synthesize_with_cache_info_async(
             text=request.text,
             character=request.character,
             speed=request.speed,
-            temperature=request.temperature
+            temperature=request.temperature,
+            use_cache=request.use_cache,
+            seed=seed,
+            preset=request.preset
         )
         
         # Calculate audio length
         import io
         import soundfile as sf
         
-        buffer = io.BytesIO(audio_bytes)
-        data, sample_rate = sf.read(buffer)
-        audio_length = len(data) / sample_rate
+        # Chỉ đọc header WAV, không decode lại toàn bộ audio
+        audio_length = sf.info(io.BytesIO(audio_bytes)).duration
         
         inference_time = time.time() - start_time
         
@@ -119,10 +173,19 @@ async def synthesize_speech(
                 "X-Audio-Length": str(audio_length),
                 "X-Inference-Time": str(inference_time),
                 "X-Character": request.character,
-                "X-Cache-Hit": "false"  # TODO: Implement cache hit detection
+                "X-Cache-Hit": "true" if cache_tier else "false",
+                "X-Cache-Tier": cache_tier or "none",
+                "X-Seed": str(seed)
             }
         )
         
+    except TTSQueueFullError as e:
+        logger.warning(f"⚠️ TTS queue full: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
         logger.error(f"❌ TTS synthesis failed: {e}")
         raise HTTPException(
@@ -140,6 +203,7 @@ async def synthesize_speech_json(
     Synthesize speech và return JSON response với base64 audio
     """
     start_time = time.time()
+    _check_preset(service, request.preset)
     
     try:
         logger.info(f"🎤 TTS JSON request: {request.character} - {request.text[:50]}...")
@@ -151,11 +215,15 @@ async def synthesize_speech_json(
             request.character = "gia_cat_luong"
         
         # Synthesize speech
-        audio_bytes = await service.synthesize_speech_async(
+        seed = service.resolve_seed(request.seed)
+        audio_bytes, cache_tier = await service.synthesize_with_cache_info_async(
             text=request.text,
             character=request.character,
             speed=request.speed,
-            temperature=request.temperature
+            temperature=request.temperature,
+            use_cache=request.use_cache,
+            seed=seed,
+            preset=request.preset
         )
         
         # Calculate audio length
@@ -163,9 +231,8 @@ async def synthesize_speech_json(
         import soundfile as sf
         import base64
         
-        buffer = io.BytesIO(audio_bytes)
-        data, sample_rate = sf.read(buffer)
-        audio_length = len(data) / sample_rate
+        # Chỉ đọc header WAV, không decode lại toàn bộ audio
+        audio_length = sf.info(io.BytesIO(audio_bytes)).duration
         
         inference_time = time.time() - start_time
         
@@ -187,8 +254,9 @@ async def synthesize_speech_json(
             "audio_base64": audio_b64,
             "audio_length_seconds": audio_length,
             "inference_time_seconds": inference_time,
-            "cache_hit": False,  # TODO: Implement cache hit detection
-            "character_used": request.character
+            "cache_hit": cache_tier is not None,
+            "character_used": request.character,
+            "seed": seed
         }
         
     except Exception as e:
@@ -203,6 +271,81 @@ async def synthesize_speech_json(
             "character_used": request.character
         }
 
+@router.post("/stream")
+async def stream_speech(
+    request: TTSRequest,
+    service = Depends(get_service)
+):
+    """
+    Streaming synthesis: trả về PCM16 mono theo từng chunk ngay khi chunk được vocode
+    Thời lượng và thời gian xử lý được gửi trong HTTP trailers khi server hỗ trợ
+    """
+    start_time = time.time()
+    _check_preset(service, request.preset)
+    logger.info(f"🎤 TTS stream request: {request.character} - {request.text[:50]}...")
+    
+    available_chars = service.get_available_characters()
+    if request.character not in available_chars:
+        logger.warning(f"⚠️ Character '{request.character}' not found, using default")
+        request.character = "gia_cat_luong"
+    
+    seed = service.resolve_seed(request.seed)
+    sample_rate = service.config.TARGET_SAMPLE_RATE
+    waves = service.synthesize_stream(
+        request.text,
+        request.character,
+        use_cache=request.use_cache,
+        speed=request.speed,
+        seed=seed,
+        preset=request.preset
+    )
+    
+    # Chạy tới chunk đầu tiên trước khi gửi header, để lỗi (queue đầy, model lỗi) vẫn trả được status code
+    try:
+        first_wave = await asyncio.get_event_loop().run_in_executor(None, next, waves)
+    except TTSQueueFullError as e:
+        logger.warning(f"⚠️ TTS queue full: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.error(f"❌ TTS stream failed: {e}")
+        raise HTTPException(status_code=500, detail=f"TTS synthesis failed: {str(e)}")
+    
+    timing = {"first_chunk_time": time.time() - start_time, "samples": 0}
+    
+    def pcm_chunks():
+        for wave in itertools.chain([first_wave], waves):
+            if len(wave) == 0:
+                continue
+            timing["samples"] += len(wave)
+            yield (np.clip(wave, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+        
+        timing["inference_time"] = time.time() - start_time
+        logger.info(
+            f"📊 TTS stream {request.character}: first chunk {timing['first_chunk_time']:.2f}s, "
+            f"total {timing['inference_time']:.2f}s, audio {timing['samples'] / sample_rate:.2f}s"
+        )
+    
+    def trailers():
+        return {
+            "X-Audio-Length": timing["samples"] / sample_rate,
+            "X-Inference-Time": timing.get("inference_time", time.time() - start_time),
+            "X-First-Chunk-Time": timing["first_chunk_time"]
+        }
+    
+    return TrailerStreamingResponse(
+        pcm_chunks(),
+        trailers_fn=trailers,
+        media_type=f"audio/L16;rate={sample_rate};channels=1",
+        headers={
+            "X-Sample-Rate": str(sample_rate),
+            "X-Channels": "1",
+            "X-Sample-Format": "s16le",
+            "X-Character": request.character,
+            "X-Seed": str(seed),
+            "Trailer": "X-Audio-Length, X-Inference-Time, X-First-Chunk-Time"
+        }
+    )
+
 @router.post("/synthesize-batch")
 async def synthesize_batch(
     request: TTSBatchRequest,
@@ -225,7 +368,9 @@ async def synthesize_batch(
                     text=req.text,
                     character=req.character,
                     speed=req.speed,
-                    temperature=req.temperature
+                    temperature=req.temperature,
+                    seed=req.seed,
+                    preset=req.preset
                 )
                 for req in request.requests
             ]
@@ -257,7 +402,9 @@ async def synthesize_batch(
                         text=req.text,
                         character=req.character,
                         speed=req.speed,
-                        temperature=req.temperature
+                        temperature=req.temperature,
+                        seed=req.seed,
+                        preset=req.preset
                     )
                     
                     import base64
@@ -6,12 +6,24 @@ Xây dựng prompt có cấu trúc rõ ràng và roleplay tốt hơn
 """
 
 import re
-from typing import Dict, List, Optional, Any, Tuple
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Any, Tuple
 from datetime import datetime
 
 from app.models.characters import Character, CharacterType
 
 
+@dataclass
+class CompiledCharacterPrompt:
+    """Phần prompt cố định của một nhân vật, biên dịch một lần và dùng lại mọi turn"""
+    
+    system_prompt: str
+    prefix: str                  # Khối system theo ChatML, byte-identical giữa các turn (cho KV-prefix reuse)
+    instruction_block: str       # Khối yêu cầu cuối user prompt
+    token_ids: Optional[List[int]] = None  # Token ids của prefix (ChatAI.chat nhận qua prefix_token_ids), tính lazy
+
+
 class QwenPromptBuilder:
     """
     Prompt Builder chuyên biệt cho Qwen2.5-Instruct
@@ -22,6 +34,10 @@ class QwenPromptBuilder:
         self.character_personas = self._load_character_personas()
         self.response_templates = self._load_response_templates()
         self.instruction_prompts = self._load_instruction_prompts()
+        
+        # Cache prompt đã biên dịch theo nhân vật; chỉ bị xóa khi persona/template thay đổi
+        self._compiled: Dict[Tuple[str, str, str], CompiledCharacterPrompt] = {}
+        self._compiled_lock = threading.Lock()
     
     def _load_character_personas(self) -> Dict[str, Dict[str, str]]:
         """Load chi tiết persona cho từng nhân vật"""
@@ -193,8 +209,8 @@ TUYỆT ĐỐI TRÁNH:
 - Không lặp lại y hệt những gì đã nói"""
         }
     
-    def build_system_prompt(self, character: Character) -> str:
-        """Xây dựng system prompt cho nhân vật (optimized)"""
+    def _compile(self, character: Character) -> CompiledCharacterPrompt:
+        """Biên dịch phần prompt cố định của nhân vật"""
         persona = self.character_personas.get(character.id, {})
         
         if not persona:
@@ -203,24 +219,89 @@ TUYỆT ĐỐI TRÁNH:
         else:
             identity = persona.get("identity", f"Tôi là {character.name}")
         
-        return self.instruction_prompts["system_base"].format(
+        system_prompt = self.instruction_prompts["system_base"].format(
             character_name=character.name,
             character_identity=identity
         )
+        instruction_block = f"""Hãy trả lời như {character.name} với các yêu cầu TUYỆT ĐỐI:
+- BẮT ĐẦU bằng "Thưa chủ công"
+- Gọi người hỏi là "chủ công" ít nhất 2 lần
+- Tự xưng là "thần" ít nhất 1 lần  
+- Đưa ra lời khuyên thiết thực từ 300-600 từ
+- KẾT THÚC hoàn chỉnh, không bị cắt giữa chừng"""
+        
+        return CompiledCharacterPrompt(
+            system_prompt=system_prompt,
+            prefix=f"<|im_start|>system\n{system_prompt}<|im_end|>\n",
+            instruction_block=instruction_block
+        )
+    
+    def get_compiled_prompt(self, character: Character) -> CompiledCharacterPrompt:
+        """Lấy prompt đã biên dịch của nhân vật (biên dịch lazy ở lần gọi đầu)"""
+        key = (character.id, character.name, character.description)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            with self._compiled_lock:
+                compiled = self._compiled.get(key)
+                if compiled is None:
+                    compiled = self._compile(character)
+                    self._compiled[key] = compiled
+        return compiled
+    
+    def get_prefix_token_ids(self, character: Character, tokenize_fn: Callable[[str], List[int]]) -> List[int]:
+        """Token ids của prefix system (tokenize một lần, cache cùng prompt đã biên dịch)"""
+        compiled = self.get_compiled_prompt(character)
+        if compiled.token_ids is None:
+            compiled.token_ids = list(tokenize_fn(compiled.prefix))
+        return compiled.token_ids
+    
+    def invalidate_compiled_prompts(self, character_id: Optional[str] = None):
+        """Xóa cache prompt đã biên dịch (của một nhân vật hoặc toàn bộ)"""
+        with self._compiled_lock:
+            if character_id is None:
+                self._compiled.clear()
+            else:
+                for key in [k for k in self._compiled if k[0] == character_id]:
+                    del self._compiled[key]
+    
+    def update_persona(self, character_id: str, persona: Dict[str, Any]):
+        """Cập nhật persona của nhân vật và biên dịch lại prompt ở lần dùng kế tiếp"""
+        self.character_personas[character_id] = persona
+        self.invalidate_compiled_prompts(character_id)
+    
+    def build_system_prompt(self, character: Character) -> str:
+        """Xây dựng system prompt cho nhân vật (cached)"""
+        return self.get_compiled_prompt(character).system_prompt
     
     def build_user_prompt(
         self,
         character: Character,
         user_question: str,
         relevant_contexts: List[Dict[str, Any]] = None,
-        conversation_history: List[Dict[str, str]] = None
+        conversation_history: List[Dict[str, str]] = None,
+        conversation_summary: Optional[str] = None
     ) -> str:
-        """Xây dựng user prompt với context (optimized for token limit)"""
+        """
+        Xây dựng user prompt với context (optimized for token limit)
+        Nếu có conversation_summary (từ ContextCompressor), conversation_history được coi là
+        các turn đã chọn lọc/nén và được đưa vào đầy đủ.
+        """
         
         prompt_parts = []
         
-        # 1. Ngữ cảnh cuộc trò chuyện (chỉ 1 turn gần nhất)
-        if conversation_history and len(conversation_history) > 0:
+        # 1. Ngữ cảnh cuộc trò chuyện
+        if conversation_summary is not None:
+            if conversation_summary:
+                prompt_parts.append(f"Tóm tắt cuộc trò chuyện: {conversation_summary}")
+            if conversation_history:
+                prompt_parts.append("Các lượt trước có liên quan:")
+                for turn in conversation_history:
+                    prompt_parts.append(f"- Chủ công hỏi: {turn['user']}")
+                    prompt_parts.append(f"  Thần đã khuyên: {turn['assistant']}")
+            if conversation_summary or conversation_history:
+                prompt_parts.append("")
+        elif conversation_history and len(conversation_history) > 0:
+            # Chỉ 1 turn gần nhất
             last_turn = conversation_history[-1]
             if last_turn.get('user'):
                 prompt_parts.append(f"Trước đó chủ công hỏi: {last_turn['user'][:150]}...")
@@ -243,12 +324,7 @@ TUYỆT ĐỐI TRÁNH:
         # 3. Câu hỏi và yêu cầu
         prompt_parts.append(f"Câu hỏi: {user_question}")
         prompt_parts.append("")
-        prompt_parts.append(f"""Hãy trả lời như {character.name} với các yêu cầu TUYỆT ĐỐI:
-- BẮT ĐẦU bằng "Thưa chủ công"
-- Gọi người hỏi là "chủ công" ít nhất 2 lần
-- Tự xưng là "thần" ít nhất 1 lần  
-- Đưa ra lời khuyên thiết thực từ 300-600 từ
-- KẾT THÚC hoàn chỉnh, không bị cắt giữa chừng""")
+        prompt_parts.append(self.get_compiled_prompt(character).instruction_block)
         
         return "\n".join(prompt_parts)
     
@@ -139,11 +139,29 @@ class ChatAI:
         formatted += "<|im_start|>assistant\n"
         return formatted
     
+    def _prompt_with_prefix(self, prompt: str, system_prompt: Optional[str], prefix_token_ids: Optional[List[int]]):
+        """
+        Ghép token ids của khối system đã tokenize sẵn với phần còn lại của prompt.
+        Khối system kết thúc trước special token nên tách đôi cho cùng kết quả với tokenize cả prompt;
+        llama.cpp giữ KV của phần token trùng với lần eval trước. Prefix không khớp thì trả lại prompt gốc.
+        """
+        if not prefix_token_ids or not system_prompt:
+            return prompt
+        system_block = f"<|im_start|>system\n{system_prompt}<|im_end|>\n"
+        if not prompt.startswith(system_block):
+            return prompt
+        rest = prompt[len(system_block):]
+        return list(prefix_token_ids) + self.model.tokenize(rest.encode("utf-8"), add_bos=False, special=True)
+    
     def chat(self, 
              user_message: str, 
              system_prompt: Optional[str] = None,
-             reset_history: bool = False) -> str:
-        """Chat with the AI model"""
+             reset_history: bool = False,
+             prefix_token_ids: Optional[List[int]] = None) -> str:
+        """
+        Chat with the AI model
+        prefix_token_ids: token ids của khối system (QwenPromptBuilder.get_prefix_token_ids), bỏ qua tokenize lại
+        """
         
         if not self.is_loaded:
             if not self.load_model():
@@ -185,7 +203,7 @@ class ChatAI:
                 
                 # Generate response
                 response = self.model.create_completion(
-                    prompt=prompt,
+                    prompt=self._prompt_with_prefix(prompt, system_prompt, prefix_token_ids),
                     max_tokens=self.config.max_tokens,
                     temperature=self.config.temperature,
                     top_p=self.config.top_p,
@@ -207,6 +225,38 @@ class ChatAI:
             logger.error(f"Chat generation failed: {e}")
             return f"Lỗi khi tạo phản hồi: {str(e)}"
     
+    def complete(self,
+                 user_message: str,
+                 system_prompt: Optional[str] = None,
+                 max_tokens: Optional[int] = None,
+                 temperature: Optional[float] = None,
+                 prefix_token_ids: Optional[List[int]] = None) -> str:
+        """Sinh phản hồi một lượt, không đọc/ghi conversation_history (dùng cho tác vụ phụ như tóm tắt)"""
+        
+        if not self.is_loaded:
+            if not self.load_model():
+                raise RuntimeError("Không thể tải model AI")
+        
+        messages = []
+        if system_prompt:
+            messages.append(ChatMessage("system", system_prompt, time.time()))
+        messages.append(ChatMessage("user", user_message, time.time()))
+        prompt = self._format_conversation(messages)
+        
+        with self._lock:
+            response = self.model.create_completion(
+                prompt=self._prompt_with_prefix(prompt, system_prompt, prefix_token_ids),
+                max_tokens=max_tokens or self.config.max_tokens,
+                temperature=self.config.temperature if temperature is None else temperature,
+                top_p=self.config.top_p,
+                top_k=self.config.top_k,
+                repeat_penalty=self.config.repeat_penalty,
+                stop=["<|im_end|>", "<|im_start|>"],
+                stream=False
+            )
+        
+        return response['choices'][0]['text'].strip()
+    
     def chat_stream(self, 
                    user_message: str, 
                    system_prompt: Optional[str] = None,
@@ -266,6 +316,16 @@ class ChatAI:
             logger.error(f"Stream chat generation failed: {e}")
             yield f"Lỗi khi tạo phản hồi: {str(e)}"
     
+    def tokenize(self, text: str, add_bos: bool = True) -> List[int]:
+        """
+        Tokenize text (giữ special tokens ChatML), dùng để cache token ids của prompt prefix.
+        add_bos=True: tokenize như create_completion làm với đầu prompt (BOS chỉ thêm nếu model yêu cầu)
+        """
+        if not self.is_loaded:
+            if not self.load_model():
+                raise RuntimeError("Không thể tải model AI")
+        return self.model.tokenize(text.encode("utf-8"), add_bos=add_bos, special=True)
+    
     def clear_history(self):
         """Clear conversation history"""
         with self._lock:
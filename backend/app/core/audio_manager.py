@@ -29,6 +29,10 @@ class AudioManager:
         
         self._load_existing_voices()
     
+    def _transcript_store(self, character_name: str) -> str:
+        """Transcript ASR của audio tham chiếu lưu tại data/voices/<character>/transcripts.json"""
+        return str(self.voices_dir / character_name / "transcripts.json")
+    
     def _load_existing_voices(self):
         """
         Tải các giọng nói từ cả audio_samples (legacy) và voices directory (new structure).
@@ -41,7 +45,9 @@ class AudioManager:
             for audio_path in audio_files:
                 try:
                     character_name = audio_path.stem
-                    self.tts_service.add_character_voice(character_name, str(audio_path))
+                    self.tts_service.add_character_voice(
+                        character_name, str(audio_path), transcript_store=self._transcript_store(character_name)
+                    )
                     logger.info(f"Loaded legacy voice: {character_name}")
                 except Exception as e:
                     logger.error(f"Lỗi khi tải giọng nói từ {audio_path}: {e}")
@@ -70,7 +76,9 @@ class AudioManager:
                                 ref_audio_path = character_dir / first_sample
                             
                             if ref_audio_path and ref_audio_path.exists():
-                                self.tts_service.add_character_voice(character_name, str(ref_audio_path))
+                                self.tts_service.add_character_voice(
+                                    character_name, str(ref_audio_path), transcript_store=self._transcript_store(character_name)
+                                )
                                 logger.info(f"Loaded voice from metadata: {character_name} -> {ref_audio_path.name}")
                             else:
                                 logger.warning(f"No reference audio found for {character_name}")
@@ -79,7 +87,9 @@ class AudioManager:
                             audio_files = list(character_dir.glob("*.wav"))
                             if audio_files:
                                 ref_audio_path = audio_files[0]
-                                self.tts_service.add_character_voice(character_name, str(ref_audio_path))
+                                self.tts_service.add_character_voice(
+                                    character_name, str(ref_audio_path), transcript_store=self._transcript_store(character_name)
+                                )
                                 logger.info(f"Loaded voice (fallback): {character_name} -> {ref_audio_path.name}")
                     
                     except Exception as e:
@@ -116,7 +126,9 @@ class AudioManager:
             )
 
             # 3. Thêm giọng nói mới vào TTS service để sẵn sàng sử dụng
-            self.tts_service.add_character_voice(character_name, str(permanent_audio_path))
+            self.tts_service.add_character_voice(
+                character_name, str(permanent_audio_path), transcript_store=self._transcript_store(character_name)
+            )
             
             result = {
                 'status': 'success',
@@ -10,10 +10,14 @@ from typing import Optional, Dict, Any, List, Tuple
 import asyncio
 from datetime import datetime
 
-from app.models.characters import Character, get_character_by_id
+from app.models.characters import Character, get_character_by_id, get_all_characters
 from app.core.ai_models import get_chat_ai, ModelConfig
 from app.core.advanced_prompt_builder import get_qwen_prompt_builder
 from app.core.rag_agent import RAGAgent
+from app.core.enhanced_config import get_enhanced_config
+from app.core.session_store import SessionStore, create_session_store
+from app.core.greeting_bank import GreetingBank, create_tts_synthesize_fn
+from app.utils.context_compression import ContextCompressor
 
 logger = logging.getLogger(__name__)
 
@@ -21,48 +25,138 @@ logger = logging.getLogger(__name__)
 class CharacterChatService:
     """Service quản lý chat với nhân vật lịch sử"""
     
-    def __init__(self, rag_agent: Optional[RAGAgent] = None):
+    def __init__(self, rag_agent: Optional[RAGAgent] = None, session_store: Optional[SessionStore] = None):
         self.chat_ai = get_chat_ai()
         self.prompt_builder = get_qwen_prompt_builder()  # Sử dụng trực tiếp QwenPromptBuilder
         self.rag_agent = rag_agent
-        self.conversation_sessions: Dict[str, List[Dict[str, Any]]] = {}
+        # Session store có giới hạn (LRU/TTL/turn cap) thay cho dict không giới hạn
+        # (so sánh với None: store rỗng có __len__ == 0 nên bị coi là falsy)
+        self.session_store = (
+            session_store if session_store is not None
+            else create_session_store(get_enhanced_config().session_config)
+        )
+        self.context_compressor = self._create_context_compressor()
+        self.greeting_bank = self._create_greeting_bank()
+        self._available_characters: Optional[List[Dict[str, Any]]] = None
         
         # Đảm bảo model được load
         if not self.chat_ai.is_loaded:
             logger.info("Loading AI model for character chat...")
             self.chat_ai.load_model()
+        
+        # Biên dịch sẵn prompt prefix của các nhân vật (system prompt + token ids)
+        self._warm_prompt_prefixes()
+        
+        # Load lời chào sinh sẵn; chỉ sinh lại trong server khi bật rõ ràng (mặc định sinh offline bằng CLI)
+        self._load_greeting_bank()
+    
+    def _create_context_compressor(self) -> ContextCompressor:
+        """Khởi tạo context compressor, dùng embedding model của RAG nếu có"""
+        roleplay_config = get_enhanced_config().roleplay_config
+        embed_fn = None
+        if self.rag_agent is not None and getattr(self.rag_agent, "embedding_model", None) is not None:
+            embed_fn = self.rag_agent.embedding_model.encode
+        
+        # ChatAI là model dùng chung với chat: tóm tắt bằng LLM sẽ giữ lock và chặn reply của user
+        method = roleplay_config.summary_method
+        if method == "llm" and not roleplay_config.summary_allow_shared_llm:
+            logger.info("Summary method 'llm' shares the chat model, using extractive summaries "
+                        "(set SUMMARY_ALLOW_SHARED_LLM=true to override)")
+            method = "extractive"
+        
+        return ContextCompressor(
+            embed_fn=embed_fn,
+            chat_ai=self.chat_ai,
+            method=method,
+            summary_max_tokens=roleplay_config.summary_max_tokens,
+            max_summary_chars=roleplay_config.max_summary_chars,
+            history_token_budget=roleplay_config.history_token_budget,
+            max_sessions=get_enhanced_config().session_config.max_sessions,
+            session_store=self.session_store
+        )
+    
+    def _warm_prompt_prefixes(self):
+        """Biên dịch prompt prefix cho mọi nhân vật để turn đầu tiên không phải format/tokenize"""
+        for character in get_all_characters().values():
+            token_ids = self._prefix_token_ids(character)
+            if token_ids is not None:
+                logger.info(f"Compiled prompt prefix for {character.name}: {len(token_ids)} tokens")
+    
+    def _prefix_token_ids(self, character: Character) -> Optional[List[int]]:
+        """Token ids đã cache của khối system (truyền cho ChatAI); lỗi tokenize thì để ChatAI tự tokenize"""
+        try:
+            return self.prompt_builder.get_prefix_token_ids(character, self.chat_ai.tokenize)
+        except Exception as e:
+            logger.warning(f"Failed to compile prompt prefix for {character.id}: {e}")
+            return None
+    
+    def _load_greeting_bank(self):
+        """Load greeting bank từ đĩa, sinh lại ở background nếu bật greeting_bank_build_on_startup"""
+        if get_enhanced_config().roleplay_config.greeting_bank_build_on_startup:
+            self.greeting_bank.refresh_async()
+            return
+        stale = self.greeting_bank.load_all()
+        if stale:
+            logger.warning(
+                f"Greeting bank missing or outdated for {', '.join(c.id for c in stale)}; "
+                "run scripts/setup/build_greeting_bank.py (or set GREETING_BANK_BUILD_ON_STARTUP=true)"
+            )
+    
+    def _create_greeting_bank(self) -> GreetingBank:
+        """Khởi tạo greeting bank theo cấu hình roleplay"""
+        roleplay_config = get_enhanced_config().roleplay_config
+        return GreetingBank(
+            chat_ai=self.chat_ai,
+            prompt_builder=self.prompt_builder,
+            bank_size=roleplay_config.greeting_bank_size,
+            synthesize_fn=create_tts_synthesize_fn() if roleplay_config.greeting_bank_with_audio else None
+        )
     
     def start_conversation(
         self, 
         character_id: str, 
         session_id: str = None
-    ) -> Tuple[bool, str, Optional[str]]:
+    ) -> Tuple[bool, str, Optional[str], Dict[str, Any]]:
         """
         Bắt đầu cuộc trò chuyện với nhân vật
-        Returns: (success, response, session_id)
+        Returns: (success, response, session_id, media)
+            media: {"audio_path": audio lời chào sinh sẵn hoặc None,
+                    "follow_ups": [{"text": ..., "audio_path": ...}]}
         """
+        media: Dict[str, Any] = {"audio_path": None, "follow_ups": []}
         character = get_character_by_id(character_id)
         if not character:
-            return False, f"Không tìm thấy nhân vật: {character_id}", None
+            return False, f"Không tìm thấy nhân vật: {character_id}", None, media
         
         if not session_id:
             session_id = f"{character_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
-        # Khởi tạo session mới
-        self.conversation_sessions[session_id] = []
+        # Khởi tạo session mới (ghi đè session cũ cùng id, kể cả tóm tắt)
+        self.session_store.create(session_id, character_id)
+        self.context_compressor.forget(session_id)
         
-        # Tạo lời chào đầu tiên
-        greeting_response = self._generate_greeting(character)
+        # Lấy lời chào sinh sẵn (O(1), không tốn GPU); bank trống thì dùng lời chào mặc định
+        greeting = self.greeting_bank.get_greeting(character_id)
+        if greeting:
+            greeting_response = greeting["text"]
+            media = {
+                "audio_path": greeting["audio_path"],
+                "follow_ups": self.greeting_bank.get_follow_ups(character_id)
+            }
+        else:
+            greeting_response = self._fallback_greeting(character)
+            if get_enhanced_config().roleplay_config.greeting_bank_build_on_startup:
+                self.greeting_bank.refresh_async([character])
         
         # Lưu lại trong session
-        self.conversation_sessions[session_id].append({
+        self.session_store.append_turn(session_id, {
             "type": "greeting",
             "character": character_id,
             "assistant": greeting_response,
             "timestamp": datetime.now().isoformat()
         })
         
-        return True, greeting_response, session_id
+        return True, greeting_response, session_id, media
     
     def chat_with_character(
         self,
@@ -79,7 +173,7 @@ class CharacterChatService:
         if not character:
             return False, f"Không tìm thấy nhân vật: {character_id}", None
         
-        if session_id not in self.conversation_sessions:
+        if not self.session_store.exists(session_id):
             return False, "Session không tồn tại. Vui lòng bắt đầu cuộc trò chuyện mới.", None
         
         try:
@@ -98,8 +192,13 @@ class CharacterChatService:
                 except Exception as e:
                     logger.warning(f"RAG search failed: {e}, continuing without context")
             
-            # 2. Lấy lịch sử cuộc trò chuyện
-            conversation_history = self._get_conversation_history(session_id)
+            # 2. Lấy lịch sử cuộc trò chuyện đã nén: tóm tắt cuộn + các turn liên quan nhất
+            conversation_history = self.context_compressor.select_history(
+                session_id,
+                user_message,
+                self._get_conversation_history(session_id, max_turns=None)
+            )
+            conversation_summary = self.context_compressor.get_summary(session_id)
             
             # 3. Xây dựng prompt với advanced builder
             system_prompt = self.prompt_builder.build_system_prompt(character)
@@ -107,7 +206,8 @@ class CharacterChatService:
                 character,
                 user_message,
                 relevant_contexts,
-                conversation_history
+                conversation_history,
+                conversation_summary=conversation_summary
             )
             
             logger.info(f"Generated prompts - System: {len(system_prompt)} chars, User: {len(user_prompt)} chars")
@@ -116,7 +216,8 @@ class CharacterChatService:
             response = self.chat_ai.chat(
                 user_message=user_prompt,
                 system_prompt=system_prompt,
-                reset_history=False  # Giữ context trong session
+                reset_history=True,  # Context đã nằm trong prompt (tóm tắt + lịch sử chọn lọc)
+                prefix_token_ids=self._prefix_token_ids(character)
             )
             
             # 5. Validate và enhance response
@@ -127,7 +228,7 @@ class CharacterChatService:
                 logger.warning(f"Response validation issues: {issues}")
             
             # 6. Lưu vào session
-            self.conversation_sessions[session_id].append({
+            conversation_length = self.session_store.append_turn(session_id, {
                 "user": user_message,
                 "assistant": enhanced_response,
                 "contexts_used": len(relevant_contexts),
@@ -135,12 +236,15 @@ class CharacterChatService:
                 "timestamp": datetime.now().isoformat()
             })
             
+            # Cập nhật tóm tắt cuộn ở background
+            self.context_compressor.update_async(session_id, user_message, enhanced_response)
+            
             # 7. Tạo metadata
             metadata = {
                 "character_id": character_id,
                 "session_id": session_id,
                 "contexts_used": len(relevant_contexts),
-                "conversation_length": len(self.conversation_sessions[session_id]),
+                "conversation_length": conversation_length,
                 "response_valid": is_valid,
                 "follow_up_questions": self.prompt_builder.build_follow_up_questions(character, enhanced_response)
             }
@@ -151,91 +255,77 @@ class CharacterChatService:
             logger.error(f"Chat with character failed: {e}")
             return False, f"Lỗi khi trò chuyện với {character.name}: {str(e)}", None
     
-    def _generate_greeting(self, character: Character) -> str:
-        """Tạo lời chào đầu tiên từ nhân vật"""
-        system_prompt = self.prompt_builder.build_system_prompt(character)
-        greeting_prompt = f"""Hãy tự giới thiệu bản thân như {character.name} và chào đón chủ công. 
-Giới thiệu ngắn gọn về bản thân và sẵn sàng tư vấn."""
-        
-        try:
-            response = self.chat_ai.chat(
-                user_message=greeting_prompt,
-                system_prompt=system_prompt,
-                reset_history=True
-            )
-            return self.prompt_builder.enhance_response_with_character_traits(response, character)
-        except Exception as e:
-            logger.error(f"Failed to generate greeting: {e}")
-            return f"Thưa chủ công, tôi là {character.name}. Tôi sẵn sàng tư vấn cho chủ công."
+    def _fallback_greeting(self, character: Character) -> str:
+        """Lời chào mặc định khi chưa có lời chào sinh sẵn"""
+        return f"Thưa chủ công, tôi là {character.name}. Tôi sẵn sàng tư vấn cho chủ công."
     
-    def _get_conversation_history(self, session_id: str, max_turns: int = 3) -> List[Dict[str, str]]:
+    def _get_conversation_history(self, session_id: str, max_turns: Optional[int] = 3) -> List[Dict[str, str]]:
         """Lấy lịch sử cuộc trò chuyện gần nhất"""
-        if session_id not in self.conversation_sessions:
-            return []
-        
         history = []
-        session_data = self.conversation_sessions[session_id]
+        session_data = self.session_store.get_turns(session_id, last_n=max_turns)
         
         # Lấy các turn cuối (bỏ qua greeting)
-        for item in session_data[-max_turns:]:
+        for item in session_data:
             if item.get("type") != "greeting" and "user" in item:
                 history.append({
                     "user": item["user"],
-                    "assistant": item["assistant"]
+                    "assistant": item["assistant"],
+                    "timestamp": item.get("timestamp")
                 })
         
         return history
     
     def get_session_info(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Lấy thông tin session"""
-        if session_id not in self.conversation_sessions:
+        meta = self.session_store.get_meta(session_id)
+        if meta is None:
             return None
         
-        session_data = self.conversation_sessions[session_id]
-        
         return {
             "session_id": session_id,
-            "total_messages": len(session_data),
-            "character_id": session_data[0].get("character") if session_data else None,
-            "created_at": session_data[0].get("timestamp") if session_data else None,
-            "last_activity": session_data[-1].get("timestamp") if session_data else None
+            "total_messages": meta["total_turns"],
+            "stored_messages": meta["stored_turns"],
+            "character_id": meta["character_id"],
+            "created_at": datetime.fromtimestamp(meta["created_at"]).isoformat(),
+            "last_activity": datetime.fromtimestamp(meta["last_activity"]).isoformat()
         }
     
     def clear_session(self, session_id: str) -> bool:
         """Xóa session"""
-        if session_id in self.conversation_sessions:
-            del self.conversation_sessions[session_id]
+        if self.session_store.delete(session_id):
+            self.context_compressor.forget(session_id)
             # Reset AI chat history
             self.chat_ai.clear_history()
             return True
         return False
     
     def get_available_characters(self) -> List[Dict[str, Any]]:
-        """Lấy danh sách nhân vật có sẵn"""
-        from app.models.characters import get_all_characters
-        
-        characters = get_all_characters()
-        result = []
-        
-        for char_id, character in characters.items():
-            result.append({
-                "id": character.id,
-                "name": character.name,
-                "full_name": character.full_name,
-                "dynasty": character.dynasty,
-                "description": character.description,
-                "character_type": character.character_type.value,
-                "expertise": character.expertise,
-                "has_advanced_prompt": char_id in self.prompt_builder.character_personas
-            })
+        """Lấy danh sách nhân vật có sẵn (dữ liệu tĩnh, tính một lần)"""
+        if self._available_characters is None:
+            self._available_characters = [
+                {
+                    "id": character.id,
+                    "name": character.name,
+                    "full_name": character.full_name,
+                    "dynasty": character.dynasty,
+                    "description": character.description,
+                    "character_type": character.character_type.value,
+                    "expertise": character.expertise,
+                    "has_advanced_prompt": char_id in self.prompt_builder.character_personas
+                }
+                for char_id, character in get_all_characters().items()
+            ]
         
-        return result
+        return [dict(item) for item in self._available_characters]
     
     def get_model_status(self) -> Dict[str, Any]:
         """Lấy trạng thái model"""
         return {
             "ai_model": self.chat_ai.get_model_info(),
-            "active_sessions": len(self.conversation_sessions),
+            "active_sessions": len(self.session_store),
+            "session_store": self.session_store.get_stats(),
+            "context_compression": self.context_compressor.get_stats(),
+            "greeting_bank": self.greeting_bank.get_stats(),
             "rag_available": self.rag_agent is not None
         }
 
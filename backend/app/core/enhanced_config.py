@@ -53,6 +53,21 @@ class CharacterRoleplayConfig:
     # Conversation settings
     max_history_turns: int = 3        # Số turn lưu trong context
     reset_after_turns: int = 10       # Reset sau 10 turn để tránh context overflow
+    
+    # Context compression settings
+    summary_method: str = "extractive"  # "extractive" hoặc "llm" (tóm tắt bằng model với max_tokens thấp)
+    # "llm" dùng chung model và lock với chat: mỗi lần tóm tắt chặn reply kế tiếp, nên chỉ chạy khi bật rõ ràng
+    summary_allow_shared_llm: bool = False
+    summary_max_tokens: int = 128       # max_tokens khi tóm tắt bằng LLM
+    max_summary_chars: int = 800        # Độ dài tối đa của bản tóm tắt cuộn
+    history_token_budget: int = 400     # Ngân sách token cho lịch sử được chọn theo độ liên quan
+    
+    # Greeting bank settings
+    greeting_bank_size: int = 5             # Số lời chào sinh sẵn mỗi nhân vật
+    greeting_bank_with_audio: bool = False  # Sinh sẵn cả audio TTS cho lời chào
+    # Sinh bank thiếu/cũ ở background khi server chạy: dùng chung LLM (có lock) với chat nên tắt mặc định,
+    # bank được sinh offline bằng scripts/setup/build_greeting_bank.py
+    greeting_bank_build_on_startup: bool = False
 
 
 @dataclass
@@ -93,6 +108,19 @@ class RAGConfig:
     context_overlap: int = 50         # Overlap giữa các chunk
 
 
+@dataclass
+class SessionStoreConfig:
+    """Cấu hình lưu trữ session hội thoại"""
+    
+    backend: str = "memory"               # "memory" (LRU) hoặc "sqlite" (sống qua restart)
+    max_sessions: int = 1000              # Số session tối đa, vượt quá sẽ evict LRU
+    idle_ttl_seconds: float = 6 * 3600    # Session không hoạt động quá 6h sẽ bị xóa
+    max_turns_per_session: int = 20       # Chỉ giữ 20 turn gần nhất mỗi session
+    max_memory_mb: float = 64             # Giới hạn dung lượng ước lượng (backend memory)
+    sweep_interval_seconds: float = 300   # Quét dọn session hết hạn mỗi 5 phút
+    sqlite_path: str = str(Path(__file__).resolve().parent.parent.parent / "data" / "sessions" / "sessions.db")
+
+
 class EnhancedSystemConfig:
     """Configuration manager cho enhanced system"""
     
@@ -101,6 +129,7 @@ class EnhancedSystemConfig:
         self.roleplay_config = CharacterRoleplayConfig()
         self.prompt_config = PromptTemplateConfig()
         self.rag_config = RAGConfig()
+        self.session_config = SessionStoreConfig()
         
         # Load from environment if available
         self._load_from_env()
@@ -127,6 +156,45 @@ class EnhancedSystemConfig:
         
         if os.getenv("MAX_HISTORY_TURNS"):
             self.roleplay_config.max_history_turns = int(os.getenv("MAX_HISTORY_TURNS"))
+        
+        if os.getenv("SUMMARY_METHOD"):
+            self.roleplay_config.summary_method = os.getenv("SUMMARY_METHOD")
+        
+        if os.getenv("SUMMARY_ALLOW_SHARED_LLM"):
+            self.roleplay_config.summary_allow_shared_llm = os.getenv("SUMMARY_ALLOW_SHARED_LLM").lower() == "true"
+        
+        if os.getenv("HISTORY_TOKEN_BUDGET"):
+            self.roleplay_config.history_token_budget = int(os.getenv("HISTORY_TOKEN_BUDGET"))
+        
+        if os.getenv("GREETING_BANK_SIZE"):
+            self.roleplay_config.greeting_bank_size = int(os.getenv("GREETING_BANK_SIZE"))
+        
+        if os.getenv("GREETING_BANK_AUDIO"):
+            self.roleplay_config.greeting_bank_with_audio = os.getenv("GREETING_BANK_AUDIO").lower() == "true"
+        
+        if os.getenv("GREETING_BANK_BUILD_ON_STARTUP"):
+            self.roleplay_config.greeting_bank_build_on_startup = (
+                os.getenv("GREETING_BANK_BUILD_ON_STARTUP").lower() == "true"
+            )
+        
+        # Session store config from env
+        if os.getenv("SESSION_STORE_BACKEND"):
+            self.session_config.backend = os.getenv("SESSION_STORE_BACKEND")
+        
+        if os.getenv("SESSION_MAX_SESSIONS"):
+            self.session_config.max_sessions = int(os.getenv("SESSION_MAX_SESSIONS"))
+        
+        if os.getenv("SESSION_IDLE_TTL"):
+            self.session_config.idle_ttl_seconds = float(os.getenv("SESSION_IDLE_TTL"))
+        
+        if os.getenv("SESSION_MAX_TURNS"):
+            max_turns = int(os.getenv("SESSION_MAX_TURNS"))
+            if max_turns < 1:
+                raise ValueError(f"SESSION_MAX_TURNS phải >= 1 (nhận {max_turns})")
+            self.session_config.max_turns_per_session = max_turns
+        
+        if os.getenv("SESSION_SQLITE_PATH"):
+            self.session_config.sqlite_path = os.getenv("SESSION_SQLITE_PATH")
     
     def get_model_config_dict(self) -> Dict:
         """Get model config as dictionary for ChatAI"""
@@ -212,6 +280,12 @@ class EnhancedSystemConfig:
         print(f"  Embedding Model: {self.rag_config.embedding_model}")
         print(f"  Default Top-K: {self.rag_config.default_top_k}")
         print(f"  Similarity Threshold: {self.rag_config.similarity_threshold}")
+        
+        print("\n💬 Session Store Configuration:")
+        print(f"  Backend: {self.session_config.backend}")
+        print(f"  Max Sessions: {self.session_config.max_sessions}")
+        print(f"  Idle TTL: {self.session_config.idle_ttl_seconds}s")
+        print(f"  Max Turns/Session: {self.session_config.max_turns_per_session}")
 
 
 # Global singleton
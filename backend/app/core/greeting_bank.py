@@ -0,0 +1,281 @@
+# backend/app/core/greeting_bank.py
+
+"""
+Greeting Bank - Ngân hàng lời chào sinh sẵn cho từng nhân vật
+Sinh trước K lời chào đã validate (kèm audio TTS nếu bật), lưu trên đĩa và phục vụ
+round-robin O(1) để bắt đầu session không tốn GPU.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from app.models.characters import CHARACTER_VOICE_NAMES, Character, get_all_characters
+
+logger = logging.getLogger(__name__)
+
+GREETING_PROMPT = """Hãy tự giới thiệu bản thân như {character_name} và chào đón chủ công.
+Giới thiệu ngắn gọn về bản thân và sẵn sàng tư vấn."""
+
+# Các tiêu chí validate chỉ dành cho câu trả lời tư vấn dài, không áp dụng cho lời chào
+_GREETING_IGNORED_ISSUES = ("quá ngắn", "tư duy tư vấn", "lời khuyên cụ thể")
+
+
+class GreetingBank:
+    """Quản lý lời chào sinh sẵn theo nhân vật"""
+
+    def __init__(
+        self,
+        chat_ai,
+        prompt_builder,
+        bank_dir: Optional[Path] = None,
+        bank_size: int = 5,
+        synthesize_fn: Optional[Callable[[str, str], bytes]] = None
+    ):
+        self.chat_ai = chat_ai
+        self.prompt_builder = prompt_builder
+        self.bank_dir = Path(bank_dir or Path(__file__).resolve().parent.parent.parent / "data" / "greetings")
+        self.bank_size = bank_size
+        self.synthesize_fn = synthesize_fn
+
+        self._banks: Dict[str, Dict[str, Any]] = {}
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._refreshing: set = set()
+
+    # ------------------------------------------------------------------
+    # Serving
+    # ------------------------------------------------------------------
+
+    def get_greeting(self, character_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Lấy một lời chào theo round-robin (O(1))
+        Returns: {"text": ..., "audio_path": ...} hoặc None nếu bank trống
+        """
+        with self._lock:
+            bank = self._banks.get(character_id)
+            if not bank or not bank["greetings"]:
+                return None
+            greetings = bank["greetings"]
+            index = self._cursors.get(character_id, 0)
+            self._cursors[character_id] = (index + 1) % len(greetings)
+            entry = greetings[index]
+
+        return self._with_audio_path(character_id, entry)
+
+    def get_follow_ups(self, character_id: str) -> List[Dict[str, Any]]:
+        """Lấy các câu hỏi follow-up đã sinh sẵn audio: [{"text": ..., "audio_path": ...}]"""
+        with self._lock:
+            bank = self._banks.get(character_id) or {}
+            entries = list(bank.get("follow_ups", []))
+        return [self._with_audio_path(character_id, entry) for entry in entries]
+
+    def get_audio_path(self, character_id: str, filename: str) -> Optional[Path]:
+        """Đường dẫn file audio của bank; chỉ nhận file có trong bank hiện tại (không cho đọc file tùy ý)"""
+        with self._lock:
+            bank = self._banks.get(character_id) or {}
+            entries = bank.get("greetings", []) + bank.get("follow_ups", [])
+            if not any(entry.get("audio_file") == filename for entry in entries):
+                return None
+        path = self.bank_dir / character_id / filename
+        return path if path.exists() else None
+
+    def _with_audio_path(self, character_id: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        audio_path = None
+        if entry.get("audio_file"):
+            audio_path = str(self.bank_dir / character_id / entry["audio_file"])
+        return {"text": entry["text"], "audio_path": audio_path}
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _bank_file(self, character_id: str) -> Path:
+        return self.bank_dir / character_id / "bank.json"
+
+    def fingerprint(self, character: Character) -> str:
+        """Fingerprint của model + persona; thay đổi thì bank cần sinh lại"""
+        data = "|".join([
+            str(self.chat_ai.config.model_file),
+            str(self.chat_ai.config.temperature),
+            self.prompt_builder.build_system_prompt(character),
+            GREETING_PROMPT.format(character_name=character.name),
+            "audio" if self.synthesize_fn else "text"
+        ])
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    def load(self, character: Character) -> bool:
+        """Load bank từ đĩa. Returns: True nếu bank còn hợp lệ (fingerprint khớp)"""
+        bank_file = self._bank_file(character.id)
+        if not bank_file.exists():
+            return False
+        try:
+            with open(bank_file, "r", encoding="utf-8") as f:
+                bank = json.load(f)
+        except Exception as e:
+            logger.warning(f"Failed to read greeting bank for {character.id}: {e}")
+            return False
+
+        with self._lock:
+            # Bank cũ vẫn được phục vụ trong lúc sinh lại
+            self._banks[character.id] = bank
+            self._cursors.setdefault(character.id, 0)
+        return bank.get("fingerprint") == self.fingerprint(character)
+
+    def _save(self, character_id: str, bank: Dict[str, Any]):
+        bank_file = self._bank_file(character_id)
+        bank_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = bank_file.with_suffix(".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(bank, f, ensure_ascii=False, indent=2)
+        tmp_file.replace(bank_file)
+
+    # ------------------------------------------------------------------
+    # Generation
+    # ------------------------------------------------------------------
+
+    def _is_valid_greeting(self, text: str, character: Character) -> bool:
+        _, issues = self.prompt_builder.validate_response(text, character)
+        issues = [i for i in issues if not any(ignored in i for ignored in _GREETING_IGNORED_ISSUES)]
+        return len(issues) == 0
+
+    def _write_audio(self, character_id: str, filename: str, text: str) -> Optional[str]:
+        if self.synthesize_fn is None:
+            return None
+        voice_name = CHARACTER_VOICE_NAMES.get(character_id, character_id)
+        try:
+            audio_bytes = self.synthesize_fn(text, voice_name)
+            audio_path = self.bank_dir / character_id / filename
+            audio_path.parent.mkdir(parents=True, exist_ok=True)
+            audio_path.write_bytes(audio_bytes)
+            return filename
+        except Exception as e:
+            logger.warning(f"Failed to synthesize greeting audio for {character_id}: {e}")
+            return None
+
+    def build(self, character: Character, max_attempts_factor: int = 3) -> int:
+        """
+        Sinh bank cho một nhân vật (chạy LLM, có thể chậm). Returns: số lời chào đã lưu
+        """
+        logger.info(f"🎙️ Building greeting bank for {character.name} (k={self.bank_size})...")
+        system_prompt = self.prompt_builder.build_system_prompt(character)
+        user_prompt = GREETING_PROMPT.format(character_name=character.name)
+        try:
+            prefix_token_ids = self.prompt_builder.get_prefix_token_ids(character, self.chat_ai.tokenize)
+        except Exception:
+            prefix_token_ids = None
+
+        valid: List[str] = []
+        fallback: List[str] = []
+        for _ in range(self.bank_size * max_attempts_factor):
+            if len(valid) >= self.bank_size:
+                break
+            try:
+                response = self.chat_ai.complete(user_prompt, system_prompt=system_prompt, prefix_token_ids=prefix_token_ids)
+            except Exception as e:
+                logger.warning(f"Greeting generation failed for {character.id}: {e}")
+                break
+            text = self.prompt_builder.enhance_response_with_character_traits(response, character)
+            if text in valid or text in fallback:
+                continue
+            (valid if self._is_valid_greeting(text, character) else fallback).append(text)
+
+        texts = (valid + fallback)[: self.bank_size]
+        if not texts:
+            return 0
+
+        # Audio của bank mới ghi ra tên file mới: bank cũ vẫn được phục vụ nguyên vẹn tới lúc swap bank.json
+        generation = uuid.uuid4().hex[:8]
+        greetings = [
+            {"text": text, "audio_file": self._write_audio(character.id, f"greeting_{generation}_{i}.wav", text)}
+            for i, text in enumerate(texts)
+        ]
+        follow_ups = []
+        if self.synthesize_fn is not None:
+            questions = self.prompt_builder.build_follow_up_questions(character, "")
+            follow_ups = [
+                {"text": q, "audio_file": self._write_audio(character.id, f"follow_up_{generation}_{i}.wav", q)}
+                for i, q in enumerate(questions)
+            ]
+
+        bank = {
+            "character_id": character.id,
+            "fingerprint": self.fingerprint(character),
+            "created_at": time.time(),
+            "greetings": greetings,
+            "follow_ups": follow_ups
+        }
+        self._save(character.id, bank)
+        with self._lock:
+            self._banks[character.id] = bank
+            self._cursors[character.id] = 0
+        self._remove_unused_audio(character.id, bank)
+
+        logger.info(f"✅ Greeting bank for {character.name}: {len(valid)} valid / {len(texts)} stored")
+        return len(texts)
+
+    def _remove_unused_audio(self, character_id: str, bank: Dict[str, Any]):
+        """Xóa audio của các bank trước (sau khi bank mới đã được swap vào)"""
+        in_use = {entry.get("audio_file") for entry in bank["greetings"] + bank["follow_ups"]}
+        for path in (self.bank_dir / character_id).glob("*.wav"):
+            if path.name not in in_use and path.name.startswith(("greeting_", "follow_up_")):
+                try:
+                    path.unlink()
+                except OSError as e:
+                    logger.warning(f"Failed to remove old greeting audio {path}: {e}")
+
+    def load_all(self, characters: Optional[List[Character]] = None) -> List[Character]:
+        """
+        Load bank từ đĩa (bank cũ vẫn được phục vụ). Returns: các nhân vật có bank thiếu hoặc đã cũ
+        (model/persona thay đổi)
+        """
+        characters = characters or list(get_all_characters().values())
+        return [character for character in characters if not self.load(character)]
+
+    def refresh_async(self, characters: Optional[List[Character]] = None, force: bool = False):
+        """
+        Load bank từ đĩa và sinh lại ở background những bank thiếu hoặc đã cũ.
+        Việc sinh chạy trên LLM dùng chung với chat; ở production nên sinh offline bằng
+        scripts/setup/build_greeting_bank.py
+        """
+        characters = characters or list(get_all_characters().values())
+        stale = characters if force else self.load_all(characters)
+
+        with self._lock:
+            stale = [c for c in stale if c.id not in self._refreshing]
+            self._refreshing.update(c.id for c in stale)
+        if not stale:
+            return
+
+        def _worker():
+            for character in stale:
+                try:
+                    self.build(character)
+                except Exception as e:
+                    logger.error(f"Greeting bank build failed for {character.id}: {e}")
+                finally:
+                    with self._lock:
+                        self._refreshing.discard(character.id)
+
+        threading.Thread(target=_worker, name="greeting-bank-refresh", daemon=True).start()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "characters": {cid: len(bank.get("greetings", [])) for cid, bank in self._banks.items()},
+                "refreshing": sorted(self._refreshing),
+                "bank_size": self.bank_size
+            }
+
+
+def create_tts_synthesize_fn() -> Callable[[str, str], bytes]:
+    """Hàm synthesize dùng TTS singleton (import lazy để không kéo torch khi không cần audio)"""
+    def _synthesize(text: str, voice_name: str) -> bytes:
+        from app.core.tts_service_singleton import get_tts_service
+        return get_tts_service().synthesize_speech(text, voice_name)
+    return _synthesize
@@ -19,6 +19,7 @@ from chromadb.utils import embedding_functions
 from app.models.characters import Character, CharacterStory, AdviceRequest, AdviceResponse
 from app.core.ai_models import ChatAI
 from app.utils.logger import get_logger
+from app.utils.single_flight import SingleFlight, make_key
 
 logger = get_logger(__name__)
 
@@ -56,6 +57,9 @@ class RAGAgent:
         self.chunk_overlap = 50
         self.top_k_results = 5
         
+        # Gộp các request advice giống hệt nhau đang chạy song song
+        self._advice_flight = SingleFlight("rag_advice")
+        
         self._initialize()
     
     def _initialize(self):
@@ -321,14 +325,41 @@ class RAGAgent:
         character: Character,
         chat_ai: ChatAI
     ) -> AdviceResponse:
-        """Get advice from a character based on user request"""
+        """
+        Get advice from a character based on user request
+        Request trùng (cùng nhân vật, câu hỏi, tham số sinh) đang chạy sẽ dùng chung một lần sinh
+        """
+        key = make_key(
+            character.id,
+            request.user_question,
+            request.context,
+            request.user_role,
+            request.difficulty_level,
+            self.top_k_results,
+            model=chat_ai.config.model_file,
+            temperature=chat_ai.config.temperature,
+            top_p=chat_ai.config.top_p,
+            top_k=chat_ai.config.top_k,
+            max_tokens=chat_ai.config.max_tokens
+        )
+        return await self._advice_flight.do_async(key, self._generate_advice, request, character, chat_ai)
+    
+    async def _generate_advice(
+        self, 
+        request: AdviceRequest, 
+        character: Character,
+        chat_ai: ChatAI
+    ) -> AdviceResponse:
+        """Thực hiện retrieve + generate cho một request advice"""
         try:
             start_time = asyncio.get_event_loop().time()
             
             logger.info(f"Getting advice from {character.name} for: {request.user_question[:100]}...")
             
-            # Retrieve relevant context
-            relevant_contexts = self.retrieve_relevant_context(
+            # Retrieve + generate là code đồng bộ (embedding, llama.cpp): chạy trong thread để event loop
+            # vẫn nhận được request trùng và gắn chúng vào lần sinh đang chạy
+            relevant_contexts = await asyncio.to_thread(
+                self.retrieve_relevant_context,
                 query=request.user_question,
                 character_id=character.id,
                 top_k=self.top_k_results
@@ -342,7 +373,7 @@ class RAGAgent:
             )
             
             # Get response from AI
-            advice = chat_ai.chat(prompt)
+            advice = await asyncio.to_thread(chat_ai.chat, prompt)
             
             # ✅ THÊM VALIDATION như trong character_chat_service
             from app.core.advanced_prompt_builder import get_qwen_prompt_builder
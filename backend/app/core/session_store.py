@@ -0,0 +1,530 @@
+# backend/app/core/session_store.py
+
+"""
+Session Store cho CharacterChatService
+Lưu trữ phiên hội thoại có giới hạn: số session tối đa, TTL khi không hoạt động,
+giới hạn số turn mỗi session và quét dọn định kỳ.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_item_size(item: Dict[str, Any]) -> int:
+    """Ước lượng số byte một turn chiếm trong bộ nhớ (xấp xỉ, đủ dùng cho giới hạn)"""
+    size = 64  # overhead của dict
+    for key, value in item.items():
+        size += len(key) + 16
+        if isinstance(value, str):
+            size += len(value.encode("utf-8"))
+        elif isinstance(value, (list, tuple)):
+            size += sum(len(str(v).encode("utf-8")) for v in value) + 8 * len(value)
+        else:
+            size += 16
+    return size
+
+
+class SessionStore(ABC):
+    """Interface chung cho các backend lưu session"""
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        idle_ttl_seconds: float = 6 * 3600,
+        max_turns_per_session: int = 20
+    ):
+        if max_turns_per_session < 1:
+            raise ValueError(f"max_turns_per_session phải >= 1 (nhận {max_turns_per_session})")
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_turns_per_session = max_turns_per_session
+
+        self._lock = threading.RLock()
+        self._last_created_at = 0.0
+        self._sweeper_thread: Optional[threading.Thread] = None
+        self._sweeper_stop = threading.Event()
+        self._stats = {
+            "evicted_lru": 0,
+            "evicted_ttl": 0,
+            "evicted_memory": 0,
+            "turns_trimmed": 0
+        }
+
+    @abstractmethod
+    def create(self, session_id: str, character_id: str) -> None:
+        """Tạo session mới (ghi đè nếu đã tồn tại)"""
+
+    @abstractmethod
+    def exists(self, session_id: str) -> bool:
+        """Kiểm tra session còn tồn tại và chưa hết hạn"""
+
+    @abstractmethod
+    def append_turn(self, session_id: str, item: Dict[str, Any]) -> int:
+        """Thêm một turn vào session. Returns: tổng số turn đã từng ghi"""
+
+    @abstractmethod
+    def get_turns(self, session_id: str, last_n: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Lấy các turn đang giữ (hoặc last_n turn cuối)"""
+
+    @abstractmethod
+    def get_meta(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy metadata của session (character_id, created_at, last_activity, total_turns)"""
+
+    @abstractmethod
+    def get_summary(self, session_id: str) -> str:
+        """Lấy bản tóm tắt cuộn đã lưu của session ("" nếu chưa có)"""
+
+    @abstractmethod
+    def set_summary(self, session_id: str, summary: str, created_at: Optional[float] = None) -> bool:
+        """
+        Lưu bản tóm tắt cuộn cùng session
+        created_at: chỉ ghi nếu session vẫn là phiên tạo lúc created_at (không ghi vào session đã bị tạo lại)
+        Returns: False nếu session không còn hoặc đã bị tạo lại
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Xóa session"""
+
+    @abstractmethod
+    def sweep(self) -> int:
+        """Xóa các session hết hạn. Returns: số session đã xóa"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def memory_usage_bytes(self) -> int:
+        """Ước lượng dung lượng đang dùng"""
+
+    def _next_created_at(self) -> float:
+        """created_at tăng ngặt (gọi khi đang giữ lock) để phân biệt session tạo lại cùng id"""
+        self._last_created_at = max(time.time(), self._last_created_at + 1e-6)
+        return self._last_created_at
+
+    def _is_expired(self, last_activity: float, now: Optional[float] = None) -> bool:
+        if self.idle_ttl_seconds is None or self.idle_ttl_seconds <= 0:
+            return False
+        return (now or time.time()) - last_activity > self.idle_ttl_seconds
+
+    def start_sweeper(self, interval_seconds: float = 300.0):
+        """Chạy thread nền quét dọn session hết hạn định kỳ"""
+        if self._sweeper_thread is not None and self._sweeper_thread.is_alive():
+            return
+
+        self._sweeper_stop.clear()
+
+        def _loop():
+            while not self._sweeper_stop.wait(interval_seconds):
+                try:
+                    removed = self.sweep()
+                    if removed:
+                        logger.info(f"🧹 Session sweep removed {removed} expired sessions")
+                except Exception as e:
+                    logger.error(f"Session sweep failed: {e}")
+
+        self._sweeper_thread = threading.Thread(target=_loop, name="session-sweeper", daemon=True)
+        self._sweeper_thread.start()
+
+    def stop_sweeper(self):
+        """Dừng thread quét dọn"""
+        self._sweeper_stop.set()
+        if self._sweeper_thread is not None:
+            self._sweeper_thread.join(timeout=1.0)
+            self._sweeper_thread = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Thống kê store"""
+        return {
+            "backend": self.__class__.__name__,
+            "active_sessions": len(self),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl_seconds,
+            "max_turns_per_session": self.max_turns_per_session,
+            "memory_usage_bytes": self.memory_usage_bytes(),
+            **self._stats
+        }
+
+
+class _MemorySession:
+    """Dữ liệu của một session trong bộ nhớ"""
+
+    __slots__ = ("character_id", "created_at", "last_activity", "total_turns", "turns", "summary", "size_bytes")
+
+    def __init__(self, character_id: str, max_turns: int, now: Optional[float] = None):
+        now = now or time.time()
+        self.character_id = character_id
+        self.created_at = now
+        self.last_activity = now
+        self.total_turns = 0
+        self.turns: Deque[Dict[str, Any]] = deque(maxlen=max_turns)
+        self.summary = ""
+        self.size_bytes = 0
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Session store trong bộ nhớ với LRU eviction.
+    Bị giới hạn bởi số session, tổng dung lượng ước lượng và TTL.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        idle_ttl_seconds: float = 6 * 3600,
+        max_turns_per_session: int = 20,
+        max_memory_bytes: Optional[int] = 64 * 1024 * 1024
+    ):
+        super().__init__(max_sessions, idle_ttl_seconds, max_turns_per_session)
+        self.max_memory_bytes = max_memory_bytes
+        self._sessions: "OrderedDict[str, _MemorySession]" = OrderedDict()
+        self._total_bytes = 0
+
+    def _remove(self, session_id: str) -> Optional[_MemorySession]:
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._total_bytes -= session.size_bytes
+        return session
+
+    def _get_live(self, session_id: str) -> Optional[_MemorySession]:
+        """Lấy session nếu chưa hết hạn, đồng thời đánh dấu là vừa dùng (LRU)"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if self._is_expired(session.last_activity):
+            self._remove(session_id)
+            self._stats["evicted_ttl"] += 1
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _enforce_limits(self):
+        while len(self._sessions) > self.max_sessions:
+            _, session = self._sessions.popitem(last=False)
+            self._total_bytes -= session.size_bytes
+            self._stats["evicted_lru"] += 1
+        if self.max_memory_bytes:
+            # Luôn giữ lại session vừa dùng gần nhất
+            while self._total_bytes > self.max_memory_bytes and len(self._sessions) > 1:
+                _, session = self._sessions.popitem(last=False)
+                self._total_bytes -= session.size_bytes
+                self._stats["evicted_memory"] += 1
+
+    def create(self, session_id: str, character_id: str) -> None:
+        with self._lock:
+            self._remove(session_id)
+            self._sessions[session_id] = _MemorySession(
+                character_id, self.max_turns_per_session, now=self._next_created_at()
+            )
+            self._enforce_limits()
+
+    def exists(self, session_id: str) -> bool:
+        with self._lock:
+            return self._get_live(session_id) is not None
+
+    def append_turn(self, session_id: str, item: Dict[str, Any]) -> int:
+        with self._lock:
+            session = self._get_live(session_id)
+            if session is None:
+                raise KeyError(session_id)
+
+            item_size = estimate_item_size(item)
+            if len(session.turns) == session.turns.maxlen:
+                dropped_size = estimate_item_size(session.turns[0])
+                session.size_bytes -= dropped_size
+                self._total_bytes -= dropped_size
+                self._stats["turns_trimmed"] += 1
+
+            session.turns.append(item)
+            session.size_bytes += item_size
+            session.total_turns += 1
+            session.last_activity = time.time()
+            self._total_bytes += item_size
+
+            self._enforce_limits()
+            return session.total_turns
+
+    def get_turns(self, session_id: str, last_n: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            session = self._get_live(session_id)
+            if session is None:
+                return []
+            turns = list(session.turns)
+            return turns[-last_n:] if last_n else turns
+
+    def get_meta(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            session = self._get_live(session_id)
+            if session is None:
+                return None
+            return {
+                "character_id": session.character_id,
+                "created_at": session.created_at,
+                "last_activity": session.last_activity,
+                "total_turns": session.total_turns,
+                "stored_turns": len(session.turns)
+            }
+
+    def get_summary(self, session_id: str) -> str:
+        with self._lock:
+            session = self._get_live(session_id)
+            return session.summary if session is not None else ""
+
+    def set_summary(self, session_id: str, summary: str, created_at: Optional[float] = None) -> bool:
+        with self._lock:
+            session = self._get_live(session_id)
+            if session is None or (created_at is not None and session.created_at != created_at):
+                return False
+            delta = len(summary.encode("utf-8")) - len(session.summary.encode("utf-8"))
+            session.summary = summary
+            session.size_bytes += delta
+            self._total_bytes += delta
+            self._enforce_limits()
+            return True
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._remove(session_id) is not None
+
+    def sweep(self) -> int:
+        with self._lock:
+            now = time.time()
+            expired = [sid for sid, s in self._sessions.items() if self._is_expired(s.last_activity, now)]
+            for sid in expired:
+                self._remove(sid)
+            self._stats["evicted_ttl"] += len(expired)
+            return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def memory_usage_bytes(self) -> int:
+        return self._total_bytes
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store lưu trên đĩa bằng SQLite.
+    Session sống qua restart; giới hạn số session/turn được áp dụng khi ghi và khi sweep.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "data/sessions/sessions.db",
+        max_sessions: int = 10000,
+        idle_ttl_seconds: float = 7 * 24 * 3600,
+        max_turns_per_session: int = 20
+    ):
+        super().__init__(max_sessions, idle_ttl_seconds, max_turns_per_session)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                character_id TEXT,
+                created_at REAL NOT NULL,
+                last_activity REAL NOT NULL,
+                total_turns INTEGER NOT NULL DEFAULT 0,
+                summary TEXT NOT NULL DEFAULT ''
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_last_activity ON sessions(last_activity);
+            CREATE TABLE IF NOT EXISTS turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL REFERENCES sessions(session_id) ON DELETE CASCADE,
+                payload TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_turns_session ON turns(session_id, id);
+            """
+        )
+        # Database tạo trước khi có cột summary
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        if "summary" not in columns:
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN summary TEXT NOT NULL DEFAULT ''")
+        self._conn.commit()
+        logger.info(f"SQLite session store opened at {self.db_path}")
+
+    def _live_row(self, session_id: str):
+        row = self._conn.execute(
+            "SELECT character_id, created_at, last_activity, total_turns FROM sessions WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        if self._is_expired(row[2]):
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+            self._stats["evicted_ttl"] += 1
+            return None
+        return row
+
+    def _enforce_max_sessions(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        overflow = count - self.max_sessions
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM sessions WHERE session_id IN ("
+                "SELECT session_id FROM sessions ORDER BY last_activity ASC LIMIT ?)",
+                (overflow,)
+            )
+            self._stats["evicted_lru"] += overflow
+
+    def create(self, session_id: str, character_id: str) -> None:
+        with self._lock:
+            now = self._next_created_at()
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, character_id, created_at, last_activity) VALUES (?, ?, ?, ?)",
+                (session_id, character_id, now, now)
+            )
+            self._enforce_max_sessions()
+            self._conn.commit()
+
+    def exists(self, session_id: str) -> bool:
+        with self._lock:
+            return self._live_row(session_id) is not None
+
+    def append_turn(self, session_id: str, item: Dict[str, Any]) -> int:
+        with self._lock:
+            row = self._live_row(session_id)
+            if row is None:
+                raise KeyError(session_id)
+
+            total_turns = row[3] + 1
+            self._conn.execute(
+                "INSERT INTO turns (session_id, payload) VALUES (?, ?)",
+                (session_id, json.dumps(item, ensure_ascii=False, default=str))
+            )
+            trimmed = self._conn.execute(
+                "DELETE FROM turns WHERE session_id = ? AND id NOT IN ("
+                "SELECT id FROM turns WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                (session_id, session_id, self.max_turns_per_session)
+            ).rowcount
+            self._stats["turns_trimmed"] += max(trimmed, 0)
+            self._conn.execute(
+                "UPDATE sessions SET last_activity = ?, total_turns = ? WHERE session_id = ?",
+                (time.time(), total_turns, session_id)
+            )
+            self._conn.commit()
+            return total_turns
+
+    def get_turns(self, session_id: str, last_n: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            if self._live_row(session_id) is None:
+                return []
+            limit = last_n or self.max_turns_per_session
+            rows = self._conn.execute(
+                "SELECT payload FROM turns WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, limit)
+            ).fetchall()
+            return [json.loads(r[0]) for r in reversed(rows)]
+
+    def get_meta(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._live_row(session_id)
+            if row is None:
+                return None
+            stored = self._conn.execute(
+                "SELECT COUNT(*) FROM turns WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            return {
+                "character_id": row[0],
+                "created_at": row[1],
+                "last_activity": row[2],
+                "total_turns": row[3],
+                "stored_turns": stored
+            }
+
+    def get_summary(self, session_id: str) -> str:
+        with self._lock:
+            if self._live_row(session_id) is None:
+                return ""
+            row = self._conn.execute("SELECT summary FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            return row[0] if row else ""
+
+    def set_summary(self, session_id: str, summary: str, created_at: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._live_row(session_id) is None:
+                return False
+            updated = self._conn.execute(
+                "UPDATE sessions SET summary = ? WHERE session_id = ? AND (? IS NULL OR created_at = ?)",
+                (summary, session_id, created_at, created_at)
+            ).rowcount
+            self._conn.commit()
+            return updated > 0
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount
+            self._conn.commit()
+            return deleted > 0
+
+    def sweep(self) -> int:
+        with self._lock:
+            removed = 0
+            if self.idle_ttl_seconds and self.idle_ttl_seconds > 0:
+                removed = self._conn.execute(
+                    "DELETE FROM sessions WHERE last_activity < ?",
+                    (time.time() - self.idle_ttl_seconds,)
+                ).rowcount
+                self._stats["evicted_ttl"] += removed
+            self._enforce_max_sessions()
+            self._conn.commit()
+            return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def memory_usage_bytes(self) -> int:
+        """Dung lượng file database trên đĩa"""
+        try:
+            return self.db_path.stat().st_size
+        except OSError:
+            return 0
+
+    def close(self):
+        """Đóng kết nối database"""
+        self.stop_sweeper()
+        with self._lock:
+            self._conn.close()
+
+
+def create_session_store(config) -> SessionStore:
+    """Tạo session store theo SessionStoreConfig"""
+    if config.backend == "sqlite":
+        store: SessionStore = SQLiteSessionStore(
+            db_path=config.sqlite_path,
+            max_sessions=config.max_sessions,
+            idle_ttl_seconds=config.idle_ttl_seconds,
+            max_turns_per_session=config.max_turns_per_session
+        )
+    elif config.backend == "memory":
+        store = InMemorySessionStore(
+            max_sessions=config.max_sessions,
+            idle_ttl_seconds=config.idle_ttl_seconds,
+            max_turns_per_session=config.max_turns_per_session,
+            max_memory_bytes=int(config.max_memory_mb * 1024 * 1024) if config.max_memory_mb else None
+        )
+    else:
+        raise ValueError(f"Unknown session store backend: {config.backend}")
+
+    if config.sweep_interval_seconds and config.sweep_interval_seconds > 0:
+        store.start_sweeper(config.sweep_interval_seconds)
+
+    return store
@@ -13,7 +13,18 @@ class TTSConfig:
     BASE_PATH = Path(__file__).resolve().parent.parent.parent
     CLONE_VOICE_PATH = BASE_PATH / "app" / "services" / "cloneVoice"
     AUDIO_SAMPLES_DIR = BASE_PATH / "data" / "audio_samples"
+    VOICES_DIR = BASE_PATH / "data" / "voices"
     TEMP_AUDIO_DIR = BASE_PATH / "temp_audio"
+    VOICE_PROMPT_CACHE_DIR = BASE_PATH / "data" / "cache" / "voice_prompts"  # Reference audio/text/mel đã xử lý
+    
+    # Audio cache hai tầng (memory LRU theo byte + disk FLAC)
+    AUDIO_CACHE_DIR = Path(os.getenv("TTS_AUDIO_CACHE_DIR", str(BASE_PATH / "data" / "cache" / "tts_audio")))
+    AUDIO_CACHE_MEMORY_MB = int(os.getenv("TTS_AUDIO_CACHE_MEMORY_MB", "64"))
+    AUDIO_CACHE_DISK_MB = int(os.getenv("TTS_AUDIO_CACHE_DISK_MB", "1024"))
+    
+    # Attention cục bộ cho DiT: mỗi frame chỉ nhìn frame trong cửa sổ (± số frame) cộng đoạn audio tham chiếu,
+    # bộ nhớ tăng tuyến tính theo độ dài thay vì bình phương. 0 = full attention (đúng như lúc train)
+    ATTN_WINDOW_SIZE = int(os.getenv("TTS_ATTN_WINDOW", "0")) or None
     
     # Cấu hình mô hình F5-TTS
     MODEL_CONFIG = {
@@ -22,7 +33,8 @@ class TTSConfig:
         "heads": 16,
         "ff_mult": 2,
         "text_dim": 512,
-        "conv_layers": 4
+        "conv_layers": 4,
+        "attn_window_size": ATTN_WINDOW_SIZE
     }
     
     # Đường dẫn mô hình trên Hugging Face
@@ -39,9 +51,51 @@ class TTSConfig:
     DEFAULT_SPEED = 0.8  # Slower for more natural Vietnamese speech
     DEFAULT_CFG_STRENGTH = 2.0
     DEFAULT_NFE_STEP = 32
+    DEFAULT_SEED = 0  # Seed noise mặc định: cùng input luôn ra cùng audio nên cache hợp lệ; -1 = seed ngẫu nhiên
     TARGET_RMS = 0.1
     CROSS_FADE_DURATION = 0.15
     SWAY_SAMPLING_COEF = -1.0
+    INFER_BATCH_SIZE = 8        # Số text chunk gộp vào một lần CFM.sample
+    MAX_BATCH_FRAMES = 16384    # Giới hạn batch_size * mel frames dài nhất (tránh OOM)
+    SCHEDULER_MAX_WAIT_MS = 20  # Cửa sổ chờ gom chunk từ nhiều request
+    SCHEDULER_MAX_QUEUE_CHUNKS = 256  # Backpressure: số chunk tối đa trong hàng đợi
+    MEL_SPEC_TYPE = "vocos"
+    
+    # Vocoder chạy trên thread riêng, gom mel của nhiều chunk/request vào một lần decode (chỉ backend torch);
+    # stream decode chunk đầu theo cửa sổ frame (overlap-add) để phát audio trước khi vocode xong cả chunk
+    VOCODER_MAX_BATCH_SIZE = 16
+    VOCODER_MAX_BATCH_FRAMES = 32768
+    VOCODER_STREAM_WINDOW_FRAMES = 64   # ~0.7s audio mỗi cửa sổ
+    VOCODER_STREAM_OVERLAP_FRAMES = 4   # Đoạn cross-fade giữa hai cửa sổ
+    VOCODER_STREAM_CONTEXT_FRAMES = 32  # Mel thêm hai bên mỗi cửa sổ (phủ receptive field của Vocos)
+    
+    # Inference trên CPU (node không có GPU): "fp32" (mặc định), "int8" = quantize động Linear của DiT/Vocos, "bf16".
+    # int8/bf16 làm audio khác fp32 nên là opt-in (đo trước bằng cloneVoice/scripts/check_cpu_quantization.py)
+    CPU_INFERENCE_MODE = os.getenv("TTS_CPU_MODE", "fp32")
+    CPU_NUM_THREADS = int(os.getenv("TTS_CPU_THREADS", "0"))  # 0 = mọi core process được dùng
+    QUANTIZED_MODEL_CACHE_DIR = BASE_PATH / "data" / "cache" / "quantized_models"  # Trọng số int8 đã quantize
+    
+    # torch.compile cho bước ODE của DiT (opt-in); độ dài mel được pad lên bucket gần nhất để dùng lại graph,
+    # mọi bucket được compile lúc load model. Lỗi compile -> tự quay về eager
+    COMPILE_MODEL = os.getenv("TTS_COMPILE", "false").lower() == "true"
+    COMPILE_MODE = os.getenv("TTS_COMPILE_MODE") or None  # None = default, "reduce-overhead" = CUDA graphs
+    COMPILE_DURATION_BUCKETS = (384, 512, 768, 1024, 1536, 2048, 3072, 4096)  # mel frames (~4s -> ~44s)
+    
+    # Backend inference: "torch" hoặc "onnx" (ONNX Runtime trên CPU, model export bằng infer/export_onnx.py).
+    # Backend onnx vẫn cần cài torch: text front end, xử lý audio tham chiếu và chia chunk dùng chung code torch
+    INFERENCE_BACKEND = os.getenv("TTS_BACKEND", "torch").lower()
+    INFERENCE_BACKENDS = ("torch", "onnx")
+    ONNX_MODEL_DIR = Path(os.getenv("TTS_ONNX_MODEL_DIR", str(BASE_PATH / "data" / "models" / "f5_tts_onnx")))
+    
+    # Preset sampler: đánh đổi số bước ODE (NFE) lấy tốc độ; tham số request truyền riêng sẽ ghi đè preset
+    # sampler None = euler của odeint như model gốc; "heun" ~ 1 NFE/bước nhưng bậc 2 nên ít bước hơn vẫn giữ chất lượng
+    SAMPLER_PRESETS = {
+        "fast": {"nfe_step": 8, "sampler": "heun"},
+        "balanced": {"nfe_step": 16, "sampler": "heun"},
+        "quality": {"nfe_step": DEFAULT_NFE_STEP, "sampler": None},
+        "adaptive": {"nfe_step": DEFAULT_NFE_STEP, "sampler": "adaptive", "adaptive_tol": 0.05},
+    }
+    DEFAULT_SAMPLER_PRESET = os.getenv("TTS_SAMPLER_PRESET", "quality")
     
     # Vietnamese speech specific settings
     VIETNAMESE_SETTINGS = {
@@ -113,6 +167,11 @@ class TTSConfig:
             "vocab_path": str(cached_path(f"hf://{cls.HUGGING_FACE_REPO}/{cls.VOCAB_FILE}"))
         }
     
+    @classmethod
+    def get_transcript_store_path(cls, character_name: str) -> Path:
+        """File JSON lưu transcript ASR của audio tham chiếu (theo md5 audio)"""
+        return cls.VOICES_DIR / character_name / "transcripts.json"
+    
     @classmethod
     def get_device(cls):
         """Get current device setting"""
@@ -123,6 +182,14 @@ class TTSConfig:
         """Override device setting"""
         cls.DEVICE = device
     
+    @classmethod
+    def get_sampler_preset(cls, name: str = None) -> Dict[str, Any]:
+        """Lấy tham số sample của preset (mặc định DEFAULT_SAMPLER_PRESET)"""
+        name = name or cls.DEFAULT_SAMPLER_PRESET
+        if name not in cls.SAMPLER_PRESETS:
+            raise ValueError(f"Unknown sampler preset: {name} (available: {', '.join(cls.SAMPLER_PRESETS)})")
+        return dict(cls.SAMPLER_PRESETS[name])
+    
     @classmethod
     def get_inference_config(cls) -> Dict[str, Any]:
         """Lấy cấu hình cho inference"""
@@ -133,6 +200,12 @@ class TTSConfig:
             "target_rms": cls.TARGET_RMS,
             "cross_fade_duration": cls.CROSS_FADE_DURATION,
             "sway_sampling_coef": cls.SWAY_SAMPLING_COEF,
+            "sampler_preset": cls.DEFAULT_SAMPLER_PRESET,
+            "cpu_mode": cls.CPU_INFERENCE_MODE if cls.DEVICE == "cpu" else None,
+            "compile_model": cls.COMPILE_MODEL,
+            "backend": cls.INFERENCE_BACKEND,
+            "batch_size": cls.INFER_BATCH_SIZE,
+            "max_batch_frames": cls.MAX_BATCH_FRAMES,
             "device": cls.DEVICE
         }
     
@@ -149,3 +222,4 @@ class TTSConfig:
         """Tạo các thư mục cần thiết"""
         cls.AUDIO_SAMPLES_DIR.mkdir(parents=True, exist_ok=True)
         cls.TEMP_AUDIO_DIR.mkdir(parents=True, exist_ok=True)
+        cls.VOICE_PROMPT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,320 @@
+# backend/app/core/tts_scheduler.py
+"""
+Dynamic batching scheduler cho TTS synthesis
+Các request được tách thành chunk và đưa vào hàng đợi; một inference worker duy nhất
+gom chunk (trong cửa sổ chờ ngắn) thành batch theo độ dài dưới ngân sách frame,
+chạy một lần CFM.sample cho cả batch và trả kết quả về future của từng request.
+Nếu có decode_fn (vocoder chạy trên thread riêng), worker chuyển mel sang vocoder rồi sample batch kế tiếp ngay.
+"""
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TTSQueueFullError(RuntimeError):
+    """Hàng đợi scheduler đã đầy (backpressure)"""
+
+
+class _PendingRequest:
+    """Một request synthesis đang chờ: gồm nhiều chunk, hoàn thành khi đủ kết quả"""
+
+    __slots__ = ("chunks", "params", "decode", "future", "results", "remaining", "submitted_at")
+
+    def __init__(self, chunks: Sequence[Any], params: Dict[str, Any], decode: bool = True):
+        self.chunks = list(chunks)
+        self.params = params
+        self.decode = decode
+        self.future: Future = Future()
+        # Đánh dấu RUNNING: future không thể bị cancel giữa chừng khi worker đang ghi kết quả
+        self.future.set_running_or_notify_cancel()
+        self.results: List[Any] = [None] * len(self.chunks)
+        self.remaining = len(self.chunks)
+        self.submitted_at = time.time()
+
+
+class TTSScheduler:
+    """
+    Scheduler gom chunk từ nhiều request đồng thời vào batch.
+    - sample_fn(chunks, **params) -> list kết quả theo đúng thứ tự chunks
+    - decode_fn(chunks, outputs) -> list Future (tùy chọn): bước hậu xử lý bất đồng bộ (vocoder) cho output của
+      sample_fn; request submit với decode=False nhận thẳng output của sample_fn (vd. mel để stream decode)
+    - Chunk chỉ được gộp với chunk có cùng params (nfe_step, cfg_strength, ...)
+    - Batch sắp theo duration, tổng chi phí padded (số chunk * duration dài nhất) <= max_batch_frames
+    """
+
+    def __init__(
+        self,
+        sample_fn: Callable[..., List[Any]],
+        max_batch_size: int = 8,
+        max_batch_frames: int = 16384,
+        max_wait_ms: float = 20.0,
+        max_queue_chunks: int = 256,
+        frame_len_fn: Callable[[Any], int] = lambda chunk: chunk.duration,
+        name: str = "tts_scheduler",
+        decode_fn: Optional[Callable[[List[Any], List[Any]], List[Future]]] = None
+    ):
+        self.sample_fn = sample_fn
+        self.decode_fn = decode_fn
+        self.max_batch_size = max_batch_size
+        self.max_batch_frames = max_batch_frames
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_chunks = max_queue_chunks
+        self.frame_len_fn = frame_len_fn
+        self.name = name
+
+        # Hàng đợi các (request, chunk index) chưa chạy
+        self._queue: Deque[Tuple[_PendingRequest, int]] = deque()
+        self._cond = threading.Condition()
+        self._running = True
+        # Kết quả có thể được ghi từ worker lẫn từ callback của decode_fn
+        self._results_lock = threading.Lock()
+
+        self._stats = {
+            "submitted_requests": 0,
+            "completed_requests": 0,
+            "failed_requests": 0,
+            "rejected_requests": 0,
+            "batches": 0,
+            "batched_chunks": 0,
+            "padded_frames": 0,
+            "useful_frames": 0,
+            "max_queue_depth": 0
+        }
+
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    # ------------------------------------------------------------------
+    # Submit
+    # ------------------------------------------------------------------
+
+    def submit(
+        self,
+        chunks: Sequence[Any],
+        params: Optional[Dict[str, Any]] = None,
+        block: bool = True,
+        timeout: Optional[float] = None,
+        decode: bool = True
+    ) -> Future:
+        """
+        Đưa các chunk của một request vào hàng đợi.
+        decode=False: bỏ qua decode_fn, kết quả là output của sample_fn
+        Returns: Future trả về list kết quả theo thứ tự chunk
+        Raises: TTSQueueFullError nếu hàng đợi đầy (block=False hoặc quá timeout)
+        """
+        request = _PendingRequest(chunks, dict(params or {}), decode=decode)
+        if not request.chunks:
+            request.future.set_result([])
+            return request.future
+
+        # Request lớn hơn cả hàng đợi vẫn được nhận khi hàng đợi trống, tránh chờ mãi
+        needed = min(len(request.chunks), self.max_queue_chunks)
+        deadline = None if timeout is None else time.time() + timeout
+
+        with self._cond:
+            while self._running and len(self._queue) + needed > self.max_queue_chunks:
+                remaining = None if deadline is None else deadline - time.time()
+                if not block or (remaining is not None and remaining <= 0):
+                    self._stats["rejected_requests"] += 1
+                    raise TTSQueueFullError(
+                        f"TTS queue is full ({len(self._queue)}/{self.max_queue_chunks} chunks)"
+                    )
+                self._cond.wait(remaining)
+
+            if not self._running:
+                raise RuntimeError("TTS scheduler is stopped")
+
+            self._queue.extend((request, i) for i in range(len(request.chunks)))
+            self._stats["submitted_requests"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._queue))
+            self._cond.notify_all()
+
+        return request.future
+
+    def run(
+        self,
+        chunks: Sequence[Any],
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        decode: bool = True
+    ) -> List[Any]:
+        """Submit và chờ kết quả (cho code đồng bộ)"""
+        return self.submit(chunks, params, timeout=timeout, decode=decode).result()
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _collect(self) -> List[Tuple[_PendingRequest, int]]:
+        """Chờ chunk đầu tiên, sau đó gom thêm trong cửa sổ max_wait"""
+        with self._cond:
+            while self._running and not self._queue:
+                self._cond.wait()
+            if not self._running:
+                return []
+
+            window_end = time.time() + self.max_wait
+            while len(self._queue) < self.max_batch_size:
+                remaining = window_end - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            return list(self._queue)
+
+    def _plan_batch(self, pending: List[Tuple[_PendingRequest, int]]) -> List[Tuple[_PendingRequest, int]]:
+        """
+        Chọn batch kế tiếp: cùng params với chunk cũ nhất (FIFO công bằng), sắp theo duration,
+        mở rộng quanh chunk cũ nhất trong giới hạn số chunk và ngân sách frame.
+        """
+        head = pending[0]
+        params_key = _params_key(head[0].params)
+        candidates = [item for item in pending if _params_key(item[0].params) == params_key]
+        candidates.sort(key=self._item_len)
+
+        lo = hi = next(i for i, item in enumerate(candidates) if item is head)
+        head_len = max_len = self._item_len(head)
+
+        # Mở rộng sang hai phía, ưu tiên chunk có độ dài gần nhất để padding ít
+        while hi - lo + 1 < self.max_batch_size:
+            options = [i for i in (lo - 1, hi + 1) if 0 <= i < len(candidates)]
+            if not options:
+                break
+            best = min(options, key=lambda i: abs(self._item_len(candidates[i]) - head_len))
+            new_max = max(max_len, self._item_len(candidates[best]))
+            if (hi - lo + 2) * new_max > self.max_batch_frames:
+                break
+            max_len = new_max
+            lo, hi = min(lo, best), max(hi, best)
+
+        return candidates[lo:hi + 1]
+
+    def _item_len(self, item: Tuple[_PendingRequest, int]) -> int:
+        request, index = item
+        return self.frame_len_fn(request.chunks[index])
+
+    def _run(self):
+        while True:
+            pending = [item for item in self._collect() if not item[0].future.done()]
+            if not pending:
+                # Bỏ các chunk của request đã lỗi/hủy
+                with self._cond:
+                    self._queue = deque(item for item in self._queue if not item[0].future.done())
+                    self._cond.notify_all()
+                if not self._running:
+                    return
+                continue
+
+            batch = self._plan_batch(pending)
+            with self._cond:
+                selected = set(id(item) for item in batch)
+                self._queue = deque(item for item in self._queue if id(item) not in selected)
+                # Giải phóng chỗ trong hàng đợi cho các submit đang chờ
+                self._cond.notify_all()
+
+            self._execute(batch)
+
+    def _execute(self, batch: List[Tuple[_PendingRequest, int]]):
+        chunks = [request.chunks[index] for request, index in batch]
+        params = batch[0][0].params
+
+        lens = [self.frame_len_fn(chunk) for chunk in chunks]
+        self._stats["batches"] += 1
+        self._stats["batched_chunks"] += len(chunks)
+        self._stats["useful_frames"] += sum(lens)
+        self._stats["padded_frames"] += len(lens) * max(lens)
+
+        try:
+            outputs = self.sample_fn(chunks, **params)
+        except Exception as e:
+            logger.error(f"❌ [{self.name}] Batch of {len(chunks)} chunks failed: {e}")
+            for request, _ in batch:
+                self._fail(request, e)
+            return
+
+        if self.decode_fn is None:
+            for (request, index), output in zip(batch, outputs):
+                self._complete(request, index, output)
+            return
+
+        # Vocoder chạy trên thread riêng: worker quay lại sample batch kế tiếp ngay, kết quả về qua callback
+        to_decode = [i for i, (request, _) in enumerate(batch) if request.decode]
+        for i, (request, index) in enumerate(batch):
+            if not request.decode:
+                self._complete(request, index, outputs[i])
+        if not to_decode:
+            return
+        try:
+            futures = self.decode_fn([chunks[i] for i in to_decode], [outputs[i] for i in to_decode])
+        except Exception as e:
+            logger.error(f"❌ [{self.name}] Decode of {len(to_decode)} chunks failed: {e}")
+            for i in to_decode:
+                self._fail(batch[i][0], e)
+            return
+        for i, future in zip(to_decode, futures):
+            request, index = batch[i]
+            future.add_done_callback(functools.partial(self._on_decoded, request, index))
+
+    def _on_decoded(self, request: _PendingRequest, index: int, future: Future):
+        error = future.exception()
+        if error is not None:
+            logger.error(f"❌ [{self.name}] Decode failed: {error}")
+            self._fail(request, error)
+        else:
+            self._complete(request, index, future.result())
+
+    def _complete(self, request: _PendingRequest, index: int, output: Any):
+        with self._results_lock:
+            if request.future.done():
+                return
+            request.results[index] = output
+            request.remaining -= 1
+            if request.remaining == 0:
+                request.future.set_result(request.results)
+                self._stats["completed_requests"] += 1
+
+    def _fail(self, request: _PendingRequest, error: BaseException):
+        with self._results_lock:
+            if not request.future.done():
+                request.future.set_exception(error)
+                self._stats["failed_requests"] += 1
+
+    # ------------------------------------------------------------------
+    # Lifecycle & metrics
+    # ------------------------------------------------------------------
+
+    def queue_depth(self) -> int:
+        """Số chunk đang chờ trong hàng đợi"""
+        with self._cond:
+            return len(self._queue)
+
+    def shutdown(self):
+        """Dừng worker; các request còn trong hàng đợi bị hủy"""
+        with self._cond:
+            self._running = False
+            pending = list(self._queue)
+            self._queue.clear()
+            self._cond.notify_all()
+        for request, _ in pending:
+            if not request.future.done():
+                request.future.set_exception(RuntimeError("TTS scheduler is stopped"))
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats["queue_depth"] = self.queue_depth()
+        stats["max_queue_chunks"] = self.max_queue_chunks
+        stats["avg_batch_size"] = stats["batched_chunks"] / stats["batches"] if stats["batches"] else 0.0
+        stats["padding_efficiency"] = (
+            stats["useful_frames"] / stats["padded_frames"] if stats["padded_frames"] else 1.0
+        )
+        return stats
+
+
+def _params_key(params: Dict[str, Any]) -> Tuple:
+    return tuple(sorted(params.items()))
@@ -24,8 +24,9 @@ from model import DiT
 from infer.utils_infer import (
     load_vocoder,
     load_model,
-    preprocess_ref_audio_text,
+    get_voice_prompt,
     infer_process,
+    load_transcript_store,
 )
 
 logger = logging.getLogger(__name__)
@@ -43,7 +44,9 @@ class TTSService:
         
         self.vocoder = None
         self.model = None
+        self.sample_fn = None  # None = đường torch của infer_process; backend ONNX thay bằng bản ONNX Runtime
         self.available_characters: dict = {}
+        self.transcript_stores: dict = {}  # character -> file transcript ASR đã lưu
         
         # Tạo các thư mục cần thiết
         self.config.create_directories()
@@ -61,6 +64,7 @@ class TTSService:
             for audio_file in audio_samples_dir.glob("*.wav"):
                 character_name = audio_file.stem  # Lấy tên file không có extension
                 self.available_characters[character_name] = str(audio_file)
+                self._register_transcript_store(character_name)
                 logger.info(f"Đã thêm giọng nói: {character_name} -> {audio_file}")
         
         # Nếu không có file nào
@@ -72,6 +76,18 @@ class TTSService:
     def _load_models(self):
         """Tải mô hình F5-TTS và Vocoder khi khởi động."""
         try:
+            if self.config.INFERENCE_BACKEND == "onnx":
+                # DiT + Vocos đã export (infer/export_onnx.py), chạy bằng ONNX Runtime trên CPU
+                from infer.utils_onnx import OnnxF5TTS, OnnxVocos, sample_chunk_batch
+
+                logger.info(f"Đang tải mô hình ONNX từ {self.config.ONNX_MODEL_DIR}...")
+                num_threads = self.config.CPU_NUM_THREADS or None
+                self.model = OnnxF5TTS(str(self.config.ONNX_MODEL_DIR), num_threads=num_threads)
+                self.vocoder = OnnxVocos(str(self.config.ONNX_MODEL_DIR), num_threads=num_threads)
+                self.sample_fn = sample_chunk_batch
+                logger.info("Tải mô hình ONNX thành công.")
+                return
+
             # Đảm bảo device consistency
             device = self.config.get_device()
             logger.info(f"Sử dụng device: {device}")
@@ -175,18 +191,31 @@ class TTSService:
             logger.info(f"Final fallback normalization: '{text}' -> '{normalized_text}'")
             return normalized_text
 
-    def add_character_voice(self, character_name: str, reference_audio_path: str):
+    def _register_transcript_store(self, character_name: str, transcript_store: str = None):
+        """Gắn file transcript của nhân vật và nạp sẵn vào cache, để không phải load ASR khi đã có transcript."""
+        path = str(transcript_store or self.config.get_transcript_store_path(character_name))
+        self.transcript_stores[character_name] = path
+        cached = load_transcript_store(path)
+        if cached:
+            logger.info(f"Đã nạp {len(cached)} transcript cho '{character_name}' từ {path}")
+
+    def add_character_voice(self, character_name: str, reference_audio_path: str, transcript_store: str = None):
         """Lưu đường dẫn đến file audio mẫu cho một nhân vật."""
         if not Path(reference_audio_path).exists():
             logger.warning(f"File audio tham chiếu cho '{character_name}' không tồn tại tại: {reference_audio_path}")
             return
         self.available_characters[character_name] = reference_audio_path
+        self._register_transcript_store(character_name, transcript_store)
         logger.info(f"Đã thêm giọng nói tham chiếu cho nhân vật: '{character_name}'")
 
     def get_available_characters(self) -> list[str]:
         """Lấy danh sách các nhân vật đã có giọng nói."""
         return list(self.available_characters.keys())
 
+    def _get_device(self) -> str:
+        """Device cho tensor tham chiếu; backend ONNX luôn chạy trên CPU"""
+        return "cpu" if self.sample_fn is not None else self.config.get_device()
+
     def synthesize_speech(self, text: str, character_name: str, speed: float = 1.0) -> str:
         """
         Tạo giọng nói từ văn bản, sử dụng audio mẫu của nhân vật.
@@ -203,7 +232,17 @@ class TTSService:
             
         try:
             # 1. Tiền xử lý âm thanh - GIỐNG APP.PY GỐC: truyền empty string cho ref_text
-            ref_audio, ref_text = preprocess_ref_audio_text(reference_audio_path, "")
+            # Voice prompt (audio đã cắt/chuẩn hóa, transcript, mel) được cache theo file, chỉ xử lý lần đầu
+            ref_audio = get_voice_prompt(
+                reference_audio_path,
+                "",
+                # Backend ONNX: mel tham chiếu được tính trong sample_chunk_batch của ONNX
+                model_obj=self.model if self.sample_fn is None else None,
+                device=self._get_device(),
+                cache_dir=str(self.config.VOICE_PROMPT_CACHE_DIR),
+                transcript_store=self.transcript_stores.get(character_name)
+            )
+            ref_text = ref_audio.ref_text
 
             # 2. Chuẩn hóa và xử lý văn bản - GIỐNG APP.PY GỐC
             normalized_text = self._normalize_vietnamese_text(text)
@@ -213,7 +252,7 @@ class TTSService:
             logger.info(f"Bắt đầu tạo giọng nói cho '{character_name}' với văn bản: '{processed_text}'...")
             
             # Device consistency check
-            device = self.config.get_device()
+            device = self._get_device()
             logger.info(f"Inference device: {device}")
             
             try:
@@ -223,10 +262,14 @@ class TTSService:
                     processed_text.lower(), 
                     self.model, 
                     self.vocoder, 
-                    speed=speed
+                    speed=speed,
+                    device=device,
+                    batch_size=self.config.INFER_BATCH_SIZE,
+                    max_batch_frames=self.config.MAX_BATCH_FRAMES,
+                    sample_fn=self.sample_fn
                 )
             except RuntimeError as device_error:
-                if "device" in str(device_error).lower():
+                if "device" in str(device_error).lower() and self.sample_fn is None:
                     logger.warning(f"Device error với {device}, thử lại với CPU...")
                     # Fallback to CPU và update config
                     self.config.set_device("cpu")
@@ -240,7 +283,10 @@ class TTSService:
                         processed_text.lower(), 
                         self.model, 
                         self.vocoder, 
-                        speed=speed
+                        speed=speed,
+                        device="cpu",
+                        batch_size=self.config.INFER_BATCH_SIZE,
+                        max_batch_frames=self.config.MAX_BATCH_FRAMES
                     )
                     logger.info("Thành công với CPU fallback")
                 else:
@@ -4,14 +4,21 @@ Singleton TTS Service cho production deployment
 Tối ưu hóa khởi tạo và quản lý memory cho frontend
 """
 import asyncio
+import functools
+import hashlib
 import logging
+import random
 import threading
 import time
 from pathlib import Path
-from typing import Dict, Optional, Union, Any
+from typing import Dict, Iterator, Optional, Union, Any, Tuple
+import numpy as np
 import torch
 
 from .tts_config import TTSConfig
+from .tts_scheduler import TTSScheduler
+from ..utils.single_flight import SingleFlight
+from ..utils.audio_cache import AudioCache, make_audio_cache_key
 
 logger = logging.getLogger(__name__)
 
@@ -47,16 +54,47 @@ class TTSServiceSingleton:
         
         # Core attributes
         self.config = TTSConfig()
-        self.device = self.config.get_device()
+        self._backend = self.config.INFERENCE_BACKEND
+        if self._backend not in self.config.INFERENCE_BACKENDS:
+            raise ValueError(f"Unknown TTS backend: {self._backend} (available: {', '.join(self.config.INFERENCE_BACKENDS)})")
+        # Backend ONNX chạy trên CPU qua ONNX Runtime, tensor tham chiếu cũng để trên CPU
+        self.device = "cpu" if self._backend == "onnx" else self.config.get_device()
         
         # Model storage
         self._base_model = None
         self._character_models: Dict[str, Any] = {}
         self._model_cache_size = 3  # Maximum cached models
         
-        # Audio cache
-        self._audio_cache: Dict[str, bytes] = {}
-        self._cache_max_size = 50  # Maximum cached audio files
+        # Model F5-TTS; checksum nằm trong audio cache key để đổi model không trả audio cũ
+        self._model_name = "F5-TTS"
+        self._model_path = f"hf://{self.config.HUGGING_FACE_REPO}/{self.config.MODEL_CHECKPOINT}"
+        # Trên CPU, chế độ int8/bf16 cho audio khác fp32 một chút nên cũng nằm trong checksum (attention window cũng vậy)
+        self._cpu_mode = self.config.CPU_INFERENCE_MODE if self.device == "cpu" and self._backend == "torch" else None
+        self._compiled = False
+        # torch.compile (mode, bucket) có thể cho audio khác eager ở mức làm tròn float nên cũng nằm trong checksum
+        self._compile_config = (
+            (self.config.COMPILE_MODE, tuple(self.config.COMPILE_DURATION_BUCKETS))
+            if self.config.COMPILE_MODEL and self._backend == "torch" else None
+        )
+        self._model_checksum = hashlib.sha1(
+            f"{self._model_name}|{self._model_path}|{self.config.MEL_SPEC_TYPE}|{self._cpu_mode}|{self._backend}|"
+            f"{self.config.ATTN_WINDOW_SIZE}|{self._compile_config}".encode()
+        ).hexdigest()[:16]
+        
+        # Audio cache: memory LRU giới hạn theo byte + disk FLAC (giữ qua restart)
+        self._audio_cache = AudioCache(
+            max_memory_bytes=self.config.AUDIO_CACHE_MEMORY_MB * 1024 * 1024,
+            cache_dir=self.config.AUDIO_CACHE_DIR,
+            max_disk_bytes=self.config.AUDIO_CACHE_DISK_MB * 1024 * 1024
+        )
+        self._voice_hashes: Dict[tuple, str] = {}
+        
+        # Gộp các request synthesis trùng cache key đang chạy song song
+        self._inflight = SingleFlight("tts_synthesize")
+        
+        # Dynamic batching scheduler + vocoder thread (khởi tạo sau khi load model)
+        self._scheduler: Optional[TTSScheduler] = None
+        self._vocoder_service = None
         
         # Performance tracking
         self._stats = {
@@ -64,6 +102,7 @@ class TTSServiceSingleton:
             'cache_hits': 0,
             'model_loads': 0,
             'inference_times': [],
+            'first_chunk_times': [],
             'startup_time': time.time()
         }
         
@@ -75,11 +114,60 @@ class TTSServiceSingleton:
     
     def _get_cache_key(self, text: str, character: str, **kwargs) -> str:
         """Generate cache key for audio requests"""
-        import hashlib
+        return make_audio_cache_key(
+            text,
+            voice_hash=self._get_voice_hash(character),
+            model_checksum=self._model_checksum,
+            speed=kwargs.get('speed', 1.0),
+            seed=kwargs.get('seed'),
+            **self._get_sample_params(**kwargs)
+        )
+    
+    def _get_sample_params(self, **kwargs) -> Dict[str, Any]:
+        """
+        Tham số sample cho scheduler: preset (kwargs['preset'] hoặc DEFAULT_SAMPLER_PRESET),
+        các tham số truyền riêng (nfe_step, cfg_strength, ...) ghi đè preset
+        Raises: ValueError nếu preset không tồn tại
+        """
+        params = {
+            'nfe_step': self.config.DEFAULT_NFE_STEP,
+            'cfg_strength': self.config.DEFAULT_CFG_STRENGTH,
+            'sway_sampling_coef': self.config.SWAY_SAMPLING_COEF,
+            'sampler': None
+        }
+        params.update(self.config.get_sampler_preset(kwargs.get('preset')))
+        for name in ('nfe_step', 'cfg_strength', 'sway_sampling_coef', 'sampler', 'adaptive_tol'):
+            if kwargs.get(name) is not None:
+                params[name] = kwargs[name]
+        return params
+    
+    def resolve_seed(self, seed: Optional[int] = None) -> int:
+        """
+        Seed thực sự dùng cho request: None -> DEFAULT_SEED, -1 -> seed ngẫu nhiên mới
+        Seed nằm trong cache key, nên audio cache chỉ trả về đúng mẫu đã sinh với seed đó
+        """
+        if seed is None:
+            return self.config.DEFAULT_SEED
+        if seed == -1:
+            return random.randint(0, 2**31 - 1)
+        return int(seed)
+    
+    def _get_voice_hash(self, character: str) -> str:
+        """Hash nội dung audio tham chiếu + reference text (cache theo path/mtime/size)"""
+        ref_audio_path, ref_text = self._resolve_reference(character)
+        try:
+            stat = Path(ref_audio_path).stat()
+        except OSError:
+            return f"missing:{character}"
         
-        # Include all relevant parameters in cache key
-        cache_data = f"{text}|{character}|{kwargs.get('speed', 1.0)}|{kwargs.get('temperature', 0.7)}"
-        return hashlib.md5(cache_data.encode()).hexdigest()
+        file_key = (ref_audio_path, stat.st_mtime_ns, stat.st_size, ref_text)
+        voice_hash = self._voice_hashes.get(file_key)
+        if voice_hash is None:
+            digest = hashlib.sha1(Path(ref_audio_path).read_bytes())
+            digest.update(ref_text.encode("utf-8"))
+            voice_hash = digest.hexdigest()
+            self._voice_hashes[file_key] = voice_hash
+        return voice_hash
     
     def _load_base_model(self):
         """Lazy load base model"""
@@ -98,18 +186,27 @@ class TTSServiceSingleton:
                 import sys
                 from pathlib import Path
                 
-                # Add F5-TTS path
-                f5_tts_path = Path(__file__).parent.parent.parent / "f5_tts_source" / "src"
-                if str(f5_tts_path) not in sys.path:
-                    sys.path.insert(0, str(f5_tts_path))
+                # Add cloneVoice path (bản F5-TTS có batching/streaming/compile, như tts_service.py)
+                clonevoice_path = Path(__file__).resolve().parent.parent / "services" / "cloneVoice"
+                if str(clonevoice_path) not in sys.path:
+                    sys.path.insert(0, str(clonevoice_path))
                 
-                from f5_tts.model import DiT
-                from f5_tts.infer.utils_infer import (
+                from model import DiT
+                from infer.utils_infer import (
                     load_model,
                     load_vocoder,
-                    preprocess_ref_audio_text,
+                    get_voice_prompt,
                     infer_process,
-                    remove_silence_for_generated_wav
+                    split_gen_text,
+                    build_chunk_requests,
+                    prepare_chunk_tokens,
+                    sample_chunk_mels,
+                    chunk_gain,
+                    VocoderService,
+                    combine_chunk_waves,
+                    CrossFadeStream,
+                    remove_silence_from_wave,
+                    compile_model
                 )
                 
                 # Store imports for later use
@@ -117,21 +214,88 @@ class TTSServiceSingleton:
                     'DiT': DiT,
                     'load_model': load_model,
                     'load_vocoder': load_vocoder,
-                    'preprocess_ref_audio_text': preprocess_ref_audio_text,
+                    'get_voice_prompt': get_voice_prompt,
                     'infer_process': infer_process,
-                    'remove_silence_for_generated_wav': remove_silence_for_generated_wav
+                    'split_gen_text': split_gen_text,
+                    'build_chunk_requests': build_chunk_requests,
+                    'prepare_chunk_tokens': prepare_chunk_tokens,
+                    'chunk_gain': chunk_gain,
+                    'combine_chunk_waves': combine_chunk_waves,
+                    'CrossFadeStream': CrossFadeStream,
+                    'remove_silence_from_wave': remove_silence_from_wave,
+                    'compile_model': compile_model,
+                    'sample_fn': None  # None = torch: sample_chunk_mels + VocoderService
                 }
                 
-                # Load model
-                model_name = "F5-TTS"
-                model_path = "hf://SWivid/F5-TTS-Vietnamese-ViVoice/model_1200000.safetensors"
+                if self._backend == "onnx":
+                    # DiT + Vocos đã export sang ONNX (infer/export_onnx.py), chạy bằng ONNX Runtime
+                    from infer.utils_onnx import OnnxF5TTS, OnnxVocos
+                    from infer.utils_onnx import sample_chunk_batch as onnx_sample_chunk_batch
+                    
+                    num_threads = self.config.CPU_NUM_THREADS or None
+                    self._base_model = OnnxF5TTS(str(self.config.ONNX_MODEL_DIR), num_threads=num_threads)
+                    self._vocoder = OnnxVocos(str(self.config.ONNX_MODEL_DIR), num_threads=num_threads)
+                    self._f5_imports['sample_fn'] = onnx_sample_chunk_batch
+                    logger.info(f"📦 ONNX Runtime backend: {self.config.ONNX_MODEL_DIR}")
+                else:
+                    # Load model (như TTSService._load_models)
+                    model_paths = self.config.get_model_paths()
+                    self._base_model = self._f5_imports['load_model'](
+                        DiT,
+                        self.config.MODEL_CONFIG,
+                        ckpt_path=model_paths["model_path"],
+                        vocab_file=model_paths["vocab_path"],
+                        device=self.device,
+                        cpu_mode=self._cpu_mode,
+                        cpu_threads=self.config.CPU_NUM_THREADS,
+                        quant_cache_dir=str(self.config.QUANTIZED_MODEL_CACHE_DIR)
+                    )
+                    self._vocab_char_map = self._base_model.vocab_char_map
+                    
+                    # Load vocoder
+                    self._vocoder = self._f5_imports['load_vocoder'](
+                        vocoder_name=self.config.VOCODER_NAME, device=self.device, cpu_mode=self._cpu_mode
+                    )
                 
-                self._base_model, self._vocab_char_map, self._vocab_size = self._f5_imports['load_model'](
-                    model_name, model_path, self.device
-                )
+                # Compile bước ODE theo bucket (warmup ngay tại đây, không để request đầu tiên chịu thời gian compile)
+                if self.config.COMPILE_MODEL and self._backend == "torch":
+                    self._compiled = self._f5_imports['compile_model'](
+                        self._base_model,
+                        duration_buckets=self.config.COMPILE_DURATION_BUCKETS,
+                        mode=self.config.COMPILE_MODE,
+                        show_info=logger.info
+                    )
+                    if not self._compiled:
+                        logger.warning("⚠️ Compiled inference unavailable, using eager mode")
                 
-                # Load vocoder
-                self._vocoder = self._f5_imports['load_vocoder']()
+                # Một inference worker duy nhất gom chunk từ mọi request vào batch
+                if self._backend == "torch":
+                    # Worker chỉ sample mel; vocoder thread decode trong lúc worker sample batch kế tiếp
+                    self._vocoder_service = VocoderService(
+                        self._vocoder,
+                        mel_spec_type=self.config.MEL_SPEC_TYPE,
+                        max_batch_size=self.config.VOCODER_MAX_BATCH_SIZE,
+                        max_batch_frames=self.config.VOCODER_MAX_BATCH_FRAMES
+                    )
+                    sample_fn = functools.partial(sample_chunk_mels, model_obj=self._base_model)
+                    decode_fn = self._decode_chunks
+                else:
+                    sample_fn = functools.partial(
+                        self._f5_imports['sample_fn'],
+                        model_obj=self._base_model,
+                        vocoder=self._vocoder,
+                        mel_spec_type=self.config.MEL_SPEC_TYPE,
+                        target_rms=self.config.TARGET_RMS
+                    )
+                    decode_fn = None
+                self._scheduler = TTSScheduler(
+                    sample_fn=sample_fn,
+                    decode_fn=decode_fn,
+                    max_batch_size=self.config.INFER_BATCH_SIZE,
+                    max_batch_frames=self.config.MAX_BATCH_FRAMES,
+                    max_wait_ms=self.config.SCHEDULER_MAX_WAIT_MS,
+                    max_queue_chunks=self.config.SCHEDULER_MAX_QUEUE_CHUNKS
+                )
                 
                 load_time = time.time() - start_time
                 self._stats['model_loads'] += 1
@@ -143,6 +307,13 @@ class TTSServiceSingleton:
                 logger.error(f"❌ Failed to load base model: {e}")
                 raise
     
+    def _decode_chunks(self, chunks: list, mels: list) -> list:
+        """decode_fn của scheduler: đưa mel sang vocoder thread, future trả về (wave, mel)"""
+        return [
+            self._vocoder_service.submit(mel, gain=self._f5_imports['chunk_gain'](chunk, self.config.TARGET_RMS))
+            for chunk, mel in zip(chunks, mels)
+        ]
+    
     def _load_character_model(self, character: str) -> Any:
         """Load character-specific tuned model"""
         if character in self._character_models:
@@ -181,32 +352,44 @@ class TTSServiceSingleton:
             logger.error(f"❌ Failed to load character model for {character}: {e}")
             return self._base_model
     
+    def _resolve_reference(self, character: str) -> Tuple[str, str]:
+        """Đường dẫn audio tham chiếu và reference text của nhân vật"""
+        # Default reference
+        ref_audio_path = f"data/audio_samples/{character}.wav"
+        ref_text = ""  # Empty for voice cloning
+        
+        # Check for character-specific reference
+        character_ref_path = f"data/voices/{character}/reference.wav"
+        if Path(character_ref_path).exists():
+            ref_audio_path = character_ref_path
+            
+            # Try to load metadata for reference text
+            metadata_path = f"data/voices/{character}/metadata.json"
+            if Path(metadata_path).exists():
+                import json
+                with open(metadata_path, 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+                    ref_text = metadata.get('reference_text', "")
+        
+        return ref_audio_path, ref_text
+    
     def _get_reference_audio(self, character: str) -> tuple:
         """Get reference audio for character"""
         try:
-            # Default reference
-            ref_audio_path = f"data/audio_samples/{character}.wav"
-            ref_text = ""  # Empty for voice cloning
-            
-            # Check for character-specific reference
-            character_ref_path = f"data/voices/{character}/reference.wav"
-            if Path(character_ref_path).exists():
-                ref_audio_path = character_ref_path
-                
-                # Try to load metadata for reference text
-                metadata_path = f"data/voices/{character}/metadata.json"
-                if Path(metadata_path).exists():
-                    import json
-                    with open(metadata_path, 'r', encoding='utf-8') as f:
-                        metadata = json.load(f)
-                        ref_text = metadata.get('reference_text', "")
+            ref_audio_path, ref_text = self._resolve_reference(character)
             
-            # Preprocess audio
-            ref_audio, ref_text_processed = self._f5_imports['preprocess_ref_audio_text'](
-                ref_audio_path, ref_text, device=self.device
+            # Voice prompt cache: audio đã cắt/chuẩn hóa, transcript và mel chỉ xử lý một lần mỗi file
+            voice_prompt = self._f5_imports['get_voice_prompt'](
+                ref_audio_path,
+                ref_text,
+                # Backend ONNX: mel tham chiếu được tính trong sample_chunk_batch của ONNX
+                model_obj=self._base_model if self._backend == "torch" else None,
+                device=self.device,
+                cache_dir=str(self.config.VOICE_PROMPT_CACHE_DIR),
+                transcript_store=str(self.config.get_transcript_store_path(character))
             )
             
-            return ref_audio, ref_text_processed
+            return voice_prompt, voice_prompt.ref_text
             
         except Exception as e:
             logger.error(f"❌ Failed to get reference audio for {character}: {e}")
@@ -219,8 +402,21 @@ class TTSServiceSingleton:
         **kwargs
     ) -> bytes:
         """Async synthesis method"""
+        audio_bytes, _ = await self.synthesize_with_cache_info_async(text, character, **kwargs)
+        return audio_bytes
+    
+    async def synthesize_with_cache_info_async(
+        self,
+        text: str,
+        character: str = "gia_cat_luong",
+        **kwargs
+    ) -> Tuple[bytes, Optional[str]]:
+        """Async synthesis, trả về (audio_bytes, cache_tier)"""
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.synthesize_speech, text, character, **kwargs)
+        # run_in_executor không nhận kwargs, phải bọc bằng partial
+        return await loop.run_in_executor(
+            None, functools.partial(self.synthesize_with_cache_info, text, character, **kwargs)
+        )
     
     def synthesize_speech(
         self,
@@ -231,54 +427,163 @@ class TTSServiceSingleton:
         """
         Main synthesis method với caching và optimization
         """
+        audio_bytes, _ = self.synthesize_with_cache_info(text, character, **kwargs)
+        return audio_bytes
+    
+    def synthesize_with_cache_info(
+        self,
+        text: str,
+        character: str = "gia_cat_luong",
+        use_cache: bool = True,
+        **kwargs
+    ) -> Tuple[bytes, Optional[str]]:
+        """
+        Synthesis với cache hai tầng
+        Returns: (audio_bytes, cache_tier) với cache_tier là "memory"/"disk" khi hit, None khi phải synthesize
+        """
         start_time = time.time()
         self._stats['total_requests'] += 1
+        kwargs['seed'] = self.resolve_seed(kwargs.get('seed'))
         
-        try:
-            # Check cache first
-            cache_key = self._get_cache_key(text, character, **kwargs)
-            if cache_key in self._audio_cache:
+        # Check cache first
+        cache_key = self._get_cache_key(text, character, **kwargs)
+        if use_cache:
+            audio_bytes, tier = self._audio_cache.get(cache_key)
+            if audio_bytes is not None:
                 self._stats['cache_hits'] += 1
-                logger.info(f"🎯 Cache hit for {character}: {text[:50]}...")
-                return self._audio_cache[cache_key]
-            
-            # Ensure base model is loaded
-            self._load_base_model()
-            
-            # Load character model
-            model = self._load_character_model(character)
-            
-            # Get reference audio
-            ref_audio, ref_text = self._get_reference_audio(character)
+                logger.info(f"🎯 Cache hit ({tier}) for {character}: {text[:50]}...")
+                return audio_bytes, tier
+        
+        # Request trùng đang chạy sẽ chờ và dùng chung kết quả thay vì synthesize lại
+        audio_bytes = self._inflight.do(
+            cache_key, self._synthesize_uncached, text, character, cache_key, start_time, **kwargs
+        )
+        return audio_bytes, None
+    
+    def _prepare_chunks(self, text: str, character: str, tokenize: bool = True, **kwargs) -> Tuple[list, Dict[str, Any]]:
+        """
+        Load model, tách text thành ChunkRequest và tham số sample cho scheduler.
+        tokenize=True: chuyển text -> token ngay trên thread của request, worker của scheduler chỉ còn sample
+        """
+        # Ensure base model is loaded
+        self._load_base_model()
+        
+        # Tuned character models chưa được hỗ trợ (_load_character_model trả về base model),
+        # scheduler chạy trên base model cho mọi nhân vật
+        
+        # Get reference audio
+        ref_audio, ref_text = self._get_reference_audio(character)
+        
+        logger.info(f"🎤 Synthesizing for {character}: {text[:50]}...")
+        
+        # Tách text thành chunk và đưa vào scheduler; chunk của nhiều request được gộp chung batch
+        gen_text_batches = self._f5_imports['split_gen_text'](
+            ref_audio.audio.shape[-1] / self.config.TARGET_SAMPLE_RATE, ref_text, text
+        )
+        chunks = self._f5_imports['build_chunk_requests'](
+            ref_audio,
+            ref_text,
+            gen_text_batches,
+            target_rms=self.config.TARGET_RMS,
+            speed=kwargs.get('speed', 1.0),
+            device=self.device,
+            seed=kwargs['seed']
+        )
+        if tokenize:
+            self._f5_imports['prepare_chunk_tokens'](chunks)
+        return chunks, self._get_sample_params(**kwargs)
+    
+    def synthesize_stream(
+        self,
+        text: str,
+        character: str = "gia_cat_luong",
+        use_cache: bool = True,
+        **kwargs
+    ) -> Iterator[np.ndarray]:
+        """
+        Streaming synthesis: yield từng đoạn waveform float32 (TARGET_SAMPLE_RATE) ngay khi chunk được vocode
+        Cross-fade áp dụng dần với phần đuôi của chunk trước. Audio stream không qua bước cắt silence
+        nên không được ghi vào cache; cache hit thì trả về cả audio một lần.
+        """
+        start_time = time.time()
+        self._stats['total_requests'] += 1
+        kwargs['seed'] = self.resolve_seed(kwargs.get('seed'))
+        
+        if use_cache:
+            audio_bytes, tier = self._audio_cache.get(self._get_cache_key(text, character, **kwargs))
+            if audio_bytes is not None:
+                import io
+                import soundfile as sf
+                
+                self._stats['cache_hits'] += 1
+                logger.info(f"🎯 Cache hit ({tier}) for {character} stream: {text[:50]}...")
+                wave, _ = sf.read(io.BytesIO(audio_bytes), dtype='float32')
+                yield wave
+                return
+        
+        chunks, sample_params = self._prepare_chunks(text, character, tokenize=False, **kwargs)
+        prepare_chunk_tokens = self._f5_imports['prepare_chunk_tokens']
+        cross_fade = self._f5_imports['CrossFadeStream'](
+            kwargs.get('cross_fade_duration', self.config.CROSS_FADE_DURATION),
+            self.config.TARGET_SAMPLE_RATE
+        )
+        
+        # Chunk đầu chạy riêng để có audio sớm nhất; text của các chunk còn lại được chuyển token trong lúc
+        # chunk đầu đang sample, rồi submit (mỗi chunk một future) để scheduler gộp batch khi client phát chunk đầu
+        if self._vocoder_service is not None:
+            # Chunk đầu lấy mel rồi vocode theo cửa sổ frame: cửa sổ đầu tiên phát ngay, không chờ vocode cả chunk
+            first = self._scheduler.submit(prepare_chunk_tokens(chunks[:1]), sample_params, decode=False)
+            rest = [self._scheduler.submit([chunk], sample_params) for chunk in prepare_chunk_tokens(chunks[1:])]
+            first_mel = first.result()[0]
+            pieces = self._vocoder_service.stream(
+                first_mel,
+                gain=self._f5_imports['chunk_gain'](chunks[0], self.config.TARGET_RMS),
+                window_frames=self.config.VOCODER_STREAM_WINDOW_FRAMES,
+                overlap_frames=self.config.VOCODER_STREAM_OVERLAP_FRAMES,
+                context_frames=self.config.VOCODER_STREAM_CONTEXT_FRAMES
+            )
+            for i, piece in enumerate(pieces):
+                if i == 0:
+                    self._stats['first_chunk_times'].append(time.time() - start_time)
+                yield cross_fade.push(piece, new_chunk=i == 0)
+        else:
+            first = self._scheduler.submit(prepare_chunk_tokens(chunks[:1]), sample_params)
+            rest = [self._scheduler.submit([chunk], sample_params) for chunk in prepare_chunk_tokens(chunks[1:])]
+            first = first.result()
             
-            logger.info(f"🎤 Synthesizing for {character}: {text[:50]}...")
+            self._stats['first_chunk_times'].append(time.time() - start_time)
+            yield cross_fade.push(first[0][0])
+        for future in rest:
+            yield cross_fade.push(future.result()[0][0])
+        yield cross_fade.flush()
+        
+        self._stats['inference_times'].append(time.time() - start_time)
+    
+    def _synthesize_uncached(
+        self,
+        text: str,
+        character: str,
+        cache_key: str,
+        start_time: float,
+        **kwargs
+    ) -> bytes:
+        """Chạy inference thực sự và ghi kết quả vào cache"""
+        try:
+            chunks, sample_params = self._prepare_chunks(text, character, **kwargs)
             
-            # Inference parameters
-            gen_params = {
-                'cross_fade_duration': kwargs.get('cross_fade_duration', 0.15),
-                'speed': kwargs.get('speed', 1.0),
-                'show_info': kwargs.get('show_info', print),
-                'progress': kwargs.get('progress', lambda x: None),
-                'temperature': kwargs.get('temperature', 0.7),
-                'top_p': kwargs.get('top_p', 0.9),
-                'top_k': kwargs.get('top_k', 0),
-                'repetition_penalty': kwargs.get('repetition_penalty', 1.0),
-                'length_penalty': kwargs.get('length_penalty', 1.0)
-            }
+            # Noise sinh theo seed của từng chunk, DiT và vocoder mask phần pad theo độ dài từng chunk,
+            # nên audio không phụ thuộc batch được gộp chung với ai (chỉ sai khác làm tròn float)
+            results = self._scheduler.run(chunks, sample_params)
             
             # Generate audio
-            final_wave, final_sample_rate, combined_spectrogram = self._f5_imports['infer_process'](
-                ref_audio=ref_audio,
-                ref_text=ref_text,
-                gen_text=text,
-                model_obj=model,
-                vocoder=self._vocoder,
-                mel_spec_type=self.config.mel_spec_type,
-                **gen_params
+            final_wave = self._f5_imports['combine_chunk_waves'](
+                [wave for wave, _ in results],
+                cross_fade_duration=kwargs.get('cross_fade_duration', self.config.CROSS_FADE_DURATION)
             )
+            final_sample_rate = self.config.TARGET_SAMPLE_RATE
             
-            # Remove silence
-            final_wave, _ = self._f5_imports['remove_silence_for_generated_wav'](final_wave)
+            # Remove silence (in memory, trên numpy array)
+            final_wave = self._f5_imports['remove_silence_from_wave'](final_wave, final_sample_rate)
             
             # Convert to bytes
             import io
@@ -288,13 +593,8 @@ class TTSServiceSingleton:
             sf.write(buffer, final_wave, final_sample_rate, format='WAV')
             audio_bytes = buffer.getvalue()
             
-            # Cache result
-            if len(self._audio_cache) >= self._cache_max_size:
-                # Remove oldest cache entry
-                oldest_key = next(iter(self._audio_cache))
-                del self._audio_cache[oldest_key]
-            
-            self._audio_cache[cache_key] = audio_bytes
+            # Cache result (memory + disk)
+            self._audio_cache.put(cache_key, audio_bytes)
             
             # Update stats
             inference_time = time.time() - start_time
@@ -317,6 +617,10 @@ class TTSServiceSingleton:
         if self._stats['inference_times']:
             avg_inference_time = sum(self._stats['inference_times']) / len(self._stats['inference_times'])
         
+        avg_first_chunk_time = 0
+        if self._stats['first_chunk_times']:
+            avg_first_chunk_time = sum(self._stats['first_chunk_times']) / len(self._stats['first_chunk_times'])
+        
         cache_hit_rate = 0
         if self._stats['total_requests'] > 0:
             cache_hit_rate = self._stats['cache_hits'] / self._stats['total_requests'] * 100
@@ -328,9 +632,16 @@ class TTSServiceSingleton:
             'cache_hit_rate_percent': cache_hit_rate,
             'model_loads': self._stats['model_loads'],
             'average_inference_time': avg_inference_time,
+            'average_first_chunk_time': avg_first_chunk_time,
             'cached_models': len(self._character_models),
             'cached_audio_files': len(self._audio_cache),
+            'audio_cache': self._audio_cache.get_stats(),
+            'coalesced_requests': self._inflight.get_stats()['coalesced'],
+            'scheduler': self._scheduler.get_stats() if self._scheduler else None,
+            'vocoder': dict(self._vocoder_service.stats) if self._vocoder_service else None,
             'device': str(self.device),
+            'backend': self._backend,
+            'compiled': self._compiled,
             'base_model_loaded': self._base_model_loaded
         }
     
@@ -346,6 +657,7 @@ class TTSServiceSingleton:
         
         if cache_type == "stats":
             self._stats['inference_times'].clear()
+            self._stats['first_chunk_times'].clear()
             logger.info("🗑️ Stats cleared")
     
     def get_available_characters(self) -> list:
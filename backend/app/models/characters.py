@@ -189,6 +189,13 @@ PREDEFINED_CHARACTERS = {
 }
 
 
+# Giọng TTS (tên voice trong data/voices, data/audio_samples) của từng nhân vật chat
+CHARACTER_VOICE_NAMES = {
+    "zhuge_liang": "gia_cat_luong",
+    "sima_yi": "tu_ma_y",
+}
+
+
 def get_character_by_id(character_id: str) -> Optional[Character]:
     """Lấy thông tin nhân vật theo ID"""
     return PREDEFINED_CHARACTERS.get(character_id)
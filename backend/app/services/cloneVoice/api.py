@@ -18,7 +18,6 @@ from .infer.utils_infer import (
     target_sample_rate,
 )
 from .model import DiT, UNetT
-from .model.utils import seed_everything
 
 
 class F5TTS:
@@ -126,7 +125,6 @@ class F5TTS:
     ):
         if seed == -1:
             seed = random.randint(0, sys.maxsize)
-        seed_everything(seed)
         self.seed = seed
 
         ref_file, ref_text = preprocess_ref_audio_text(ref_file, ref_text, device=self.device)
@@ -148,6 +146,8 @@ class F5TTS:
             speed=speed,
             fix_duration=fix_duration,
             device=self.device,
+            seed=seed,
+            collect_spectrogram=file_spect is not None,
         )
 
         if file_wave is not None:
@@ -17,7 +17,7 @@ from f5_tts.eval.utils_eval import (
     get_librispeech_test_clean_metainfo,
     get_seedtts_testset_metainfo,
 )
-from f5_tts.infer.utils_infer import load_checkpoint, load_vocoder
+from f5_tts.infer.utils_infer import VocoderService, load_checkpoint, load_vocoder
 from f5_tts.model import CFM, DiT, UNetT
 from f5_tts.model.utils import get_tokenizer
 
@@ -164,6 +164,14 @@ def main():
     accelerator.wait_for_everyone()
     start = time.time()
 
+    def save_waves(pending):
+        for utt, future in pending:
+            generated_wave, _ = future.result()
+            torchaudio.save(f"{output_dir}/{utt}.wav", torch.from_numpy(generated_wave).unsqueeze(0), target_sample_rate)
+
+    # vocoding runs on its own thread, overlapping the next prompt batch's sampling
+    vocoder_service = VocoderService(vocoder, mel_spec_type=mel_spec_type)
+    pending = []
     with accelerator.split_between_processes(prompts_all) as prompts:
         for prompt in tqdm(prompts, disable=not accelerator.is_local_main_process):
             utts, ref_rms_list, ref_mels, ref_mel_lens, total_mel_lens, final_text_list = prompt
@@ -185,17 +193,18 @@ def main():
                     seed=seed,
                 )
                 # Final result
+                submitted = []
                 for i, gen in enumerate(generated):
-                    gen = gen[ref_mel_lens[i] : total_mel_lens[i], :].unsqueeze(0)
-                    gen_mel_spec = gen.permute(0, 2, 1).to(torch.float32)
-                    if mel_spec_type == "vocos":
-                        generated_wave = vocoder.decode(gen_mel_spec).cpu()
-                    elif mel_spec_type == "bigvgan":
-                        generated_wave = vocoder(gen_mel_spec).squeeze(0).cpu()
-
-                    if ref_rms_list[i] < target_rms:
-                        generated_wave = generated_wave * ref_rms_list[i] / target_rms
-                    torchaudio.save(f"{output_dir}/{utts[i]}.wav", generated_wave, target_sample_rate)
+                    gen_mel_spec = gen[ref_mel_lens[i] : total_mel_lens[i], :].T.to(torch.float32)
+                    gain = ref_rms_list[i] / target_rms if ref_rms_list[i] < target_rms else 1.0
+                    submitted.append((utts[i], vocoder_service.submit(gen_mel_spec, gain=gain)))
+
+            # previous batch was vocoded while this one sampled
+            save_waves(pending)
+            pending = submitted
+
+    save_waves(pending)
+    vocoder_service.shutdown()
 
     accelerator.wait_for_everyone()
     if accelerator.is_main_process:
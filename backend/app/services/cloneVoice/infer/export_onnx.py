@@ -0,0 +1,190 @@
+"""
+Export F5-TTS (DiT) and the Vocos vocoder to ONNX, for torch-free CPU inference with infer/utils_onnx.py.
+
+python infer/export_onnx.py --ckpt_file model.pt --vocab_file vocab.txt --output_dir onnx_model
+
+Writes to output_dir:
+    dit_prepare.onnx   cond (b, n, d), text (b, nt), mask (b, n) -> context (2b, n, dim), conditional and null stacked
+    dit_step.onnx      x (b, n, d), time (b,), context, mask (b, n), cfg_strength -> guided flow (b, n, d)
+    vocos.onnx         mel (b, d, n) -> real, imag (b, n_fft // 2 + 1, n); the inverse STFT runs in numpy
+    mel_filters.npy, vocab.txt, config.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+
+sys.path.append(os.getcwd())
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torchaudio
+
+from infer.utils_infer import (
+    hop_length,
+    load_model,
+    load_vocoder,
+    n_fft,
+    n_mel_channels,
+    target_sample_rate,
+    win_length,
+)
+from model import DiT
+
+
+class DiTPrepare(nn.Module):
+    def __init__(self, transformer):
+        super().__init__()
+        self.transformer = transformer
+
+    def forward(self, cond, text, mask):
+        return self.transformer.prepare(cond, text, mask=mask, cfg=True)["context"]
+
+
+class DiTStep(nn.Module):
+    def __init__(self, transformer):
+        super().__init__()
+        self.transformer = transformer
+
+    def forward(self, x, time, context, mask, cfg_strength):
+        cache = dict(
+            context=context,
+            mask=torch.cat((mask, mask), dim=0),
+            rope=self.transformer.rotary_embed.forward_from_seq_len(x.shape[1]),
+            cfg=True,
+        )
+        pred, null_pred = self.transformer.forward_step(x, time, cache)
+        return pred + (pred - null_pred) * cfg_strength
+
+
+class VocosSpectrum(nn.Module):
+    """Vocos up to the complex spectrum (ISTFTHead without its istft)."""
+
+    def __init__(self, vocos):
+        super().__init__()
+        self.backbone = vocos.backbone
+        self.out = vocos.head.out
+
+    def forward(self, mel):
+        x = self.out(self.backbone(mel)).transpose(1, 2)
+        mag, p = x.chunk(2, dim=1)
+        mag = torch.exp(mag).clip(max=1e2)
+        return mag * torch.cos(p), mag * torch.sin(p)
+
+
+def export_dit(transformer, output_dir, opset):
+    # the legacy (torchscript) exporter keeps batch and sequence dims dynamic across the data-dependent ops
+    batch, seq_len, text_len = 2, 64, 16
+    cond = torch.randn(batch, seq_len, n_mel_channels)
+    text = torch.randint(0, 10, (batch, text_len))
+    text[1, text_len // 2 :] = -1
+    mask = torch.ones(batch, seq_len, dtype=torch.bool)
+    mask[1, seq_len // 2 :] = False
+
+    prepare = DiTPrepare(transformer).eval()
+    torch.onnx.export(
+        prepare,
+        (cond, text, mask),
+        os.path.join(output_dir, "dit_prepare.onnx"),
+        input_names=["cond", "text", "mask"],
+        output_names=["context"],
+        dynamic_axes={
+            "cond": {0: "batch", 1: "seq_len"},
+            "text": {0: "batch", 1: "text_len"},
+            "mask": {0: "batch", 1: "seq_len"},
+            "context": {0: "batch2", 1: "seq_len"},
+        },
+        opset_version=opset,
+        dynamo=False,
+    )
+
+    with torch.inference_mode():
+        context = prepare(cond, text, mask)
+    x = torch.randn(batch, seq_len, n_mel_channels)
+    time = torch.full((batch,), 0.5)
+    torch.onnx.export(
+        DiTStep(transformer).eval(),
+        (x, time, context, mask, torch.tensor(2.0)),
+        os.path.join(output_dir, "dit_step.onnx"),
+        input_names=["x", "time", "context", "mask", "cfg_strength"],
+        output_names=["flow"],
+        dynamic_axes={
+            "x": {0: "batch", 1: "seq_len"},
+            "time": {0: "batch"},
+            "context": {0: "batch2", 1: "seq_len"},
+            "mask": {0: "batch", 1: "seq_len"},
+            "flow": {0: "batch", 1: "seq_len"},
+        },
+        opset_version=opset,
+        dynamo=False,
+    )
+
+
+def export_vocos(vocos, output_dir, opset):
+    mel = torch.randn(2, n_mel_channels, 64)
+    torch.onnx.export(
+        VocosSpectrum(vocos).eval(),
+        (mel,),
+        os.path.join(output_dir, "vocos.onnx"),
+        input_names=["mel"],
+        output_names=["real", "imag"],
+        dynamic_axes={"mel": {0: "batch", 2: "frames"}, "real": {0: "batch", 2: "frames"}, "imag": {0: "batch", 2: "frames"}},
+        opset_version=opset,
+        dynamo=False,
+    )
+    return vocos.head.istft.padding
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export F5-TTS and Vocos to ONNX")
+    parser.add_argument("--ckpt_file", required=True)
+    parser.add_argument("--vocab_file", default="")
+    parser.add_argument("--output_dir", required=True)
+    parser.add_argument("--vocoder_local_path", default="", help="Local Vocos dir, downloaded from huggingface if empty")
+    parser.add_argument("--opset", default=17, type=int)
+    parser.add_argument("--max_duration", default=4096, type=int)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    model_cfg = dict(dim=1024, depth=22, heads=16, ff_mult=2, text_dim=512, conv_layers=4)
+    model = load_model(DiT, model_cfg, args.ckpt_file, mel_spec_type="vocos", vocab_file=args.vocab_file, device="cpu")
+    model = model.to(torch.float32).eval()
+    vocos = load_vocoder(
+        "vocos", is_local=bool(args.vocoder_local_path), local_path=args.vocoder_local_path, device="cpu"
+    )
+
+    print("Exporting DiT ...")
+    export_dit(model.transformer, args.output_dir, args.opset)
+    print("Exporting Vocos ...")
+    vocos_padding = export_vocos(vocos, args.output_dir, args.opset)
+
+    # same filterbank as torchaudio.transforms.MelSpectrogram in get_vocos_mel_spectrogram
+    mel_filters = torchaudio.functional.melscale_fbanks(
+        n_fft // 2 + 1, 0.0, target_sample_rate / 2, n_mel_channels, target_sample_rate, norm=None, mel_scale="htk"
+    )
+    np.save(os.path.join(args.output_dir, "mel_filters.npy"), mel_filters.numpy().astype(np.float32))
+
+    vocab_file = args.vocab_file or os.path.join(os.path.dirname(__file__), "examples", "vocab.txt")
+    shutil.copyfile(vocab_file, os.path.join(args.output_dir, "vocab.txt"))
+
+    config = dict(
+        target_sample_rate=target_sample_rate,
+        n_mel_channels=n_mel_channels,
+        hop_length=hop_length,
+        win_length=win_length,
+        n_fft=n_fft,
+        vocos_padding=vocos_padding,
+        max_duration=args.max_duration,
+        opset=args.opset,
+    )
+    with open(os.path.join(args.output_dir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    print(f"Saved ONNX model to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -158,6 +158,7 @@ def infer(
         speed=speed,
         show_info=show_info,
         progress=gr.Progress(),
+        collect_spectrogram=True,
     )
 
     # Remove silence
@@ -7,8 +7,16 @@ os.environ["PYTOCH_ENABLE_MPS_FALLBACK"] = "1"  # for MPS device compatibility
 sys.path.append(f"{os.path.dirname(os.path.abspath(__file__))}/../../third_party/BigVGAN/")
 
 import hashlib
+import json
+import queue
 import re
 import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 from importlib.resources import files
 
 import matplotlib
@@ -17,11 +25,13 @@ matplotlib.use("Agg")
 
 import matplotlib.pylab as plt
 import numpy as np
+import soundfile as sf
 import torch
 import torchaudio
 import tqdm
+from torch.nn.utils.rnn import pad_sequence
 from huggingface_hub import snapshot_download, hf_hub_download
-from pydub import AudioSegment, silence
+from pydub import AudioSegment
 from transformers import pipeline
 from vocos import Vocos
 
@@ -32,6 +42,8 @@ from model.utils import (
 )
 
 _ref_audio_cache = {}
+_voice_prompt_cache = {}
+_file_hash_cache = {}
 
 device = (
     "cuda"
@@ -120,7 +132,7 @@ def chunk_text(text, max_chars=135):
 
 
 # load vocoder
-def load_vocoder(vocoder_name="vocos", is_local=False, local_path="", device=device, hf_cache_dir=None):
+def load_vocoder(vocoder_name="vocos", is_local=False, local_path="", device=device, hf_cache_dir=None, cpu_mode=None):
     if vocoder_name == "vocos":
         # vocoder = Vocos.from_pretrained("charactr/vocos-mel-24khz").to(device)
         if is_local:
@@ -149,6 +161,9 @@ def load_vocoder(vocoder_name="vocos", is_local=False, local_path="", device=dev
             state_dict.update(encodec_parameters)
         vocoder.load_state_dict(state_dict)
         vocoder = vocoder.eval().to(device)
+        if device == "cpu" and check_cpu_mode(cpu_mode) == "int8":
+            # convnext pointwise linears of the backbone; the istft head stays fp32
+            quantize_dynamic_int8(vocoder.backbone)
     elif vocoder_name == "bigvgan":
         try:
             from third_party.BigVGAN import bigvgan
@@ -265,7 +280,15 @@ def load_model(
     ode_method=ode_method,
     use_ema=True,
     device=device,
+    cpu_mode=None,
+    cpu_threads=None,
+    quant_cache_dir=None,
 ):
+    # cpu_mode (only used when device is cpu): None/"fp32", "int8" or "bf16", see optimize_model_for_cpu
+    cpu_mode = check_cpu_mode(cpu_mode) if device == "cpu" else None
+    if cpu_mode is not None:
+        configure_cpu_threads(cpu_threads)
+
     if vocab_file == "":
         vocab_file = str(files("f5_tts").joinpath("infer/examples/vocab.txt"))
     tokenizer = "custom"
@@ -292,86 +315,395 @@ def load_model(
     ).to(device)
 
     dtype = torch.float32 if mel_spec_type == "bigvgan" else None
+
+    if cpu_mode == "int8" and quant_cache_dir:
+        # quantized weights are cached on disk, next startups skip the fp32 checkpoint and re-quantization
+        cache_path = quantized_cache_path(ckpt_path, quant_cache_dir)
+        if os.path.exists(cache_path):
+            print("quantized model : ", cache_path, "\n")
+            model = optimize_model_for_cpu(model, cpu_mode)
+            model.load_state_dict(torch.load(cache_path, map_location="cpu", weights_only=True))
+            return model.eval()
+
     model = load_checkpoint(model, ckpt_path, device, dtype=dtype, use_ema=use_ema)
+    if cpu_mode is not None:
+        model = optimize_model_for_cpu(model.eval(), cpu_mode)
+        if cpu_mode == "int8" and quant_cache_dir:
+            os.makedirs(quant_cache_dir, exist_ok=True)
+            tmp_path = cache_path + ".tmp"
+            torch.save(model.state_dict(), tmp_path)
+            os.replace(tmp_path, cache_path)
 
     return model
 
 
-def remove_silence_edges(audio, silence_threshold=-42):
+# cpu inference: dynamic int8 linears, bf16 where the cpu supports it, thread tuning
+
+CPU_MODES = ("fp32", "int8", "bf16")
+
+
+def check_cpu_mode(cpu_mode):
+    if cpu_mode is None:
+        return None
+    if cpu_mode not in CPU_MODES:
+        raise ValueError(f"Unknown cpu_mode: {cpu_mode}, expected one of {CPU_MODES}")
+    return cpu_mode
+
+
+def configure_cpu_threads(num_threads=None):
+    """Intra-op threads on every core available to this process (or num_threads), one inter-op thread."""
+    if not num_threads:
+        num_threads = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:  # can only be set before any inter-op parallel work started
+        pass
+    return num_threads
+
+
+def cpu_supports_bf16():
+    return torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+
+
+def quantize_dynamic_int8(module):
+    """In place: every nn.Linear in module gets int8 weights, activations are quantized on the fly."""
+    return torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def optimize_model_for_cpu(model, cpu_mode="int8"):
+    """
+    int8: dynamic quantization of the transformer blocks' linears (attention, feed-forward, adaptive norms).
+          Embeddings, the input projection and the output projection stay fp32, they are small and the
+          most sensitive to quantization error.
+    bf16: the transformer in bfloat16 if the cpu has native bf16 (avx512_bf16/amx), else kept fp32.
+          Mel extraction stays fp32, CFM.sample casts the cond to the transformer dtype.
+    """
+    cpu_mode = check_cpu_mode(cpu_mode)
+    if cpu_mode == "int8":
+        blocks = getattr(model.transformer, "transformer_blocks", None)
+        quantize_dynamic_int8(blocks if blocks is not None else model.transformer)
+    elif cpu_mode == "bf16":
+        if cpu_supports_bf16():
+            model.transformer.to(torch.bfloat16)
+        else:
+            print("bf16 is not supported natively by this cpu, keeping fp32")
+    return model
+
+
+def quantized_cache_path(ckpt_path, cache_dir):
+    """Cache file of a checkpoint's int8 weights, keyed by checkpoint path/mtime/size and torch version."""
+    stat = os.stat(ckpt_path)
+    key = f"{os.path.abspath(ckpt_path)}:{stat.st_mtime_ns}:{stat.st_size}:{torch.__version__}"
+    name = os.path.splitext(os.path.basename(ckpt_path))[0]
+    return os.path.join(cache_dir, f"{name}.int8.{hashlib.sha1(key.encode()).hexdigest()[:16]}.pt")
+
+
+# compiled inference: torch.compile of the per-step DiT function, sequence lengths padded to buckets
+
+
+def compile_model(
+    model_obj,
+    duration_buckets=(384, 512, 768, 1024, 1536, 2048, 3072, 4096),
+    mode=None,
+    warmup=True,
+    warmup_batch_sizes=(1, 2),
+    show_info=print,
+):
+    """
+    Compile the transformer's forward_step (everything run at each ode step) and make CFM.sample pad the
+    ode state to the next duration bucket, so only one graph per bucket is built instead of one per duration.
+    The batch dimension is marked dynamic; size 1 is always specialized, hence batch sizes 1 and 2 in warmup.
+    Warmup samples one step per bucket and batch size, so compilation happens here and not on first requests.
+    On any compile/runtime failure the model falls back to eager (and unpadded) inference.
+    Returns True if the compiled path is active.
+    """
+    transformer = model_obj.transformer
+    if not hasattr(transformer, "forward_step"):
+        show_info(f"{type(transformer).__name__} has no forward_step, compiled inference not available")
+        return False
+
+    eager_step = transformer.forward_step
+    compiled_step = torch.compile(eager_step, mode=mode)
+
+    # one graph per (bucket, batch 1 or not, cfg or not), above dynamo's default recompile limit
+    graphs = len(duration_buckets) * 4
+    for name in ("recompile_limit", "cache_size_limit"):
+        if hasattr(torch._dynamo.config, name):
+            setattr(torch._dynamo.config, name, max(getattr(torch._dynamo.config, name), graphs))
+
+    def fall_back(error):
+        show_info(f"Compiled inference failed, falling back to eager: {error}")
+        model_obj.step_fn = None
+        model_obj.duration_buckets = None
+
+    def step_fn(x, t, cache):
+        try:
+            for tensor in (x, cache["context"], cache["mask"]):
+                if tensor is not None and tensor.shape[0] > 1:
+                    torch._dynamo.maybe_mark_dynamic(tensor, 0)
+            return compiled_step(x, t, cache)
+        except Exception as e:
+            fall_back(e)
+            return eager_step(x, t, cache)
+
+    model_obj.duration_buckets = tuple(sorted(duration_buckets))
+    model_obj.step_fn = step_fn
+
+    if warmup:
+        dtype, device = next(model_obj.parameters()).dtype, model_obj.device
+        start = time.time()
+        for bucket in model_obj.duration_buckets:
+            for batch_size in warmup_batch_sizes:
+                if model_obj.step_fn is None:
+                    return False
+                cond = torch.zeros(batch_size, 1, model_obj.num_channels, dtype=dtype, device=device)
+                with torch.inference_mode():
+                    model_obj.sample(
+                        cond=cond, text=["a"] * batch_size, duration=bucket, steps=1, cfg_strength=cfg_strength
+                    )
+        show_info(f"Compiled {len(model_obj.duration_buckets)} duration buckets in {time.time() - start:.1f}s")
+
+    return model_obj.step_fn is not None
+
+
+# silence detection on numpy arrays, same thresholds and semantics as pydub.silence (positions in milliseconds)
+# rms of any millisecond window comes from prefix sums of squared samples, so each detector is a few array ops
+
+
+def load_audio_array(path):
+    """Load audio as float32 (n, channels) in [-1, 1]. Uses libsndfile, falling back to pydub/ffmpeg for other formats."""
+    try:
+        wave, sr = sf.read(path, dtype="float32", always_2d=True)
+    except Exception:
+        aseg = AudioSegment.from_file(path)
+        samples = np.array(aseg.get_array_of_samples(), dtype=np.float32).reshape(-1, aseg.channels)
+        wave, sr = samples / aseg.max_possible_amplitude, aseg.frame_rate
+    return wave, sr
+
+
+def _ms_len(n_frames, sr):
+    return int(round(1000 * n_frames / sr))
+
+
+def _ms_energy(wave, sr):
+    """(prefix sums of squared samples, frame index of every ms boundary, length in ms, channels)"""
+    wave = np.asarray(wave)
+    # reshape(0, -1) cannot infer the channel count of an empty wave
+    frames = wave.reshape(len(wave), -1) if len(wave) else wave.reshape(0, wave.shape[1] if wave.ndim > 1 else 1)
+    n, channels = frames.shape
+    len_ms = _ms_len(n, sr)
+    power = np.square(frames[:, 0], dtype=np.float64) if channels == 1 else np.square(frames, dtype=np.float64).sum(1)
+    prefix = np.zeros(n + 1)
+    np.cumsum(power, out=prefix[1:])
+    bounds = np.minimum(np.arange(len_ms + 1) * sr // 1000, n)
+    return prefix, bounds, len_ms, channels
+
+
+def _window_rms(energy, start_ms, end_ms):
+    prefix, bounds, _, channels = energy
+    lo, hi = bounds[start_ms], bounds[end_ms]
+    count = np.maximum((hi - lo) * channels, 1)
+    return np.sqrt(np.maximum(prefix[hi] - prefix[lo], 0) / count)
+
+
+def _window_dbfs(energy, start_ms, end_ms):
+    with np.errstate(divide="ignore"):
+        return 20 * np.log10(_window_rms(energy, start_ms, end_ms))
+
+
+def detect_leading_silence_ms(energy, silence_threshold=-50.0, chunk_size=10):
+    """First chunk_size-ms step whose dBFS reaches silence_threshold (pydub detect_leading_silence)."""
+    len_ms = energy[2]
+    starts = np.arange(0, len_ms, chunk_size)
+    loud = np.flatnonzero(_window_dbfs(energy, starts, np.minimum(starts + chunk_size, len_ms)) >= silence_threshold)
+    return int(starts[loud[0]]) if len(loud) else len_ms
+
+
+def detect_trailing_silence_ms(energy, silence_threshold=-42):
+    """Number of trailing milliseconds at or below silence_threshold dBFS."""
+    len_ms = energy[2]
+    starts = np.arange(len_ms)
+    loud = np.flatnonzero(_window_dbfs(energy, starts, starts + 1) > silence_threshold)
+    return len_ms - int(loud[-1]) - 1 if len(loud) else len_ms
+
+
+def detect_silence_ms(energy, min_silence_len=1000, silence_thresh=-16, seek_step=1):
+    """[start, end] ms ranges of silence at least min_silence_len long (pydub detect_silence)."""
+    len_ms = energy[2]
+    if len_ms < min_silence_len:
+        return []
+
+    last_slice_start = len_ms - min_silence_len
+    starts = np.arange(0, last_slice_start + 1, seek_step)
+    if last_slice_start % seek_step:
+        starts = np.append(starts, last_slice_start)
+    # pydub compares the integer rms of 16-bit samples against the threshold amplitude
+    threshold = 10 ** (silence_thresh / 20) * 32768
+    rms = np.floor(_window_rms(energy, starts, starts + min_silence_len) * 32768)
+    silence_starts = starts[rms <= threshold]
+    if not len(silence_starts):
+        return []
+
+    # a new range begins where consecutive silent windows neither step continuously nor overlap
+    gaps = np.diff(silence_starts)
+    breaks = np.flatnonzero((gaps != seek_step) & (gaps > min_silence_len))
+    range_starts = np.concatenate([silence_starts[:1], silence_starts[breaks + 1]])
+    range_ends = np.concatenate([silence_starts[breaks], silence_starts[-1:]]) + min_silence_len
+    return [[int(a), int(b)] for a, b in zip(range_starts, range_ends)]
+
+
+def detect_nonsilent_ms(energy, min_silence_len=1000, silence_thresh=-16, seek_step=1):
+    """[start, end] ms ranges between silences (pydub detect_nonsilent)."""
+    len_ms = energy[2]
+    silent_ranges = detect_silence_ms(energy, min_silence_len, silence_thresh, seek_step)
+    if not silent_ranges:
+        return [[0, len_ms]]
+    if silent_ranges[0] == [0, len_ms]:
+        return []
+
+    nonsilent_ranges = []
+    prev_end = 0
+    for start, end in silent_ranges:
+        nonsilent_ranges.append([prev_end, start])
+        prev_end = end
+    if silent_ranges[-1][1] != len_ms:
+        nonsilent_ranges.append([prev_end, len_ms])
+    if nonsilent_ranges[0] == [0, 0]:
+        nonsilent_ranges.pop(0)
+    return nonsilent_ranges
+
+
+def split_on_silence_wave(wave, sr, min_silence_len=1000, silence_thresh=-16, keep_silence=100, seek_step=1):
+    """Non-silent pieces of wave (views), each padded with up to keep_silence ms (pydub split_on_silence)."""
+    energy = _ms_energy(wave, sr)
+    bounds, len_ms = energy[1], energy[2]
+    ranges = [
+        [start - keep_silence, end + keep_silence]
+        for start, end in detect_nonsilent_ms(energy, min_silence_len, silence_thresh, seek_step)
+    ]
+    # split overlapping padding halfway
+    for prev, nxt in zip(ranges, ranges[1:]):
+        if nxt[0] < prev[1]:
+            prev[1] = (prev[1] + nxt[0]) // 2
+            nxt[0] = prev[1]
+    return [wave[bounds[max(start, 0)] : bounds[min(end, len_ms)]] for start, end in ranges]
+
+
+def remove_silence_edges(wave, sr=target_sample_rate, silence_threshold=-42):
     # Remove silence from the start
-    non_silent_start_idx = silence.detect_leading_silence(audio, silence_threshold=silence_threshold)
-    audio = audio[non_silent_start_idx:]
+    start_ms = detect_leading_silence_ms(_ms_energy(wave, sr), silence_threshold=silence_threshold)
+    wave = wave[start_ms * sr // 1000 :]
+    if len(wave) == 0:  # all silent
+        return wave
 
     # Remove silence from the end
-    non_silent_end_duration = audio.duration_seconds
-    for ms in reversed(audio):
-        if ms.dBFS > silence_threshold:
-            break
-        non_silent_end_duration -= 0.001
-    trimmed_audio = audio[: int(non_silent_end_duration * 1000)]
+    energy = _ms_energy(wave, sr)
+    end_ms = energy[2] - detect_trailing_silence_ms(energy, silence_threshold=silence_threshold)
+    return wave[: energy[1][end_ms]]
+
+
+def remove_silence_from_wave(wave, sr=target_sample_rate):
+    """Drop silences longer than 1s from generated audio, keeping 0.5s around speech."""
+    segments = split_on_silence_wave(
+        wave, sr, min_silence_len=1000, silence_thresh=-50, keep_silence=500, seek_step=10
+    )
+    return np.concatenate(segments) if segments else wave[:0]
+
+
+# persistent asr transcript store (json sidecar keyed by processed reference audio md5)
+
+
+def load_transcript_store(path):
+    """Load a transcript sidecar and merge it into the in-process cache."""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            transcripts = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    _ref_audio_cache.update(transcripts)
+    return transcripts
+
 
-    return trimmed_audio
+def save_transcript(path, audio_hash, ref_text):
+    """Add one transcript to a sidecar (atomic rewrite)."""
+    if not path:
+        return
+    transcripts = load_transcript_store(path)
+    transcripts[audio_hash] = ref_text
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(transcripts, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
 
 
 # preprocess reference audio and text
 
 
-def preprocess_ref_audio_text(ref_audio_orig, ref_text, clip_short=True, show_info=print, device=device):
+def _join_up_to_15s(segments, sr, empty, show_info, step):
+    kept, kept_frames = [], 0
+    for segment in segments:
+        if _ms_len(kept_frames, sr) > 6000 and _ms_len(kept_frames + len(segment), sr) > 15000:
+            show_info(f"Audio is over 15s, clipping short. ({step})")
+            break
+        kept.append(segment)
+        kept_frames += len(segment)
+    return np.concatenate(kept) if kept else empty
+
+
+def preprocess_ref_audio(ref_audio_orig, clip_short=True, show_info=print):
+    """Load a reference clip, clip it to ~15s at silences and trim its edges, in memory. Returns (wave, sr)."""
     show_info("Converting audio...")
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
-        aseg = AudioSegment.from_file(ref_audio_orig)
+    wave, sr = load_audio_array(ref_audio_orig)
+
+    if clip_short:
+        # 1. try to find long silence for clipping
+        segments = split_on_silence_wave(
+            wave, sr, min_silence_len=1000, silence_thresh=-50, keep_silence=1000, seek_step=10
+        )
+        clipped = _join_up_to_15s(segments, sr, wave[:0], show_info, 1)
 
-        if clip_short:
-            # 1. try to find long silence for clipping
-            non_silent_segs = silence.split_on_silence(
-                aseg, min_silence_len=1000, silence_thresh=-50, keep_silence=1000, seek_step=10
+        # 2. try to find short silence for clipping if 1. failed
+        if _ms_len(len(clipped), sr) > 15000:
+            segments = split_on_silence_wave(
+                wave, sr, min_silence_len=100, silence_thresh=-40, keep_silence=1000, seek_step=10
             )
-            non_silent_wave = AudioSegment.silent(duration=0)
-            for non_silent_seg in non_silent_segs:
-                if len(non_silent_wave) > 6000 and len(non_silent_wave + non_silent_seg) > 15000:
-                    show_info("Audio is over 15s, clipping short. (1)")
-                    break
-                non_silent_wave += non_silent_seg
-
-            # 2. try to find short silence for clipping if 1. failed
-            if len(non_silent_wave) > 15000:
-                non_silent_segs = silence.split_on_silence(
-                    aseg, min_silence_len=100, silence_thresh=-40, keep_silence=1000, seek_step=10
-                )
-                non_silent_wave = AudioSegment.silent(duration=0)
-                for non_silent_seg in non_silent_segs:
-                    if len(non_silent_wave) > 6000 and len(non_silent_wave + non_silent_seg) > 15000:
-                        show_info("Audio is over 15s, clipping short. (2)")
-                        break
-                    non_silent_wave += non_silent_seg
-
-            aseg = non_silent_wave
-
-            # 3. if no proper silence found for clipping
-            if len(aseg) > 15000:
-                aseg = aseg[:15000]
-                show_info("Audio is over 15s, clipping short. (3)")
-
-        aseg = remove_silence_edges(aseg) + AudioSegment.silent(duration=50)
-        aseg.export(f.name, format="wav")
-        ref_audio = f.name
+            clipped = _join_up_to_15s(segments, sr, wave[:0], show_info, 2)
+
+        wave = clipped
+
+        # 3. if no proper silence found for clipping
+        if _ms_len(len(wave), sr) > 15000:
+            wave = wave[: 15000 * sr // 1000]
+            show_info("Audio is over 15s, clipping short. (3)")
+
+    wave = remove_silence_edges(wave, sr)
+    wave = np.concatenate([wave, np.zeros((50 * sr // 1000, wave.shape[1]), dtype=wave.dtype)])
+    return wave, sr
 
-    # Compute a hash of the reference audio file
-    with open(ref_audio, "rb") as audio_file:
-        audio_data = audio_file.read()
-        audio_hash = hashlib.md5(audio_data).hexdigest()
 
+def resolve_ref_text(wave, sr, ref_text, show_info=print, transcript_store=None):
+    """Return ref_text, transcribing (and caching) the processed reference audio when it is empty."""
     if not ref_text.strip():
         global _ref_audio_cache
+        # Compute a hash of the processed reference audio (16-bit pcm, as written to disk)
+        pcm = (np.clip(wave, -1.0, 1.0) * 32767).astype("<i2")
+        audio_hash = hashlib.md5(pcm.tobytes() + str(sr).encode()).hexdigest()
+        if audio_hash not in _ref_audio_cache:
+            load_transcript_store(transcript_store)
         if audio_hash in _ref_audio_cache:
             # Use cached asr transcription
             show_info("Using cached reference text...")
             ref_text = _ref_audio_cache[audio_hash]
         else:
             show_info("No reference text provided, transcribing reference audio...")
-            ref_text = transcribe(ref_audio)
+            ref_text = transcribe({"raw": wave.mean(axis=1), "sampling_rate": sr})
             # Cache the transcribed text (not caching custom ref_text, enabling users to do manual tweak)
             _ref_audio_cache[audio_hash] = ref_text
+            save_transcript(transcript_store, audio_hash, ref_text)
     else:
         show_info("Using custom reference text...")
 
@@ -384,12 +716,146 @@ def preprocess_ref_audio_text(ref_audio_orig, ref_text, clip_short=True, show_in
 
     print("\nref_text  ", ref_text)
 
+    return ref_text
+
+
+def preprocess_ref_audio_text(
+    ref_audio_orig, ref_text, clip_short=True, show_info=print, device=device, transcript_store=None
+):
+    wave, sr = preprocess_ref_audio(ref_audio_orig, clip_short=clip_short, show_info=show_info)
+    ref_text = resolve_ref_text(wave, sr, ref_text, show_info=show_info, transcript_store=transcript_store)
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
+        sf.write(f.name, wave, sr)
+        ref_audio = f.name
+
     return ref_audio, ref_text
 
 
+# voice prompt cache: preprocessed reference audio, text and mel, reused across requests
+
+
+@dataclass
+class VoicePrompt:
+    audio: torch.Tensor  # (1, nw) mono, resampled to target_sample_rate, rms-normalized
+    rms: float  # rms of the reference before normalization, used to rescale generated audio
+    ref_text: str
+    mel: torch.Tensor | None = None  # (1, n, d) reference mel from model_obj.mel_spec
+
+    def to(self, device):
+        return VoicePrompt(
+            audio=self.audio.to(device),
+            rms=self.rms,
+            ref_text=self.ref_text,
+            mel=self.mel.to(device) if self.mel is not None else None,
+        )
+
+
+def _voice_prompt_key(ref_audio_orig, ref_text, clip_short):
+    path = os.path.abspath(ref_audio_orig)
+    stat = os.stat(path)
+    file_key = (path, stat.st_mtime_ns, stat.st_size)
+    content_hash = _file_hash_cache.get(file_key)
+    if content_hash is None:
+        with open(path, "rb") as f:
+            content_hash = hashlib.md5(f.read()).hexdigest()
+        _file_hash_cache[file_key] = content_hash
+    data = "|".join(
+        [
+            path,
+            str(stat.st_mtime_ns),
+            content_hash,
+            ref_text,
+            str(clip_short),
+            str(target_sample_rate),
+            str(target_rms),
+            str(n_mel_channels),
+            str(hop_length),
+            mel_spec_type,
+        ]
+    )
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def _normalize_voice_prompt_audio(wave, sr, target_rms=target_rms):
+    audio = torch.from_numpy(np.ascontiguousarray(wave.T, dtype=np.float32))
+    if audio.shape[0] > 1:
+        audio = torch.mean(audio, dim=0, keepdim=True)
+
+    rms = torch.sqrt(torch.mean(torch.square(audio))).item()
+    if rms < target_rms:
+        audio = audio * target_rms / rms
+    if sr != target_sample_rate:
+        resampler = torchaudio.transforms.Resample(sr, target_sample_rate)
+        audio = resampler(audio)
+    return audio, rms
+
+
+def get_voice_prompt(
+    ref_audio_orig,
+    ref_text="",
+    model_obj=None,
+    clip_short=True,
+    show_info=print,
+    device=device,
+    cache_dir=None,
+    transcript_store=None,
+):
+    """
+    Preprocess a reference voice once and reuse it: clipped and normalized waveform, reference text
+    and (if model_obj is given) reference mel. Keyed by file path + mtime + content hash, kept in memory
+    and optionally persisted to cache_dir.
+    """
+    key = _voice_prompt_key(ref_audio_orig, ref_text, clip_short)
+    prompt = _voice_prompt_cache.get(key)
+
+    cache_file = os.path.join(cache_dir, f"{key}.pt") if cache_dir else None
+    if prompt is None and cache_file and os.path.exists(cache_file):
+        try:
+            data = torch.load(cache_file, map_location="cpu")
+            prompt = VoicePrompt(audio=data["audio"], rms=data["rms"], ref_text=data["ref_text"], mel=data.get("mel"))
+            show_info("Using cached voice prompt...")
+        except Exception as e:
+            show_info(f"Failed to load cached voice prompt, rebuilding: {e}")
+            prompt = None
+
+    dirty = False
+    if prompt is None:
+        # processed in memory, no temp wav round-trip
+        wave, sr = preprocess_ref_audio(ref_audio_orig, clip_short=clip_short, show_info=show_info)
+        processed_text = resolve_ref_text(wave, sr, ref_text, show_info=show_info, transcript_store=transcript_store)
+        audio, rms = _normalize_voice_prompt_audio(wave, sr)
+        prompt = VoicePrompt(audio=audio, rms=rms, ref_text=processed_text)
+        dirty = True
+
+    if prompt.mel is None and model_obj is not None:
+        with torch.inference_mode():
+            mel = model_obj.mel_spec(prompt.audio.to(next(model_obj.parameters()).device))
+        prompt.mel = mel.permute(0, 2, 1).cpu()
+        dirty = True
+
+    if dirty and cache_file:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = f"{cache_file}.tmp"
+        torch.save(
+            {"audio": prompt.audio.cpu(), "rms": prompt.rms, "ref_text": prompt.ref_text, "mel": prompt.mel}, tmp_file
+        )
+        os.replace(tmp_file, cache_file)
+
+    prompt = prompt.to(device)
+    _voice_prompt_cache[key] = prompt
+    return prompt
+
+
 # infer process: chunk text -> infer batches [i.e. infer_batch_process()]
 
 
+def split_gen_text(ref_audio_seconds, ref_text, gen_text):
+    # keep reference + generated audio of each chunk under ~25s
+    max_chars = int(len(ref_text.encode("utf-8")) / ref_audio_seconds * (25 - ref_audio_seconds))
+    return chunk_text(gen_text, max_chars=max_chars)
+
+
 def infer_process(
     ref_audio,
     ref_text,
@@ -407,18 +873,27 @@ def infer_process(
     speed=speed,
     fix_duration=fix_duration,
     device=device,
+    batch_size=1,
+    max_batch_frames=None,
+    seed=None,
+    collect_spectrogram=False,
+    sampler=None,
+    sample_fn=None,
 ):
     # Split the input text into batches
-    audio, sr = torchaudio.load(ref_audio)
-    max_chars = int(len(ref_text.encode("utf-8")) / (audio.shape[-1] / sr) * (25 - audio.shape[-1] / sr))
-    gen_text_batches = chunk_text(gen_text, max_chars=max_chars)
+    if isinstance(ref_audio, VoicePrompt):
+        audio, sr = ref_audio.audio, target_sample_rate
+    else:
+        audio, sr = torchaudio.load(ref_audio)
+        ref_audio = (audio, sr)
+    gen_text_batches = split_gen_text(audio.shape[-1] / sr, ref_text, gen_text)
     for i, gen_text in enumerate(gen_text_batches):
         print(f"gen_text {i}", gen_text)
     print("\n")
 
     show_info(f"Generating audio in {len(gen_text_batches)} batches...")
     return infer_batch_process(
-        (audio, sr),
+        ref_audio,
         ref_text,
         gen_text_batches,
         model_obj,
@@ -433,29 +908,49 @@ def infer_process(
         speed=speed,
         fix_duration=fix_duration,
         device=device,
+        batch_size=batch_size,
+        max_batch_frames=max_batch_frames,
+        seed=seed,
+        collect_spectrogram=collect_spectrogram,
+        sampler=sampler,
+        sample_fn=sample_fn,
     )
 
 
 # infer batches
 
 
-def infer_batch_process(
-    ref_audio,
-    ref_text,
-    gen_text_batches,
-    model_obj,
-    vocoder,
-    mel_spec_type="vocos",
-    progress=tqdm,
-    target_rms=0.1,
-    cross_fade_duration=0.15,
-    nfe_step=32,
-    cfg_strength=2.0,
-    sway_sampling_coef=-1,
-    speed=1,
-    fix_duration=None,
-    device=None,
-):
+@dataclass
+class ChunkRequest:
+    cond: torch.Tensor  # (1, n, d) reference mel or (1, nw) reference wave
+    text: str  # ref_text + gen_text
+    ref_audio_len: int  # reference length in mel frames, cropped from the output
+    duration: int  # requested total length in mel frames
+    rms: float  # reference rms before normalization
+    seed: int | None = None  # noise seed, makes the chunk reproducible regardless of batch composition
+    tokens: list[str] | None = None  # text after convert_char_to_pinyin, see prepare_chunk_tokens
+
+
+def prepare_chunk_tokens(chunks):
+    """
+    Text front end (convert_char_to_pinyin) of the chunks, cached on each chunk.
+    Pure CPU work that does not touch the model, so it can run on other threads ahead of sampling.
+    """
+    todo = [chunk for chunk in chunks if chunk.tokens is None]
+    if todo:
+        for chunk, tokens in zip(todo, convert_char_to_pinyin([chunk.text for chunk in todo])):
+            chunk.tokens = tokens
+    return chunks
+
+
+def prepare_ref_audio(ref_audio, target_rms=target_rms, device=device):
+    """Return (audio, cond, rms) for a VoicePrompt or an (audio, sr) tuple."""
+    if isinstance(ref_audio, VoicePrompt):
+        # already mono, normalized and resampled; reuse the cached reference mel if present
+        audio = ref_audio.audio.to(device)
+        cond = ref_audio.mel.to(device) if ref_audio.mel is not None else audio
+        return audio, cond, ref_audio.rms
+
     audio, sr = ref_audio
     if audio.shape[0] > 1:
         audio = torch.mean(audio, dim=0, keepdim=True)
@@ -467,18 +962,28 @@ def infer_batch_process(
         resampler = torchaudio.transforms.Resample(sr, target_sample_rate)
         audio = resampler(audio)
     audio = audio.to(device)
+    return audio, audio, rms
 
-    generated_waves = []
-    spectrograms = []
+
+def build_chunk_requests(
+    ref_audio,
+    ref_text,
+    gen_text_batches,
+    target_rms=target_rms,
+    speed=speed,
+    fix_duration=fix_duration,
+    device=device,
+    seed=None,
+):
+    """One ChunkRequest per text chunk, sharing the prepared reference. Chunk i gets seed + i when seeded."""
+    audio, cond, rms = prepare_ref_audio(ref_audio, target_rms=target_rms, device=device)
 
     if len(ref_text[-1].encode("utf-8")) == 1:
         ref_text = ref_text + " "
-    for i, gen_text in enumerate(progress.tqdm(gen_text_batches)):
-        # Prepare the text
-        text_list = [ref_text + gen_text]
-        final_text_list = convert_char_to_pinyin(text_list)
 
-        ref_audio_len = audio.shape[-1] // hop_length
+    ref_audio_len = audio.shape[-1] // hop_length
+    chunks = []
+    for gen_text in gen_text_batches:
         if fix_duration is not None:
             duration = int(fix_duration * target_sample_rate / hop_length)
         else:
@@ -486,73 +991,496 @@ def infer_batch_process(
             ref_text_len = len(ref_text.encode("utf-8"))
             gen_text_len = len(gen_text.encode("utf-8"))
             duration = ref_audio_len + int(ref_audio_len / ref_text_len * gen_text_len / speed)
-
-        # inference
-        with torch.inference_mode():
-            generated, _ = model_obj.sample(
-                cond=audio,
-                text=final_text_list,
+        chunks.append(
+            ChunkRequest(
+                cond=cond,
+                text=ref_text + gen_text,
+                ref_audio_len=ref_audio_len,
                 duration=duration,
-                steps=nfe_step,
-                cfg_strength=cfg_strength,
-                sway_sampling_coef=sway_sampling_coef,
+                rms=rms,
+                seed=None if seed is None else seed + len(chunks),
             )
+        )
+    return chunks
+
+
+def group_chunk_requests(chunks, batch_size=1, max_batch_frames=None):
+    """Length-bucket chunks (sorted by duration) into batches. Returns lists of indices into chunks."""
+    order = sorted(range(len(chunks)), key=lambda i: chunks[i].duration)
+    groups, current = [], []
+    for i in order:
+        # a padded batch costs len(batch) * longest duration frames
+        frames = (len(current) + 1) * chunks[i].duration
+        if current and (len(current) >= batch_size or (max_batch_frames and frames > max_batch_frames)):
+            groups.append(current)
+            current = []
+        current.append(i)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def sample_chunk_mels(
+    chunks,
+    model_obj,
+    nfe_step=nfe_step,
+    cfg_strength=cfg_strength,
+    sway_sampling_coef=sway_sampling_coef,
+    seed=None,
+    sampler=None,
+    adaptive_tol=0.05,
+):
+    """
+    Run one batched CFM.sample over chunks (possibly from different references), without vocoding.
+    Noise is drawn per chunk from chunk.seed (falling back to seed), so seeded chunks are reproducible.
+    Returns a list of (d, n) float32 mel tensors of the generated part, one per chunk.
+    """
+    conds = []
+    for chunk in chunks:
+        cond = chunk.cond
+        if cond.ndim == 2:
+            cond = model_obj.mel_spec(cond).permute(0, 2, 1)
+        conds.append(cond[0])
+    lens = torch.tensor([c.shape[0] for c in conds], device=conds[0].device, dtype=torch.long)
+    cond = pad_sequence(conds, padding_value=0.0, batch_first=True)
+
+    final_text_list = [chunk.tokens for chunk in prepare_chunk_tokens(chunks)]
+    duration = torch.tensor([chunk.duration for chunk in chunks], device=cond.device, dtype=torch.long)
+
+    with torch.inference_mode():
+        generated, _ = model_obj.sample(
+            cond=cond,
+            text=final_text_list,
+            duration=duration,
+            lens=lens,
+            steps=nfe_step,
+            cfg_strength=cfg_strength,
+            sway_sampling_coef=sway_sampling_coef,
+            seed=[seed if chunk.seed is None else chunk.seed for chunk in chunks],
+            sampler=sampler,
+            adaptive_tol=adaptive_tol,
+        )
+        generated = generated.to(torch.float32)
+
+    # CFM.sample extends each duration to at least max(text, reference) + 1 frames
+    total_lens = [
+        min(max(max(len(text), int(ref_len)) + 1, int(dur)), generated.shape[1])
+        for text, ref_len, dur in zip(final_text_list, lens, duration)
+    ]
+    return [generated[i, chunk.ref_audio_len : total_lens[i], :].T for i, chunk in enumerate(chunks)]
+
+
+def _vocos_decode_masked(mel_batch, lens, vocos):
+    """
+    Vocos decode of a padded batch that matches decoding each mel alone: the padded frames are zeroed before every
+    conv of the backbone (all other layers are per frame) and the inverse STFT runs per item on its own frames.
+    """
+    backbone = vocos.backbone
+    lens_t = torch.tensor(lens, device=mel_batch.device)
+    mask = (torch.arange(mel_batch.shape[-1], device=mel_batch.device)[None, :] < lens_t[:, None]).unsqueeze(1)
+    x = backbone.embed(mel_batch)
+    x = backbone.norm(x.transpose(1, 2)).transpose(1, 2)
+    for conv_block in backbone.convnext:
+        x = conv_block(x.masked_fill(~mask, 0.0))
+    x = backbone.final_layer_norm(x.transpose(1, 2))
+
+    mag, p = vocos.head.out(x).transpose(1, 2).chunk(2, dim=1)
+    spec = torch.clip(torch.exp(mag), max=1e2) * (torch.cos(p) + 1j * torch.sin(p))
+    return [vocos.head.istft(spec[i : i + 1, :, :n])[0] for i, n in enumerate(lens)]
+
+
+def vocode_mel_batch(mels, vocoder, mel_spec_type=mel_spec_type):
+    """
+    Vocode (d, n) mels in one padded batch. Returns a list of (nw,) wave tensors, each cut to its mel's length.
+    Vocos masks the padding so each wave equals a decode of its mel alone; other vocoders fall back to a plain padded
+    decode, where the zero padding slightly changes the last frames of the shorter mels.
+    """
+    lens = [mel.shape[-1] for mel in mels]
+    mel_batch = pad_sequence([mel.T for mel in mels], padding_value=0.0, batch_first=True).permute(0, 2, 1)
+    with torch.inference_mode():
+        if mel_spec_type == "vocos" and len(mels) > 1 and isinstance(vocoder, Vocos) and not vocoder.backbone.adanorm:
+            return _vocos_decode_masked(mel_batch, lens, vocoder)
+        if mel_spec_type == "vocos":
+            waves = vocoder.decode(mel_batch)
+        elif mel_spec_type == "bigvgan":
+            waves = vocoder(mel_batch)
+    waves = waves.reshape(len(mels), -1)
+    # hop_length samples per frame plus a constant edge term (-hop_length for vocos center padding), so each wave
+    # has the length a decode of its mel alone would give, whatever it was padded to
+    edge = waves.shape[-1] - mel_batch.shape[-1] * hop_length
+    return [waves[i, : n * hop_length + edge] for i, n in enumerate(lens)]
+
+
+def chunk_gain(chunk, target_rms=target_rms):
+    """Scale restoring a quiet reference's loudness (the reference was normalized up to target_rms)."""
+    return float(chunk.rms) / target_rms if chunk.rms < target_rms else 1.0
+
+
+def sample_chunk_batch(
+    chunks,
+    model_obj,
+    vocoder,
+    mel_spec_type=mel_spec_type,
+    target_rms=target_rms,
+    nfe_step=nfe_step,
+    cfg_strength=cfg_strength,
+    sway_sampling_coef=sway_sampling_coef,
+    seed=None,
+    return_mel=False,
+    sampler=None,
+    adaptive_tol=0.05,
+):
+    """
+    sample_chunk_mels and vocode the batch at once.
+    Returns a list of (wave, mel) numpy arrays, one per chunk; mel is None unless return_mel is set.
+    """
+    mels = sample_chunk_mels(
+        chunks,
+        model_obj,
+        nfe_step=nfe_step,
+        cfg_strength=cfg_strength,
+        sway_sampling_coef=sway_sampling_coef,
+        seed=seed,
+        sampler=sampler,
+        adaptive_tol=adaptive_tol,
+    )
+    waves = vocode_mel_batch(mels, vocoder, mel_spec_type=mel_spec_type)
 
-            generated = generated.to(torch.float32)
-            generated = generated[:, ref_audio_len:, :]
-            generated_mel_spec = generated.permute(0, 2, 1)
-            if mel_spec_type == "vocos":
-                generated_wave = vocoder.decode(generated_mel_spec)
-            elif mel_spec_type == "bigvgan":
-                generated_wave = vocoder(generated_mel_spec)
-            if rms < target_rms:
-                generated_wave = generated_wave * rms / target_rms
+    results = []
+    for chunk, wave, mel in zip(chunks, waves, mels):
+        # wav -> numpy
+        wave = (wave * chunk_gain(chunk, target_rms)).cpu().numpy()
+        results.append((wave, mel.cpu().numpy() if return_mel else None))
+    return results
 
-            # wav -> numpy
-            generated_wave = generated_wave.squeeze().cpu().numpy()
 
-            generated_waves.append(generated_wave)
-            spectrograms.append(generated_mel_spec[0].cpu().numpy())
+class _VocodeItem:
+    __slots__ = ("mel", "gain", "return_mel", "future")
 
-    # Combine all generated waves with cross-fading
-    if cross_fade_duration <= 0:
-        # Simply concatenate
-        final_wave = np.concatenate(generated_waves)
-    else:
-        final_wave = generated_waves[0]
-        for i in range(1, len(generated_waves)):
-            prev_wave = final_wave
-            next_wave = generated_waves[i]
+    def __init__(self, mel, gain, return_mel):
+        self.mel = mel
+        self.gain = gain
+        self.return_mel = return_mel
+        self.future = Future()
 
-            # Calculate cross-fade samples, ensuring it does not exceed wave lengths
-            cross_fade_samples = int(cross_fade_duration * target_sample_rate)
-            cross_fade_samples = min(cross_fade_samples, len(prev_wave), len(next_wave))
 
-            if cross_fade_samples <= 0:
-                # No overlap possible, concatenate
-                final_wave = np.concatenate([prev_wave, next_wave])
+class VocoderService:
+    """
+    Vocoder on its own thread, so ODE sampling of the next chunk overlaps vocoding of the previous one.
+    submit() queues a (d, n) mel and returns a Future of (wave, mel) numpy arrays; mels queued while a decode
+    is running (from any chunk or request) go into the next decode together, up to max_batch_size mels and
+    max_batch_frames padded frames. stream() decodes one mel window by window for early playback.
+    max_queue > 0 bounds the mels waiting to be vocoded; submit() then blocks, applying backpressure to sampling.
+    """
+
+    def __init__(
+        self,
+        vocoder,
+        mel_spec_type=mel_spec_type,
+        max_batch_size=16,
+        max_batch_frames=32768,
+        max_queue=0,
+        name="vocoder",
+    ):
+        self.vocoder = vocoder
+        self.mel_spec_type = mel_spec_type
+        self.max_batch_size = max_batch_size
+        self.max_batch_frames = max_batch_frames
+        self.stats = {"decodes": 0, "decoded_mels": 0, "decoded_frames": 0}
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._carry = None  # mel that did not fit the previous batch
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def submit(self, mel, gain=1.0, return_mel=False):
+        item = _VocodeItem(mel, gain, return_mel)
+        self._queue.put(item)
+        return item.future
+
+    def decode(self, mels, gains=None):
+        """Blocking: vocode mels (batched with whatever else is queued) and return their waves."""
+        gains = [1.0] * len(mels) if gains is None else gains
+        futures = [self.submit(mel, gain) for mel, gain in zip(mels, gains)]
+        return [future.result()[0] for future in futures]
+
+    def stream(self, mel, gain=1.0, window_frames=64, overlap_frames=4, context_frames=32, lookahead=2):
+        """
+        Frame-windowed decode of one (d, n) mel: yields wave pieces in order as soon as each window is vocoded.
+        Each window is decoded with context_frames of mel on both sides (covering the vocoder's receptive field)
+        and neighbouring windows share overlap_frames of audio, cross-faded (overlap-add) to hide the seams.
+        The concatenated pieces closely match a whole-mel decode.
+        """
+        num_frames = mel.shape[-1]
+        overlap = overlap_frames * hop_length
+        context_frames = max(context_frames, 1)  # a center-padded decode of n frames covers n - 1 hops
+        # every window decodes the same span (the last one takes more left context), so windows batched together
+        # need no padding, which would change the edge of a shorter one
+        span = window_frames + overlap_frames + 2 * context_frames
+        windows = []
+        for start in range(0, num_frames, window_frames):
+            keep_start, end = max(start - overlap_frames, 0), min(start + window_frames, num_frames)
+            lo = max(min(keep_start - context_frames, num_frames - span), 0)
+            windows.append((lo, keep_start, end, min(lo + span, num_frames)))
+
+        pending = deque()
+        tail = None
+        for i in range(len(windows)):
+            # keep a few windows in flight so the vocoder thread can batch them
+            while len(pending) < lookahead and i + len(pending) < len(windows):
+                lo, _, _, hi = windows[i + len(pending)]
+                pending.append(self.submit(mel[:, lo:hi], gain))
+            wave = pending.popleft().result()[0]
+
+            lo, keep_start, end, _ = windows[i]
+            last = i == len(windows) - 1
+            wave = wave[(keep_start - lo) * hop_length : None if last else (end - lo) * hop_length]
+            if tail is not None:
+                fade = min(len(tail), len(wave))
+                fade_out, fade_in = _fade_windows(fade)
+                wave = np.concatenate([tail[:fade] * fade_out + wave[:fade] * fade_in, wave[fade:]])
+            if last:
+                yield wave
+            else:
+                keep = min(overlap, len(wave))
+                tail = wave[len(wave) - keep :]
+                yield wave[: len(wave) - keep]
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self):
+        """Block for the first mel, then take what is already queued within the batch limits."""
+        if self._carry is not None:
+            item, self._carry = self._carry, None
+        elif self._stopping:
+            return None
+        else:
+            item = self._queue.get()
+            if item is None:
+                return None
+        batch, max_len = [item], item.mel.shape[-1]
+        while len(batch) < self.max_batch_size and not self._stopping:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._stopping = True  # shut down after this batch
+                break
+            if (len(batch) + 1) * max(max_len, item.mel.shape[-1]) > self.max_batch_frames:
+                self._carry = item
+                break
+            batch.append(item)
+            max_len = max(max_len, item.mel.shape[-1])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            try:
+                waves = vocode_mel_batch([item.mel for item in batch], self.vocoder, self.mel_spec_type)
+            except Exception as e:
+                for item in batch:
+                    item.future.set_exception(e)
                 continue
+            self.stats["decodes"] += 1
+            self.stats["decoded_mels"] += len(batch)
+            self.stats["decoded_frames"] += sum(item.mel.shape[-1] for item in batch)
+            for item, wave in zip(batch, waves):
+                mel = item.mel.cpu().numpy() if item.return_mel else None
+                item.future.set_result(((wave * item.gain).cpu().numpy(), mel))
+
+
+@lru_cache(maxsize=8)
+def _fade_windows(cross_fade_samples):
+    """Cached (fade_out, fade_in) float32 windows for a cross-fade of the given length."""
+    fade_in = np.linspace(0, 1, cross_fade_samples, dtype=np.float32)
+    fade_out = np.ascontiguousarray(fade_in[::-1])
+    fade_in.setflags(write=False)
+    fade_out.setflags(write=False)
+    return fade_out, fade_in
+
+
+def combine_chunk_waves(generated_waves, cross_fade_duration=cross_fade_duration):
+    """
+    Join chunk waves in order, cross-fading the overlaps.
+    The output length is known from the chunk lengths, so it is allocated once and each chunk is written once.
+    """
+    if cross_fade_duration <= 0:
+        # Simply concatenate
+        return np.concatenate(generated_waves)
+
+    # Overlap with the audio assembled so far, ensuring it does not exceed wave lengths
+    cross_fade_samples = int(cross_fade_duration * target_sample_rate)
+    overlaps = [0]
+    total_len = len(generated_waves[0])
+    for wave in generated_waves[1:]:
+        overlap = min(cross_fade_samples, total_len, len(wave))
+        overlaps.append(overlap)
+        total_len += len(wave) - overlap
+
+    final_wave = np.empty(total_len, dtype=np.result_type(*generated_waves, np.float32))
+    pos = 0
+    for wave, overlap in zip(generated_waves, overlaps):
+        if overlap > 0:
+            # Fade out the tail already written and fade in the head of this chunk
+            fade_out, fade_in = _fade_windows(overlap)
+            tail = final_wave[pos - overlap : pos]
+            tail *= fade_out
+            tail += wave[:overlap] * fade_in
+        final_wave[pos : pos + len(wave) - overlap] = wave[overlap:]
+        pos += len(wave) - overlap
+    return final_wave
+
+
+class CrossFadeStream:
+    """
+    Incremental combine_chunk_waves: push chunk waves in order and get back the samples that are final.
+    The last cross_fade_duration of audio is held back until the next chunk (or flush) arrives,
+    so the concatenated output equals combine_chunk_waves on the same chunks.
+    """
+
+    def __init__(self, cross_fade_duration=cross_fade_duration, sample_rate=target_sample_rate):
+        self.cross_fade_samples = max(int(cross_fade_duration * sample_rate), 0)
+        self._tail = None
+
+    def push(self, wave, new_chunk=True):
+        # new_chunk=False continues the current chunk (e.g. pieces from VocoderService.stream), no cross-fade
+        if self._tail is None:
+            joined = wave
+        elif not new_chunk:
+            joined = np.concatenate([self._tail, wave])
+        else:
+            prev_wave = self._tail
+            cross_fade_samples = min(self.cross_fade_samples, len(prev_wave), len(wave))
+            if cross_fade_samples <= 0:
+                joined = np.concatenate([prev_wave, wave])
+            else:
+                fade_out, fade_in = _fade_windows(cross_fade_samples)
+                cross_faded_overlap = prev_wave[-cross_fade_samples:] * fade_out + wave[:cross_fade_samples] * fade_in
+                joined = np.concatenate(
+                    [prev_wave[:-cross_fade_samples], cross_faded_overlap, wave[cross_fade_samples:]]
+                )
 
-            # Overlapping parts
-            prev_overlap = prev_wave[-cross_fade_samples:]
-            next_overlap = next_wave[:cross_fade_samples]
+        keep = min(self.cross_fade_samples, len(joined))
+        self._tail = joined[len(joined) - keep :]
+        return joined[: len(joined) - keep]
 
-            # Fade out and fade in
-            fade_out = np.linspace(1, 0, cross_fade_samples)
-            fade_in = np.linspace(0, 1, cross_fade_samples)
+    def flush(self):
+        tail = self._tail if self._tail is not None else np.zeros(0, dtype=np.float32)
+        self._tail = None
+        return tail
 
-            # Cross-faded overlap
-            cross_faded_overlap = prev_overlap * fade_out + next_overlap * fade_in
 
-            # Combine
-            new_wave = np.concatenate(
-                [prev_wave[:-cross_fade_samples], cross_faded_overlap, next_wave[cross_fade_samples:]]
+def infer_batch_process(
+    ref_audio,
+    ref_text,
+    gen_text_batches,
+    model_obj,
+    vocoder,
+    mel_spec_type="vocos",
+    progress=tqdm,
+    target_rms=0.1,
+    cross_fade_duration=0.15,
+    nfe_step=32,
+    cfg_strength=2.0,
+    sway_sampling_coef=-1,
+    speed=1,
+    fix_duration=None,
+    device=None,
+    batch_size=1,
+    max_batch_frames=None,
+    seed=None,
+    collect_spectrogram=False,
+    sampler=None,
+    sample_fn=None,
+    text_workers=2,
+    prefetch_groups=2,
+):
+    # batch_size > 1 pads several text chunks into one sample call (length-bucketed, bounded by max_batch_frames)
+    # seed makes the output reproducible; each chunk draws its noise from its own generator
+    # the combined spectrogram is only built when collect_spectrogram is set (returned as None otherwise)
+    # sampler selects a fewer-step CFM solver (see model.cfm.SAMPLERS), None keeps the default euler odeint
+    # sample_fn replaces sample_chunk_batch with the same signature, e.g. infer.utils_onnx.sample_chunk_batch;
+    # by default mels go to a VocoderService thread, so sampling of the next group overlaps vocoding
+    chunks = build_chunk_requests(
+        ref_audio,
+        ref_text,
+        gen_text_batches,
+        target_rms=target_rms,
+        speed=speed,
+        fix_duration=fix_duration,
+        device=device,
+        seed=seed,
+    )
+    groups = group_chunk_requests(chunks, batch_size=batch_size, max_batch_frames=max_batch_frames)
+
+    results = [None] * len(chunks)
+    if sample_fn is not None:
+        for group in progress.tqdm(groups):
+            outputs = sample_fn(
+                [chunks[i] for i in group],
+                model_obj,
+                vocoder,
+                mel_spec_type=mel_spec_type,
+                target_rms=target_rms,
+                nfe_step=nfe_step,
+                cfg_strength=cfg_strength,
+                sway_sampling_coef=sway_sampling_coef,
+                return_mel=collect_spectrogram,
+                sampler=sampler,
             )
+            for i, output in zip(group, outputs):
+                results[i] = output
+    else:
+        # three stages, each on a different group at a time: text front end on a thread pool (prefetch_groups
+        # ahead), sampling here, vocoding + rescale + to-numpy on the vocoder thread (bounded queue)
+        with ThreadPoolExecutor(max_workers=text_workers, thread_name_prefix="text-prep") as text_pool, VocoderService(
+            vocoder, mel_spec_type=mel_spec_type, max_queue=max(batch_size, 1) * (prefetch_groups + 1)
+        ) as vocoder_service:
+            text_futures = [
+                text_pool.submit(prepare_chunk_tokens, [chunks[i] for i in group]) if k <= prefetch_groups else None
+                for k, group in enumerate(groups)
+            ]
+            for k, group in enumerate(progress.tqdm(groups)):
+                ahead = k + prefetch_groups
+                if ahead < len(groups) and text_futures[ahead] is None:
+                    text_futures[ahead] = text_pool.submit(prepare_chunk_tokens, [chunks[i] for i in groups[ahead]])
+                text_futures[k].result()
+                mels = sample_chunk_mels(
+                    [chunks[i] for i in group],
+                    model_obj,
+                    nfe_step=nfe_step,
+                    cfg_strength=cfg_strength,
+                    sway_sampling_coef=sway_sampling_coef,
+                    sampler=sampler,
+                )
+                for i, mel in zip(group, mels):
+                    results[i] = vocoder_service.submit(
+                        mel, gain=chunk_gain(chunks[i], target_rms), return_mel=collect_spectrogram
+                    )
+            results = [future.result() for future in results]
 
-            final_wave = new_wave
+    generated_waves = [wave for wave, _ in results]
+
+    # Combine all generated waves with cross-fading
+    final_wave = combine_chunk_waves(generated_waves, cross_fade_duration=cross_fade_duration)
 
     # Create a combined spectrogram
-    combined_spectrogram = np.concatenate(spectrograms, axis=1)
+    combined_spectrogram = None
+    if collect_spectrogram:
+        combined_spectrogram = np.concatenate([mel for _, mel in results], axis=1)
 
     return final_wave, target_sample_rate, combined_spectrogram
 
@@ -561,15 +1489,8 @@ def infer_batch_process(
 
 
 def remove_silence_for_generated_wav(filename):
-    aseg = AudioSegment.from_file(filename)
-    non_silent_segs = silence.split_on_silence(
-        aseg, min_silence_len=1000, silence_thresh=-50, keep_silence=500, seek_step=10
-    )
-    non_silent_wave = AudioSegment.silent(duration=0)
-    for non_silent_seg in non_silent_segs:
-        non_silent_wave += non_silent_seg
-    aseg = non_silent_wave
-    aseg.export(filename, format="wav")
+    wave, sr = load_audio_array(filename)
+    sf.write(filename, remove_silence_from_wave(wave, sr), sr)
 
 
 # save spectrogram
@@ -0,0 +1,274 @@
+# F5-TTS inference on ONNX Runtime, for CPU-only deployment
+# Models are exported with infer/export_onnx.py; mel extraction, the ODE loop and the ISTFT run in numpy.
+# The network itself runs without torch, but torch is still required: the text front end (model.utils) and the
+# reference preprocessing / chunk building in infer.utils_infer import it
+import json
+import os
+
+import numpy as np
+import onnxruntime as ort
+
+SAMPLERS = ("euler", "midpoint", "heun", "adaptive")  # same solvers as model.cfm.SAMPLERS
+
+
+def create_session(path, num_threads=None, providers=None):
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(path, sess_options=options, providers=providers or ["CPUExecutionProvider"])
+
+
+def hann_window(n):
+    # periodic, as torch.hann_window
+    return (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n) / n)).astype(np.float32)
+
+
+def load_export_config(model_dir):
+    with open(os.path.join(model_dir, "config.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ode solvers on numpy arrays, same semantics as model.cfm.solve_flow (euler here equals odeint euler)
+
+
+def solve_flow(fn, y0, t, sampler="euler", adaptive_tol=0.05, mask=None):
+    """Integrate dx/dt = fn(t, x) over the time grid t. Returns the final state."""
+    if sampler not in SAMPLERS:
+        raise ValueError(f"Unknown sampler: {sampler}, expected one of {SAMPLERS}")
+
+    def rel_change(v, v_prev):
+        diff, ref = v - v_prev, v
+        if mask is not None:
+            diff, ref = diff * mask[..., None], ref * mask[..., None]
+        batch = v.shape[0]
+        diff_norm = np.linalg.norm(diff.reshape(batch, -1), axis=1)
+        ref_norm = np.maximum(np.linalg.norm(ref.reshape(batch, -1), axis=1), 1e-6)
+        return (diff_norm / ref_norm).max()
+
+    x = y0
+    v = fn(t[0], x)
+    v_prev = dt_prev = None
+    for i in range(len(t) - 1):
+        t0, t1 = float(t[i]), float(t[i + 1])
+        dt = t1 - t0
+        last = i == len(t) - 2
+        if sampler == "euler":
+            x = x + dt * v
+            v = fn(t1, x) if not last else None
+        elif sampler == "midpoint":
+            if v is None:
+                v = fn(t0, x)
+            x = x + dt * fn(t0 + dt / 2, x + dt / 2 * v)
+            v = None
+        elif sampler == "heun":
+            v_end = fn(t1, x + dt * v)
+            x = x + dt / 2 * (v + v_end)
+            v = v_end
+        elif sampler == "adaptive":
+            if t0 >= 0.5 and v_prev is not None and rel_change(v, v_prev) * (1 - t0) / dt_prev < adaptive_tol:
+                return x + (1 - t0) * v
+            x = x + dt * v
+            v_prev, dt_prev = v, dt
+            v = fn(t1, x) if not last else None
+    return x
+
+
+class OnnxF5TTS:
+    """
+    DiT on ONNX Runtime: dit_prepare.onnx once per sample (text embedding, cond and null context),
+    dit_step.onnx per ode step (classifier-free guidance fused in the graph).
+    """
+
+    def __init__(self, model_dir, num_threads=None, providers=None):
+        self.config = load_export_config(model_dir)
+        self.prepare_session = create_session(os.path.join(model_dir, "dit_prepare.onnx"), num_threads, providers)
+        self.step_session = create_session(os.path.join(model_dir, "dit_step.onnx"), num_threads, providers)
+        # exports before the text mask input treat every item as long as the batch
+        self.prepare_takes_mask = "mask" in {i.name for i in self.prepare_session.get_inputs()}
+
+        with open(os.path.join(model_dir, "vocab.txt"), "r", encoding="utf-8") as f:
+            self.vocab_char_map = {char[:-1]: i for i, char in enumerate(f)}
+
+        self.num_channels = self.config["n_mel_channels"]
+        self.hop_length = self.config["hop_length"]
+        self.n_fft = self.config["n_fft"]
+        self.max_duration = self.config.get("max_duration", 4096)
+        self.mel_filters = np.load(os.path.join(model_dir, "mel_filters.npy"))  # (n_fft // 2 + 1, n_mels)
+        self.window = hann_window(self.config["win_length"])
+
+    def mel_spec(self, wave):
+        """(b, nw) waveform -> (b, n, d) log mel, same as model.modules.get_vocos_mel_spectrogram."""
+        wave = np.asarray(wave, dtype=np.float32)
+        pad = self.n_fft // 2
+        wave = np.pad(wave, ((0, 0), (pad, pad)), mode="reflect")
+        frames = np.lib.stride_tricks.sliding_window_view(wave, self.n_fft, axis=-1)[:, :: self.hop_length]
+        spec = np.abs(np.fft.rfft(frames * self.window, axis=-1)).astype(np.float32)  # (b, n, n_fft // 2 + 1)
+        return np.log(np.maximum(spec @ self.mel_filters, 1e-5))
+
+    def text_to_ids(self, text_list):
+        """Text (or already converted token lists) -> (b, nt) int64 ids, -1 padded as model.utils.list_str_to_idx."""
+        if all(isinstance(text, list) for text in text_list):
+            char_lists = text_list
+        else:
+            from model.utils import convert_char_to_pinyin  # shared text front end
+
+            char_lists = convert_char_to_pinyin(text_list)
+        ids = np.full((len(char_lists), max(len(chars) for chars in char_lists)), -1, dtype=np.int64)
+        for i, chars in enumerate(char_lists):
+            ids[i, : len(chars)] = [self.vocab_char_map.get(c, 0) for c in chars]
+        return ids
+
+    def sample(
+        self,
+        cond,
+        text,
+        duration,
+        lens,
+        steps=32,
+        cfg_strength=2.0,
+        sway_sampling_coef=None,
+        seeds=None,
+        sampler=None,
+        adaptive_tol=0.05,
+    ):
+        """
+        Mirrors CFM.sample: cond (b, n, d) reference mel, text (b, nt) ids, duration and lens (b,) in frames.
+        Noise comes from numpy generators, so a seed reproduces ONNX output but not the torch one.
+        Returns (b, n, d) mels with the reference part restored.
+        """
+        batch, cond_seq_len = cond.shape[:2]
+        duration = np.maximum(np.maximum((text != -1).sum(-1), lens) + 1, duration)
+        duration = np.minimum(duration, self.max_duration)
+        seq_len = int(duration.max())
+
+        cond = np.pad(cond, ((0, 0), (0, seq_len - cond_seq_len), (0, 0)))
+        cond_mask = (np.arange(seq_len)[None, :] < lens[:, None])[..., None]
+        step_cond = np.where(cond_mask, cond, 0.0).astype(np.float32)
+        mask = np.arange(seq_len)[None, :] < duration[:, None]
+
+        prepare_inputs = {"cond": step_cond, "text": text}
+        if self.prepare_takes_mask:
+            prepare_inputs["mask"] = mask
+        (context,) = self.prepare_session.run(None, prepare_inputs)
+        cfg = np.array(cfg_strength, dtype=np.float32)
+
+        def fn(t, x):
+            inputs = {"x": x, "time": np.full((batch,), t, dtype=np.float32), "context": context, "mask": mask}
+            return self.step_session.run(None, dict(inputs, cfg_strength=cfg))[0]
+
+        seeds = seeds if isinstance(seeds, (list, tuple)) else [seeds] * batch
+        y0 = np.zeros((batch, seq_len, self.num_channels), dtype=np.float32)
+        for i, (dur, seed) in enumerate(zip(duration, seeds)):
+            y0[i, :dur] = np.random.default_rng(seed).standard_normal((int(dur), self.num_channels), dtype=np.float32)
+
+        t = np.linspace(0, 1, steps + 1, dtype=np.float32)
+        if sway_sampling_coef is not None:
+            t = t + sway_sampling_coef * (np.cos(np.pi / 2 * t) - 1 + t)
+
+        out = solve_flow(fn, y0, t, sampler or "euler", adaptive_tol=adaptive_tol, mask=mask)
+        return np.where(cond_mask, cond, out)
+
+
+class OnnxVocos:
+    """Vocos on ONNX Runtime: the network predicts the complex STFT, the inverse STFT runs in numpy."""
+
+    def __init__(self, model_dir, num_threads=None, providers=None):
+        config = load_export_config(model_dir)
+        self.session = create_session(os.path.join(model_dir, "vocos.onnx"), num_threads, providers)
+        self.n_fft = config["n_fft"]
+        self.hop_length = config["hop_length"]
+        self.padding = config.get("vocos_padding", "center")
+        self.window = hann_window(self.n_fft)
+
+    def decode(self, mel):
+        """(b, d, n) mel -> (b, nw) waveform"""
+        real, imag = self.session.run(None, {"mel": np.asarray(mel, dtype=np.float32)})
+        return self.istft(real + 1j * imag)
+
+    def istft(self, spec):
+        """(b, n_fft // 2 + 1, n) complex -> (b, nw), as vocos.spectral_ops.ISTFT ("center" or "same" padding)"""
+        batch, _, num_frames = spec.shape
+        frames = np.fft.irfft(spec, self.n_fft, axis=1).astype(np.float32) * self.window[None, :, None]
+
+        output_size = (num_frames - 1) * self.hop_length + self.n_fft
+        y = np.zeros((batch, output_size), dtype=np.float32)
+        envelope = np.zeros(output_size, dtype=np.float32)
+        window_sq = np.square(self.window)
+        for i in range(num_frames):
+            start = i * self.hop_length
+            y[:, start : start + self.n_fft] += frames[:, :, i]
+            envelope[start : start + self.n_fft] += window_sq
+
+        pad = self.n_fft // 2 if self.padding == "center" else (self.n_fft - self.hop_length) // 2
+        y, envelope = y[:, pad : output_size - pad], envelope[pad : output_size - pad]
+        return y / np.where(envelope > 1e-11, envelope, 1.0)
+
+
+def sample_chunk_batch(
+    chunks,
+    model_obj,
+    vocoder,
+    mel_spec_type="vocos",
+    target_rms=0.1,
+    nfe_step=32,
+    cfg_strength=2.0,
+    sway_sampling_coef=-1.0,
+    seed=None,
+    return_mel=False,
+    sampler=None,
+    adaptive_tol=0.05,
+):
+    """
+    ONNX counterpart of infer.utils_infer.sample_chunk_batch (model_obj an OnnxF5TTS, vocoder an OnnxVocos),
+    takes the same ChunkRequests and returns the same list of (wave, mel) numpy arrays.
+    """
+    if mel_spec_type != "vocos":
+        raise ValueError("ONNX inference only supports the vocos vocoder")
+
+    conds = []
+    for chunk in chunks:
+        cond = np.asarray(chunk.cond, dtype=np.float32)  # chunk.cond is a cpu torch tensor from build_chunk_requests
+        if cond.ndim == 2:
+            cond = model_obj.mel_spec(cond)
+        conds.append(cond[0])
+    lens = np.array([c.shape[0] for c in conds], dtype=np.int64)
+    cond = np.zeros((len(conds), lens.max(), model_obj.num_channels), dtype=np.float32)
+    for i, c in enumerate(conds):
+        cond[i, : len(c)] = c
+
+    text = model_obj.text_to_ids([chunk.text if chunk.tokens is None else chunk.tokens for chunk in chunks])
+    duration = np.array([chunk.duration for chunk in chunks], dtype=np.int64)
+
+    generated = model_obj.sample(
+        cond,
+        text,
+        duration,
+        lens,
+        steps=nfe_step,
+        cfg_strength=cfg_strength,
+        sway_sampling_coef=sway_sampling_coef,
+        seeds=[seed if chunk.seed is None else chunk.seed for chunk in chunks],
+        sampler=sampler,
+        adaptive_tol=adaptive_tol,
+    )
+
+    # sample extends each duration to at least max(text, reference) + 1 frames
+    text_lens = (text != -1).sum(-1)
+    total_lens = [
+        min(max(max(int(text_len), int(ref_len)) + 1, int(dur)), generated.shape[1])
+        for text_len, ref_len, dur in zip(text_lens, lens, duration)
+    ]
+    gen_mels = [generated[i, chunk.ref_audio_len : total_lens[i]] for i, chunk in enumerate(chunks)]
+    # the exported vocos graph has no mask, so each mel is decoded alone to keep waves independent of the batch
+    waves = [vocoder.decode(np.ascontiguousarray(m.T[None], dtype=np.float32))[0] for m in gen_mels]
+
+    results = []
+    for i, chunk in enumerate(chunks):
+        wave = waves[i]
+        if chunk.rms < target_rms:
+            wave = wave * float(chunk.rms) / target_rms
+        results.append((wave, gen_mels[i].T if return_mel else None))
+    return results
@@ -44,7 +44,7 @@ class TextEmbedding(nn.Module):
         else:
             self.extra_modeling = False
 
-    def forward(self, text: int["b nt"], seq_len, drop_text=False):  # noqa: F722
+    def forward(self, text: int["b nt"], seq_len, drop_text=False, mask: bool["b n"] | None = None):  # noqa: F722
         text = text + 1  # use 0 as filler token. preprocess of batch pad -1, see list_str_to_idx()
         text = text[:, :seq_len]  # curtail if character tokens are more than the mel spec tokens
         batch, text_len = text.shape[0], text.shape[1]
@@ -63,8 +63,9 @@ class TextEmbedding(nn.Module):
             text_pos_embed = self.freqs_cis[pos_idx]
             text = text + text_pos_embed
 
-            # convnextv2 blocks
-            text = self.text_blocks(text)
+            # convnextv2 blocks, masked to each item's own length (as if it ran alone)
+            for block in self.text_blocks:
+                text = block(text, mask=mask)
 
         return text
 
@@ -75,15 +76,35 @@ class TextEmbedding(nn.Module):
 class InputEmbedding(nn.Module):
     def __init__(self, mel_dim, text_dim, out_dim):
         super().__init__()
+        self.mel_dim = mel_dim
         self.proj = nn.Linear(mel_dim * 2 + text_dim, out_dim)
         self.conv_pos_embed = ConvPositionEmbedding(dim=out_dim)
 
-    def forward(self, x: float["b n d"], cond: float["b n d"], text_embed: float["b n d"], drop_audio_cond=False):  # noqa: F722
+    def forward(
+        self,
+        x: float["b n d"],  # noqa: F722
+        cond: float["b n d"],  # noqa: F722
+        text_embed: float["b n d"],  # noqa: F722
+        drop_audio_cond=False,
+        audio_mask: bool["b n"] | None = None,  # noqa: F722
+    ):
+        return self.forward_step(x, self.prepare(cond, text_embed, drop_audio_cond=drop_audio_cond), audio_mask)
+
+    def prepare(self, cond: float["b n d"], text_embed: float["b n d"], drop_audio_cond=False):  # noqa: F722
+        # proj is linear, so the cond + text part of proj(cat(x, cond, text)) can be computed once per sample
         if drop_audio_cond:  # cfg for cond audio
             cond = torch.zeros_like(cond)
 
-        x = self.proj(torch.cat((x, cond, text_embed), dim=-1))
-        x = self.conv_pos_embed(x) + x
+        return F.linear(torch.cat((cond, text_embed), dim=-1), self.proj.weight[:, self.mel_dim :], self.proj.bias)
+
+    def forward_step(
+        self,
+        x: float["b n d"],  # noqa: F722
+        context: float["b n d"],  # output of prepare  # noqa: F722
+        audio_mask: bool["b n"] | None = None,  # noqa: F722
+    ):
+        x = F.linear(x, self.proj.weight[:, : self.mel_dim]) + context
+        x = self.conv_pos_embed(x, mask=audio_mask) + x
         return x
 
 
@@ -106,6 +127,7 @@ class DiT(nn.Module):
         conv_layers=0,
         long_skip_connection=False,
         checkpoint_activations=False,
+        attn_window_size=None,
     ):
         super().__init__()
 
@@ -121,7 +143,17 @@ class DiT(nn.Module):
         self.depth = depth
 
         self.transformer_blocks = nn.ModuleList(
-            [DiTBlock(dim=dim, heads=heads, dim_head=dim_head, ff_mult=ff_mult, dropout=dropout) for _ in range(depth)]
+            [
+                DiTBlock(
+                    dim=dim,
+                    heads=heads,
+                    dim_head=dim_head,
+                    ff_mult=ff_mult,
+                    dropout=dropout,
+                    attn_window_size=attn_window_size,
+                )
+                for _ in range(depth)
+            ]
         )
         self.long_skip_connection = nn.Linear(dim * 2, dim, bias=False) if long_skip_connection else None
 
@@ -148,25 +180,97 @@ class DiT(nn.Module):
         drop_text,  # cfg for text
         mask: bool["b n"] | None = None,  # noqa: F722
     ):
-        batch, seq_len = x.shape[0], x.shape[1]
+        cache = self.prepare(cond, text, mask=mask, drop_audio_cond=drop_audio_cond, drop_text=drop_text)
+        return self.forward_step(x, time, cache)
+
+    def forward_cfg(
+        self,
+        x: float["b n d"],  # nosied input audio  # noqa: F722
+        cond: float["b n d"],  # masked cond audio  # noqa: F722
+        text: int["b nt"],  # text  # noqa: F722
+        time: float["b"] | float[""],  # time step  # noqa: F821 F722
+        mask: bool["b n"] | None = None,  # noqa: F722
+    ):
+        """
+        Conditional and unconditional (audio and text dropped) predictions in one forward pass,
+        the two inputs stacked along batch. Returns (pred, null_pred), each b n d.
+        """
+        return self.forward_step(x, time, self.prepare(cond, text, mask=mask, cfg=True))
+
+    def prepare(
+        self,
+        cond: float["b n d"],  # masked cond audio  # noqa: F722
+        text: int["b nt"],  # text  # noqa: F722
+        mask: bool["b n"] | None = None,  # noqa: F722
+        drop_audio_cond=False,
+        drop_text=False,
+        cfg=False,
+        prompt_lens: int["b"] | None = None,  # noqa: F821
+    ):
+        """
+        Everything that does not depend on the noised input or the time step: text embedding (with its
+        ConvNeXt blocks), the cond/text half of the input projection and rope. Compute once per sample
+        and pass to forward_step at every ODE step.
+        cfg=True also prepares the null (audio and text dropped) context, stacked after the conditional one;
+        it only depends on each item's length (mask), so without a mask it is computed for one item and broadcast.
+        mask (b n) marks each item's frames: at inference the text blocks ignore the rest, so a batched (or bucket
+        padded) item gets the same embedding as when run alone. Training keeps the unmasked text blocks the
+        checkpoints were trained with.
+        prompt_lens (reference frames per item) stay visible to every frame when attention is windowed.
+        """
+        batch, seq_len = cond.shape[0], cond.shape[1]
+        text_mask = None if self.training else mask
+
+        text_embed = self.text_embed(text, seq_len, drop_text=drop_text, mask=text_mask)
+        context = self.input_embed.prepare(cond, text_embed, drop_audio_cond=drop_audio_cond)
+
+        if cfg:
+            if text_mask is None:
+                null_text_embed = self.text_embed(text[:1], seq_len, drop_text=True)
+                null_context = self.input_embed.prepare(cond[:1], null_text_embed, drop_audio_cond=True)
+                null_context = null_context.expand(batch, -1, -1)
+            else:
+                null_text_embed = self.text_embed(text, seq_len, drop_text=True, mask=text_mask)
+                null_context = self.input_embed.prepare(cond, null_text_embed, drop_audio_cond=True)
+            context = torch.cat((context, null_context), dim=0)
+            if mask is not None:
+                mask = torch.cat((mask, mask), dim=0)
+            if prompt_lens is not None:
+                prompt_lens = torch.cat((prompt_lens, prompt_lens), dim=0)
+
+        rope = self.rotary_embed.forward_from_seq_len(seq_len)
+
+        return dict(context=context, mask=mask, rope=rope, cfg=cfg, prompt_lens=prompt_lens)
+
+    def forward_step(
+        self,
+        x: float["b n d"],  # nosied input audio  # noqa: F722
+        time: float["b"] | float[""],  # time step  # noqa: F821 F722
+        cache: dict,  # output of prepare
+    ):
+        batch = x.shape[0]
         if time.ndim == 0:
             time = time.repeat(batch)
 
         # t: conditioning time, c: context (text + masked cond audio), x: noised input audio
         t = self.time_embed(time)
-        text_embed = self.text_embed(text, seq_len, drop_text=drop_text)
-        x = self.input_embed(x, cond, text_embed, drop_audio_cond=drop_audio_cond)
+        if cache["cfg"]:
+            x, t = torch.cat((x, x), dim=0), torch.cat((t, t), dim=0)
 
-        rope = self.rotary_embed.forward_from_seq_len(seq_len)
+        x = self.input_embed.forward_step(x, cache["context"], audio_mask=cache["mask"])
+        output = self.forward_blocks(x, t, cache["mask"], cache["rope"], cache.get("prompt_lens"))
+
+        return output.chunk(2, dim=0) if cache["cfg"] else output
 
+    def forward_blocks(self, x, t, mask, rope, prompt_lens=None):
         if self.long_skip_connection is not None:
             residual = x
 
         for block in self.transformer_blocks:
             if self.checkpoint_activations:
-                x = torch.utils.checkpoint.checkpoint(self.ckpt_wrapper(block), x, t, mask, rope)
+                x = torch.utils.checkpoint.checkpoint(self.ckpt_wrapper(block), x, t, mask, rope, prompt_lens)
             else:
-                x = block(x, t, mask=mask, rope=rope)
+                x = block(x, t, mask=mask, rope=rope, prompt_lens=prompt_lens)
 
         if self.long_skip_connection is not None:
             x = self.long_skip_connection(torch.cat((x, residual), dim=-1))
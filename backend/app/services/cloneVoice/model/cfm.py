@@ -29,6 +29,66 @@ from .utils import (
 )
 
 
+SAMPLERS = ("euler", "midpoint", "heun", "adaptive")
+
+
+def solve_flow(fn, y0, t, sampler, adaptive_tol=0.05, mask=None):
+    """
+    Fixed-grid solvers for the flow ODE, alternatives to odeint's euler at fewer steps.
+    euler: one evaluation per step (same as odeint euler).
+    midpoint: 2 evaluations per step.
+    heun: Heun's method reusing the end-point velocity as the next step's start velocity,
+          second order at about one evaluation per step.
+    adaptive: euler steps that, past t=0.5, stop once the velocity extrapolated to t=1 would change by
+              less than adaptive_tol (relative), then jump straight to t=1 along the last velocity.
+    Returns the trajectory of states, stacked like odeint.
+    """
+    if sampler not in SAMPLERS:
+        raise ValueError(f"Unknown sampler: {sampler}, expected one of {SAMPLERS}")
+
+    x = y0
+    trajectory = [x]
+
+    def rel_change(v, v_prev):
+        diff, ref = v - v_prev, v
+        if exists(mask):
+            diff, ref = diff * mask.unsqueeze(-1), ref * mask.unsqueeze(-1)
+        return (diff.flatten(1).norm(dim=1) / ref.flatten(1).norm(dim=1).clamp(min=1e-6)).max()
+
+    v = fn(t[0], x)
+    v_prev = None
+    for i in range(len(t) - 1):
+        t0, t1 = t[i], t[i + 1]
+        dt = t1 - t0
+        last = i == len(t) - 2
+        if sampler == "euler":
+            x = x + dt * v
+            v = fn(t1, x) if not last else None
+        elif sampler == "midpoint":
+            if v is None:
+                v = fn(t0, x)
+            x = x + dt * fn(t0 + dt / 2, x + dt / 2 * v)
+            v = None
+        elif sampler == "heun":
+            v_end = fn(t1, x + dt * v)
+            x = x + dt / 2 * (v + v_end)
+            v = v_end
+        elif sampler == "adaptive":
+            # velocity change extrapolated over the remaining time, relative to the velocity;
+            # only checked past halfway, early steps are tiny under sway sampling and say little about curvature
+            if t0 >= 0.5 and v_prev is not None and rel_change(v, v_prev) * (1 - t0) / dt_prev < adaptive_tol:
+                # trajectory is straight: follow the current velocity to the end
+                x = x + (1 - t0) * v
+                trajectory.append(x)
+                break
+            x = x + dt * v
+            v_prev, dt_prev = v, dt
+            v = fn(t1, x) if not last else None
+        trajectory.append(x)
+
+    return torch.stack(trajectory)
+
+
 class CFM(nn.Module):
     def __init__(
         self,
@@ -74,6 +134,11 @@ class CFM(nn.Module):
         # vocab map for tokenization
         self.vocab_char_map = vocab_char_map
 
+        # inference only: sequence lengths are padded up to one of these, so compiled step graphs are reused
+        self.duration_buckets = None
+        # inference only: replaces transformer.forward_step (e.g. a compiled version), see infer.utils_infer.compile_model
+        self.step_fn = None
+
     @property
     def device(self):
         return next(self.parameters()).device
@@ -89,15 +154,20 @@ class CFM(nn.Module):
         steps=32,
         cfg_strength=1.0,
         sway_sampling_coef=None,
-        seed: int | None = None,
+        seed: int | list[int | None] | None = None,
         max_duration=4096,
         vocoder: Callable[[float["b d n"]], float["b nw"]] | None = None,  # noqa: F722
         no_ref_audio=False,
         duplicate_test=False,
         t_inter=0.1,
         edit_mask=None,
+        sampler: str | None = None,
+        adaptive_tol=0.05,
+        fused_cfg=True,
     ):
         self.eval()
+        # fused cfg: conditional and null predictions in one batched forward, for backbones that support it
+        fused_cfg = fused_cfg and hasattr(self.transformer, "forward_cfg")
         # raw wave
 
         if cond.ndim == 2:
@@ -135,32 +205,62 @@ class CFM(nn.Module):
         duration = duration.clamp(max=max_duration)
         max_duration = duration.amax()
 
+        # sequence length of the ode state: the longest duration, or the bucket it falls in
+        seq_len = int(max_duration)
+        if exists(self.duration_buckets):
+            seq_len = next((bucket for bucket in self.duration_buckets if bucket >= seq_len), seq_len)
+
         # duplicate test corner for inner time step oberservation
         if duplicate_test:
             test_cond = F.pad(cond, (0, 0, cond_seq_len, max_duration - 2 * cond_seq_len), value=0.0)
 
-        cond = F.pad(cond, (0, 0, 0, max_duration - cond_seq_len), value=0.0)
+        cond = F.pad(cond, (0, 0, 0, seq_len - cond_seq_len), value=0.0)
         if no_ref_audio:
             cond = torch.zeros_like(cond)
 
-        cond_mask = F.pad(cond_mask, (0, max_duration - cond_mask.shape[-1]), value=False)
+        cond_mask = F.pad(cond_mask, (0, seq_len - cond_mask.shape[-1]), value=False)
         cond_mask = cond_mask.unsqueeze(-1)
         step_cond = torch.where(
             cond_mask, cond, torch.zeros_like(cond)
         )  # allow direct control (cut cond audio) with lens passed in
 
-        if batch > 1:
-            mask = lens_to_mask(duration)
+        if batch > 1 or exists(self.duration_buckets):  # bucketed: always masked, one graph per bucket
+            mask = lens_to_mask(duration, length=seq_len)
         else:  # save memory and speed up, as single inference need no mask currently
             mask = None
 
         # neural ode
 
+        # step-invariant conditioning (text embedding, cond projection, rope) computed once for all steps
+        step_cache = null_step_cache = None
+        if hasattr(self.transformer, "prepare"):
+            fused = cfg_strength >= 1e-5 and fused_cfg
+            step_cache = self.transformer.prepare(step_cond, text, mask=mask, cfg=fused, prompt_lens=lens)
+            if cfg_strength >= 1e-5 and not fused:
+                null_step_cache = self.transformer.prepare(
+                    step_cond, text, mask=mask, drop_audio_cond=True, drop_text=True, prompt_lens=lens
+                )
+
         def fn(t, x):
             # at each step, conditioning is fixed
             # step_cond = torch.where(cond_mask, cond, torch.zeros_like(cond))
 
             # predict flow
+            if exists(step_cache):
+                forward_step = self.step_fn or self.transformer.forward_step
+                if step_cache["cfg"]:
+                    pred, null_pred = forward_step(x, t, step_cache)
+                    return pred + (pred - null_pred) * cfg_strength
+                pred = forward_step(x, t, step_cache)
+                if cfg_strength < 1e-5:
+                    return pred
+                null_pred = forward_step(x, t, null_step_cache)
+                return pred + (pred - null_pred) * cfg_strength
+
+            if cfg_strength >= 1e-5 and fused_cfg:
+                pred, null_pred = self.transformer.forward_cfg(x=x, cond=step_cond, text=text, time=t, mask=mask)
+                return pred + (pred - null_pred) * cfg_strength
+
             pred = self.transformer(
                 x=x, cond=step_cond, text=text, time=t, mask=mask, drop_audio_cond=False, drop_text=False
             )
@@ -175,12 +275,21 @@ class CFM(nn.Module):
         # noise input
         # to make sure batch inference result is same with different batch size, and for sure single inference
         # still some difference maybe due to convolutional layers
+        # seed is one int for the whole batch or one per item; each seeded item draws from its own generator,
+        # leaving the global RNG untouched
+        seeds = seed if isinstance(seed, (list, tuple)) else [seed] * batch
         y0 = []
-        for dur in duration:
-            if exists(seed):
-                torch.manual_seed(seed)
-            y0.append(torch.randn(dur, self.num_channels, device=self.device, dtype=step_cond.dtype))
+        for dur, item_seed in zip(duration, seeds):
+            generator = None
+            if exists(item_seed):
+                generator = torch.Generator(device=self.device).manual_seed(int(item_seed))
+            y0.append(
+                torch.randn(
+                    int(dur), self.num_channels, device=self.device, dtype=step_cond.dtype, generator=generator
+                )
+            )
         y0 = pad_sequence(y0, padding_value=0, batch_first=True)
+        y0 = F.pad(y0, (0, 0, 0, seq_len - y0.shape[1]), value=0.0)
 
         t_start = 0
 
@@ -194,7 +303,11 @@ class CFM(nn.Module):
         if sway_sampling_coef is not None:
             t = t + sway_sampling_coef * (torch.cos(torch.pi / 2 * t) - 1 + t)
 
-        trajectory = odeint(fn, y0, t, **self.odeint_kwargs)
+        # sampler: None uses odeint (self.odeint_kwargs), or one of SAMPLERS for fewer-step sampling
+        if sampler is None or sampler == self.odeint_kwargs.get("method"):
+            trajectory = odeint(fn, y0, t, **self.odeint_kwargs)
+        else:
+            trajectory = solve_flow(fn, y0, t, sampler, adaptive_tol=adaptive_tol, mask=mask)
 
         sampled = trajectory[-1]
         out = sampled
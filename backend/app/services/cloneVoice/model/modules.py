@@ -181,7 +181,17 @@ class ConvPositionEmbedding(nn.Module):
             x = x.masked_fill(~mask, 0.0)
 
         x = x.permute(0, 2, 1)
-        x = self.conv1d(x)
+        if mask is None or self.training:
+            x = self.conv1d(x)
+        else:
+            # inference: re-mask between the convs, padding frames are no longer zero after the first conv + mish
+            # (training keeps the upstream single masking)
+            conv_mask = mask.permute(0, 2, 1)
+            for layer in self.conv1d:
+                x = layer(x)
+                if isinstance(layer, nn.Conv1d):
+                    continue
+                x = x.masked_fill(~conv_mask, 0.0)
         out = x.permute(0, 2, 1)
 
         if mask is not None:
@@ -256,7 +266,11 @@ class ConvNeXtV2Block(nn.Module):
         self.grn = GRN(intermediate_dim)
         self.pwconv2 = nn.Linear(intermediate_dim, dim)
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(self, x: torch.Tensor, mask: torch.Tensor | None = None) -> torch.Tensor:
+        # mask (b n): frames past each item's length are zeroed before the conv and the GRN (which norms over
+        # the sequence), so padding an item to a longer batch does not change its output
+        if mask is not None:
+            x = x.masked_fill(~mask.unsqueeze(-1), 0.0)
         residual = x
         x = x.transpose(1, 2)  # b n d -> b d n
         x = self.dwconv(x)
@@ -264,6 +278,8 @@ class ConvNeXtV2Block(nn.Module):
         x = self.norm(x)
         x = self.pwconv1(x)
         x = self.act(x)
+        if mask is not None:
+            x = x.masked_fill(~mask.unsqueeze(-1), 0.0)
         x = self.grn(x)
         x = self.pwconv2(x)
         return residual + x
@@ -382,19 +398,23 @@ class Attention(nn.Module):
         mask: bool["b n"] | None = None,  # noqa: F722
         rope=None,  # rotary position embedding for x
         c_rope=None,  # rotary position embedding for c
+        prompt_lens: int["b"] | None = None,  # reference prompt frames, kept global by windowed attention  # noqa: F821
     ) -> torch.Tensor:
         if c is not None:
             return self.processor(self, x, c=c, mask=mask, rope=rope, c_rope=c_rope)
         else:
-            return self.processor(self, x, mask=mask, rope=rope)
+            return self.processor(self, x, mask=mask, rope=rope, prompt_lens=prompt_lens)
 
 
 # Attention processor
 
 
 class AttnProcessor:
-    def __init__(self):
-        pass
+    def __init__(self, window_size: int | None = None):
+        # window_size: each frame attends to frames within window_size of it, plus the reference prompt
+        # (prompt_lens frames at the start of each item); None is full attention.
+        # the windowed path goes over query blocks of window_size, so memory is O(n * (prompt + 3 * window))
+        self.window_size = window_size
 
     def __call__(
         self,
@@ -402,6 +422,7 @@ class AttnProcessor:
         x: float["b n d"],  # noised input x  # noqa: F722
         mask: bool["b n"] | None = None,  # noqa: F722
         rope=None,  # rotary position embedding
+        prompt_lens: int["b"] | None = None,  # noqa: F821
     ) -> torch.FloatTensor:
         batch_size = x.shape[0]
 
@@ -425,15 +446,13 @@ class AttnProcessor:
         key = key.view(batch_size, -1, attn.heads, head_dim).transpose(1, 2)
         value = value.view(batch_size, -1, attn.heads, head_dim).transpose(1, 2)
 
-        # mask. e.g. inference got a batch with different target durations, mask out the padding
-        if mask is not None:
-            attn_mask = mask
-            attn_mask = attn_mask.unsqueeze(1).unsqueeze(1)  # 'b n -> b 1 1 n'
-            attn_mask = attn_mask.expand(batch_size, attn.heads, query.shape[-2], key.shape[-2])
+        if self.window_size is not None and query.shape[-2] > self.window_size:
+            x = self.windowed_attention(query, key, value, mask, prompt_lens)
         else:
-            attn_mask = None
-
-        x = F.scaled_dot_product_attention(query, key, value, attn_mask=attn_mask, dropout_p=0.0, is_causal=False)
+            # mask. e.g. inference got a batch with different target durations, mask out the padding
+            # key padding form 'b n -> b 1 1 n', broadcast by sdpa instead of expanded to b h n n
+            attn_mask = mask[:, None, None, :] if mask is not None else None
+            x = F.scaled_dot_product_attention(query, key, value, attn_mask=attn_mask, dropout_p=0.0, is_causal=False)
         x = x.transpose(1, 2).reshape(batch_size, -1, attn.heads * head_dim)
         x = x.to(query.dtype)
 
@@ -448,6 +467,41 @@ class AttnProcessor:
 
         return x
 
+    def windowed_attention(self, query, key, value, mask=None, prompt_lens=None):
+        """
+        Local attention over query blocks of window_size: a block sees the keys within window_size of it and the
+        prompt keys, masked per item to the window, its own prompt and its padding. q k v: b h n d.
+        """
+        window, seq_len = self.window_size, query.shape[-2]
+        positions = torch.arange(seq_len, device=query.device)
+        max_prompt = int(prompt_lens.max()) if prompt_lens is not None else 0
+
+        out = torch.empty_like(query)
+        for start in range(0, seq_len, window):
+            end = min(start + window, seq_len)
+            key_start, key_end = max(start - window, 0), min(end + window, seq_len)
+            # local span plus the prompt keys before and after it
+            spans = [(0, min(max_prompt, key_start)), (key_start, key_end), (key_end, max(max_prompt, key_end))]
+            spans = [(lo, hi) for lo, hi in spans if hi > lo]
+
+            key_pos = torch.cat([positions[lo:hi] for lo, hi in spans])
+            block_key = torch.cat([key[:, :, lo:hi] for lo, hi in spans], dim=2)
+            block_value = torch.cat([value[:, :, lo:hi] for lo, hi in spans], dim=2)
+
+            attn_mask = (positions[start:end, None] - key_pos[None, :]).abs() <= window  # n_block k_block
+            if prompt_lens is not None:
+                attn_mask = attn_mask | (key_pos[None, None, :] < prompt_lens[:, None, None])  # b n_block k_block
+            if mask is not None:
+                # padded queries keep their window, their output is zeroed after the projection anyway
+                attn_mask = attn_mask & (mask[:, None, key_pos] | ~mask[:, start:end, None])
+            if attn_mask.ndim == 3:
+                attn_mask = attn_mask.unsqueeze(1)  # 'b n k -> b 1 n k'
+
+            out[:, :, start:end] = F.scaled_dot_product_attention(
+                query[:, :, start:end], block_key, block_value, attn_mask=attn_mask, dropout_p=0.0, is_causal=False
+            )
+        return out
+
 
 # Joint Attention processor for MM-DiT
 # modified from diffusers/src/diffusers/models/attention_processor.py
@@ -540,12 +594,12 @@ class JointAttnProcessor:
 
 
 class DiTBlock(nn.Module):
-    def __init__(self, dim, heads, dim_head, ff_mult=4, dropout=0.1):
+    def __init__(self, dim, heads, dim_head, ff_mult=4, dropout=0.1, attn_window_size=None):
         super().__init__()
 
         self.attn_norm = AdaLayerNormZero(dim)
         self.attn = Attention(
-            processor=AttnProcessor(),
+            processor=AttnProcessor(window_size=attn_window_size),
             dim=dim,
             heads=heads,
             dim_head=dim_head,
@@ -555,12 +609,12 @@ class DiTBlock(nn.Module):
         self.ff_norm = nn.LayerNorm(dim, elementwise_affine=False, eps=1e-6)
         self.ff = FeedForward(dim=dim, mult=ff_mult, dropout=dropout, approximate="tanh")
 
-    def forward(self, x, t, mask=None, rope=None):  # x: noised input, t: time embedding
+    def forward(self, x, t, mask=None, rope=None, prompt_lens=None):  # x: noised input, t: time embedding
         # pre-norm & modulation for attention input
         norm, gate_msa, shift_mlp, scale_mlp, gate_mlp = self.attn_norm(x, emb=t)
 
         # attention
-        attn_output = self.attn(x=norm, mask=mask, rope=rope)
+        attn_output = self.attn(x=norm, mask=mask, rope=rope, prompt_lens=prompt_lens)
 
         # process attention output for input x
         x = x + gate_msa.unsqueeze(1) * attn_output
@@ -249,7 +249,7 @@ class Trainer:
 
     def train(self, train_dataset: Dataset, num_workers=16, resumable_with_seed: int = None):
         if self.log_samples:
-            from ..infer.utils_infer import cfg_strength, load_vocoder, nfe_step, sway_sampling_coef
+            from ..infer.utils_infer import cfg_strength, load_vocoder, nfe_step, sway_sampling_coef, vocode_mel_batch
 
             vocoder = load_vocoder(
                 vocoder_name=self.vocoder_name, is_local=self.is_local_vocoder, local_path=self.local_vocoder_path
@@ -402,14 +402,13 @@ class Trainer:
                                 sway_sampling_coef=sway_sampling_coef,
                             )
                             generated = generated.to(torch.float32)
-                            gen_mel_spec = generated[:, ref_audio_len:, :].permute(0, 2, 1).to(self.accelerator.device)
-                            ref_mel_spec = batch["mel"][0].unsqueeze(0)
-                            if self.vocoder_name == "vocos":
-                                gen_audio = vocoder.decode(gen_mel_spec).cpu()
-                                ref_audio = vocoder.decode(ref_mel_spec).cpu()
-                            elif self.vocoder_name == "bigvgan":
-                                gen_audio = vocoder(gen_mel_spec).squeeze(0).cpu()
-                                ref_audio = vocoder(ref_mel_spec).squeeze(0).cpu()
+                            gen_mel_spec = generated[0, ref_audio_len:, :].T.to(self.accelerator.device)
+                            ref_mel_spec = batch["mel"][0]
+                            # generated and reference vocoded in one batch
+                            gen_audio, ref_audio = (
+                                wave.unsqueeze(0).cpu()
+                                for wave in vocode_mel_batch([gen_mel_spec, ref_mel_spec], vocoder, self.vocoder_name)
+                            )
 
                         torchaudio.save(
                             f"{log_samples_path}/update_{global_update}_gen.wav", gen_audio, target_sample_rate
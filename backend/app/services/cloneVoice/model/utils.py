@@ -2,15 +2,14 @@ from __future__ import annotations
 
 import os
 import random
+import re
+import threading
 from collections import defaultdict
 from importlib.resources import files
 
 import torch
 from torch.nn.utils.rnn import pad_sequence
 
-import jieba
-from pypinyin import lazy_pinyin, Style
-
 
 # seed everything
 
@@ -90,9 +89,14 @@ def list_str_to_idx(
     vocab_char_map: dict[str, int],  # {char: idx}
     padding_value=-1,
 ) -> int["b nt"]:  # noqa: F722
-    list_idx_tensors = [torch.tensor([vocab_char_map.get(c, 0) for c in t]) for t in text]  # pinyin or char style
-    text = pad_sequence(list_idx_tensors, padding_value=padding_value, batch_first=True)
-    return text
+    # pinyin or char style, ids written straight into the padded (b, nt) tensor
+    lens = torch.tensor([len(t) for t in text], dtype=torch.long)
+    idx = torch.full((len(text), int(lens.max()) if len(text) else 0), padding_value, dtype=torch.long)
+    get = vocab_char_map.get
+    idx[torch.arange(idx.shape[1])[None, :] < lens[:, None]] = torch.tensor(
+        [get(c, 0) for t in text for c in t], dtype=torch.long
+    )
+    return idx
 
 
 # Get tokenizer
@@ -133,8 +137,88 @@ def get_tokenizer(dataset_name, tokenizer: str = "pinyin"):
 
 # convert char to pinyin
 
-jieba.initialize()
-print("Word segmentation module jieba initialized.\n")
+# jieba (~1-2s and a few hundred MB to build its prefix dict) and pypinyin only load when a text has han characters;
+# latin-script text (vietnamese, english) takes the fast path below with the same output as the jieba path
+
+_jieba_lock = threading.Lock()
+_jieba_ready = False
+
+_CUSTOM_TRANS = str.maketrans({";": ",", "“": '"', "”": '"', "‘": "'", "’": "'"})  # add custom trans here, to address oov
+_HAN_RE = re.compile("[\u2e80-\u9fff\uf900-\ufaff\U00020000-\U0002ffff]")  # anything jieba/pypinyin may convert
+# how jieba.cut splits text without han characters: runs of jieba.re_han_default (minus han), split again by
+# jieba.finalseg.re_skip, every other character alone; the only latin words in its dictionary are handled by jieba
+_LATIN_BLOCK_RE = re.compile(r"([a-zA-Z0-9+#&\._%\-]+)")
+_LATIN_WORD_RE = re.compile(r"([a-zA-Z0-9]+(?:\.\d+)?%?)")
+_JIEBA_LATIN_WORDS_RE = re.compile(r"AT&T|[cC](?:#|\+\+)")
+
+
+def _init_jieba():
+    global _jieba_ready
+    with _jieba_lock:
+        if not _jieba_ready:
+            import jieba
+
+            jieba.initialize()
+            print("Word segmentation module jieba initialized.\n")
+            _jieba_ready = True
+
+
+def is_chinese(c):
+    return "\u3100" <= c <= "\u9fff"  # common chinese characters
+
+
+def _convert_jieba(text, polyphone=True):
+    import jieba
+    from pypinyin import Style, lazy_pinyin
+
+    _init_jieba()
+    char_list = []
+    for seg in jieba.cut(text):
+        seg_byte_len = len(bytes(seg, "UTF-8"))
+        if seg_byte_len == len(seg):  # if pure alphabets and symbols
+            if char_list and seg_byte_len > 1 and char_list[-1] not in " :'\"":
+                char_list.append(" ")
+            char_list.extend(seg)
+        elif polyphone and seg_byte_len == 3 * len(seg):  # if pure east asian characters
+            seg_ = lazy_pinyin(seg, style=Style.TONE3, tone_sandhi=True)
+            for i, c in enumerate(seg):
+                if is_chinese(c):
+                    char_list.append(" ")
+                char_list.append(seg_[i])
+        else:  # if mixed characters, alphabets and symbols
+            for c in seg:
+                if ord(c) < 256:
+                    char_list.extend(c)
+                elif is_chinese(c):
+                    char_list.append(" ")
+                    char_list.extend(lazy_pinyin(c, style=Style.TONE3, tone_sandhi=True))
+                else:
+                    char_list.append(c)
+    return char_list
+
+
+def _convert_latin(text):
+    # non-ascii characters come out of jieba one by one and are kept as is; a multi-char ascii segment gets a
+    # space in front unless it follows " :'\"" (e.g. "Tiếng" -> "Tiế ng"), the model was trained on that
+    char_list = []
+    for i, part in enumerate(_LATIN_BLOCK_RE.split(text)):
+        if not part:
+            continue
+        if i % 2 == 0:  # outside latin blocks: single characters, "\r\n" is one segment
+            segs = part.split("\r\n") if "\r\n" in part else (part,)
+            for j, seg in enumerate(segs):
+                if j:
+                    if char_list and char_list[-1] not in " :'\"":
+                        char_list.append(" ")
+                    char_list.extend("\r\n")
+                char_list.extend(seg)
+            continue
+        for seg in _LATIN_WORD_RE.split(part) if len(part) > 1 else (part,):
+            if len(seg) > 1 and char_list and char_list[-1] not in " :'\"":
+                char_list.append(" ")
+            char_list.extend(seg)
+    return char_list
+
 
 # def convert_char_to_pinyin(text_list, polyphone=True):
 #     final_text_list = []
@@ -148,45 +232,23 @@ print("Word segmentation module jieba initialized.\n")
 #     final_text_list = [char for char in text_list if char not in "。，、；：？！《》【】—…:;?!\"()[]{}"]
 #     return final_text_list
 
-def convert_char_to_pinyin(text_list, polyphone=True):
+def convert_char_to_pinyin(text_list, polyphone=True, frontend="auto"):
+    """
+    frontend    - "auto" fast path for texts without han characters, jieba + pypinyin for the others
+                - "jieba" jieba + pypinyin for every text
+    """
+    if frontend not in ("auto", "jieba"):
+        raise ValueError(f"Unknown text frontend: {frontend}, expected 'auto' or 'jieba'")
     final_text_list = []
-    custom_trans = str.maketrans(
-        {";": ",", "“": '"', "”": '"', "‘": "'", "’": "'"}
-    )  # add custom trans here, to address oov
-
-    def is_chinese(c):
-        return (
-            "\u3100" <= c <= "\u9fff"  # common chinese characters
-        )
-
     for text in text_list:
-        char_list = []
-        text = text.translate(custom_trans)
-        for seg in jieba.cut(text):
-            seg_byte_len = len(bytes(seg, "UTF-8"))
-            if seg_byte_len == len(seg):  # if pure alphabets and symbols
-                if char_list and seg_byte_len > 1 and char_list[-1] not in " :'\"":
-                    char_list.append(" ")
-                char_list.extend(seg)
-            elif polyphone and seg_byte_len == 3 * len(seg):  # if pure east asian characters
-                seg_ = lazy_pinyin(seg, style=Style.TONE3, tone_sandhi=True)
-                for i, c in enumerate(seg):
-                    if is_chinese(c):
-                        char_list.append(" ")
-                    char_list.append(seg_[i])
-            else:  # if mixed characters, alphabets and symbols
-                for c in seg:
-                    if ord(c) < 256:
-                        char_list.extend(c)
-                    elif is_chinese(c):
-                        char_list.append(" ")
-                        char_list.extend(lazy_pinyin(c, style=Style.TONE3, tone_sandhi=True))
-                    else:
-                        char_list.append(c)
-        final_text_list.append(char_list)
-    # print(final_text_list)
+        text = text.translate(_CUSTOM_TRANS)
+        if frontend == "auto" and not _HAN_RE.search(text) and not _JIEBA_LATIN_WORDS_RE.search(text):
+            final_text_list.append(_convert_latin(text))
+        else:
+            final_text_list.append(_convert_jieba(text, polyphone=polyphone))
     return final_text_list
 
+
 # filter func for dirty data with many repetitions
 
 def repetition_found(text, length=2, tolerance=10):
@@ -0,0 +1,90 @@
+"""
+Accuracy and speed of the CPU inference modes against fp32.
+Generates the same text with the same seed in fp32 and in the given mode, compares the mels and
+reports the real-time factor (inference time / audio duration) of both.
+
+python scripts/check_cpu_quantization.py --ckpt_file model.pt --vocab_file vocab.txt \
+    --ref_audio ref.wav --ref_text "..." --gen_text "..." --cpu_mode int8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+import numpy as np
+import torch
+
+from infer.utils_infer import (
+    CPU_MODES,
+    build_chunk_requests,
+    get_voice_prompt,
+    load_model,
+    load_vocoder,
+    sample_chunk_batch,
+    split_gen_text,
+    target_sample_rate,
+)
+from model import DiT
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--ckpt_file", required=True)
+parser.add_argument("--vocab_file", default="")
+parser.add_argument("--ref_audio", required=True)
+parser.add_argument("--ref_text", default="")
+parser.add_argument("--gen_text", required=True)
+parser.add_argument("--cpu_mode", default="int8", choices=[m for m in CPU_MODES if m != "fp32"])
+parser.add_argument("--cpu_threads", default=0, type=int, help="0 = all available cores")
+parser.add_argument("--quant_cache_dir", default=None)
+parser.add_argument("--nfe_step", default=32, type=int)
+parser.add_argument("--seed", default=0, type=int)
+parser.add_argument("--runs", default=3, type=int, help="Timed runs per mode, after one warm-up")
+args = parser.parse_args()
+
+model_cfg = dict(dim=1024, depth=22, heads=16, ff_mult=2, text_dim=512, conv_layers=4)
+
+
+def run(cpu_mode):
+    model = load_model(
+        DiT,
+        model_cfg,
+        args.ckpt_file,
+        vocab_file=args.vocab_file,
+        device="cpu",
+        cpu_mode=cpu_mode,
+        cpu_threads=args.cpu_threads,
+        quant_cache_dir=args.quant_cache_dir,
+    )
+    vocoder = load_vocoder(device="cpu", cpu_mode=cpu_mode)
+
+    voice_prompt = get_voice_prompt(args.ref_audio, args.ref_text, model_obj=model, device="cpu")
+    gen_text_batches = split_gen_text(
+        voice_prompt.audio.shape[-1] / target_sample_rate, voice_prompt.ref_text, args.gen_text
+    )
+    chunks = build_chunk_requests(voice_prompt, voice_prompt.ref_text, gen_text_batches, device="cpu", seed=args.seed)
+
+    times = []
+    for i in range(args.runs + 1):
+        start = time.time()
+        results = sample_chunk_batch(chunks, model, vocoder, nfe_step=args.nfe_step, return_mel=True)
+        if i > 0:  # first run is warm-up
+            times.append(time.time() - start)
+
+    audio_duration = sum(len(wave) for wave, _ in results) / target_sample_rate
+    return [mel for _, mel in results], np.mean(times) / audio_duration
+
+
+print(f"torch threads: {torch.get_num_threads()}")
+ref_mels, ref_rtf = run("fp32")
+mels, rtf = run(args.cpu_mode)
+
+diff = np.concatenate([(m - r).ravel() for m, r in zip(mels, ref_mels)])
+ref = np.concatenate([r.ravel() for r in ref_mels])
+print(f"mel mean abs error : {np.abs(diff).mean():.4f}")
+print(f"mel max abs error  : {np.abs(diff).max():.4f}")
+print(f"mel relative L2    : {np.linalg.norm(diff) / np.linalg.norm(ref):.4f}")
+print(f"RTF fp32           : {ref_rtf:.3f}")
+print(f"RTF {args.cpu_mode:<15}: {rtf:.3f} ({ref_rtf / rtf:.2f}x)")
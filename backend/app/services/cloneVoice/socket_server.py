@@ -1,19 +1,47 @@
 import argparse
+import asyncio
 import gc
-import socket
+import json
 import struct
-import torch
-import torchaudio
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from importlib.resources import files
-from threading import Thread
 
+import numpy as np
+import torch
+import websockets
 from cached_path import cached_path
 
-from infer.utils_infer import infer_batch_process, preprocess_ref_audio_text, load_vocoder, load_model
+from infer.utils_infer import (
+    CrossFadeStream,
+    build_chunk_requests,
+    get_voice_prompt,
+    load_model,
+    load_vocoder,
+    sample_chunk_batch,
+    split_gen_text,
+)
 from model.backbones.dit import DiT
 
 
+# Server -> client messages are binary frames: 1-byte kind, 4-byte little-endian payload length, payload.
+# AUDIO payload is float32 mono PCM, END payload is a JSON summary, ERROR payload is a UTF-8 message.
+MSG_AUDIO = 0
+MSG_END = 1
+MSG_ERROR = 2
+FRAME_HEADER = struct.Struct("<BI")
+
+
+def pack_frame(kind, payload):
+    return FRAME_HEADER.pack(kind, len(payload)) + payload
+
+
+def pack_audio(wave):
+    # ndarray.tobytes() is a single memcpy, no per-sample Python objects
+    return pack_frame(MSG_AUDIO, np.ascontiguousarray(wave, dtype=np.float32).tobytes())
+
+
 class TTSStreamingProcessor:
     def __init__(self, ckpt_file, vocab_file, ref_audio, ref_text, device=None, dtype=torch.float32):
         self.device = device or (
@@ -44,9 +72,8 @@ class TTSStreamingProcessor:
         # Set sampling rate for streaming
         self.sampling_rate = 24000  # Consistency with client
 
-        # Set reference audio and text
-        self.ref_audio = ref_audio
-        self.ref_text = ref_text
+        # Preprocess the reference once (clip, normalize, transcribe, mel) and reuse it for every message
+        self.voice_prompt = get_voice_prompt(ref_audio, ref_text, model_obj=self.model, device=self.device)
 
         # Warm up the model
         self._warm_up()
@@ -54,102 +81,158 @@ class TTSStreamingProcessor:
     def _warm_up(self):
         """Warm up the model with a dummy input to ensure it's ready for real-time processing."""
         print("Warming up the model...")
-        ref_audio, ref_text = preprocess_ref_audio_text(self.ref_audio, self.ref_text)
-        audio, sr = torchaudio.load(ref_audio)
-        gen_text = "Warm-up text for the model."
-
-        # Pass the vocoder as an argument here
-        infer_batch_process((audio, sr), ref_text, [gen_text], self.model, self.vocoder, device=self.device)
+        self.sample(self.prepare("Warm-up text for the model.")[:1])
         print("Warm-up completed.")
 
-    def generate_stream(self, text, play_steps_in_s=0.5):
-        """Generate audio in chunks and yield them in real-time."""
-        # Preprocess the reference audio and text
-        ref_audio, ref_text = preprocess_ref_audio_text(self.ref_audio, self.ref_text)
-
-        # Load reference audio
-        audio, sr = torchaudio.load(ref_audio)
-
-        # Run inference for the input text
-        audio_chunk, final_sample_rate, _ = infer_batch_process(
-            (audio, sr),
-            ref_text,
-            [text],
-            self.model,
-            self.vocoder,
-            device=self.device,  # Pass vocoder here
+    def prepare(self, text):
+        """Split text into chunk requests conditioned on the cached reference."""
+        gen_text_batches = split_gen_text(
+            self.voice_prompt.audio.shape[-1] / self.sampling_rate, self.voice_prompt.ref_text, text
         )
-
-        # Break the generated audio into chunks and send them
-        chunk_size = int(final_sample_rate * play_steps_in_s)
-
-        if len(audio_chunk) < chunk_size:
-            packed_audio = struct.pack(f"{len(audio_chunk)}f", *audio_chunk)
-            yield packed_audio
-            return
-
-        for i in range(0, len(audio_chunk), chunk_size):
-            chunk = audio_chunk[i : i + chunk_size]
-
-            # Check if it's the final chunk
-            if i + chunk_size >= len(audio_chunk):
-                chunk = audio_chunk[i:]
-
-            # Send the chunk if it is not empty
-            if len(chunk) > 0:
-                packed_audio = struct.pack(f"{len(chunk)}f", *chunk)
-                yield packed_audio
-
-
-def handle_client(client_socket, processor):
-    try:
+        return build_chunk_requests(self.voice_prompt, self.voice_prompt.ref_text, gen_text_batches, device=self.device)
+
+    def sample(self, chunks):
+        """Generate the given chunks (possibly from different clients) in one batched call. Returns waves."""
+        return [wave for wave, _ in sample_chunk_batch(chunks, self.model, self.vocoder)]
+
+    def generate_stream(self, text):
+        """Generate audio chunk by chunk and yield packed audio frames as soon as each chunk is vocoded."""
+        cross_fade = CrossFadeStream(sample_rate=self.sampling_rate)
+        for chunk in self.prepare(text):
+            wave = cross_fade.push(self.sample([chunk])[0])
+            if len(wave) > 0:
+                yield pack_audio(wave)
+        yield pack_audio(cross_fade.flush())
+
+
+class _StreamJob:
+    """One utterance requested by a client, advanced one chunk per scheduling round."""
+
+    def __init__(self, chunks, sampling_rate):
+        self.chunks = chunks
+        self.next_index = 0
+        self.cross_fade = CrossFadeStream(sample_rate=sampling_rate)
+        self.frames = asyncio.Queue()
+        self.cancelled = False
+        self.samples = 0
+        self.started_at = time.time()
+        self.first_chunk_at = None
+
+
+class StreamingTTSServer:
+    """
+    Asyncio WebSocket server: every connection shares one model and one inference queue.
+    A single inference thread takes the next chunk of up to max_batch_size active utterances,
+    samples them in one batched call and streams each result back to its client.
+    """
+
+    def __init__(self, processor, max_batch_size=4, max_wait_ms=10):
+        self.processor = processor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue()
+        # the model is only ever touched from this one thread
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-inference")
+
+    async def handle_client(self, websocket, path=None):
+        print(f"Accepted connection from {websocket.remote_address}")
+        loop = asyncio.get_running_loop()
+        try:
+            async for message in websocket:
+                # Client sends plain text or {"text": ...} per utterance
+                if isinstance(message, bytes):
+                    message = message.decode("utf-8")
+                text = message.strip()
+                if text.startswith("{"):
+                    text = json.loads(text).get("text", "").strip()
+                if not text:
+                    continue
+
+                job = _StreamJob(
+                    await loop.run_in_executor(None, self.processor.prepare, text), self.processor.sampling_rate
+                )
+                if job.chunks:
+                    await self.queue.put(job)
+                else:
+                    job.frames.put_nowait(pack_frame(MSG_END, b"{}"))
+                try:
+                    while True:
+                        frame = await job.frames.get()
+                        await websocket.send(frame)
+                        if frame[0] != MSG_AUDIO:
+                            break
+                finally:
+                    job.cancelled = True
+        except websockets.ConnectionClosed:
+            pass
+        except Exception as e:
+            print(f"Error handling client: {e}")
+            traceback.print_exc()
+
+    async def _inference_loop(self):
+        loop = asyncio.get_running_loop()
+        active = []
         while True:
-            # Receive data from the client
-            data = client_socket.recv(1024).decode("utf-8")
-            if not data:
-                break
-
+            if not active:
+                active.append(await self.queue.get())
+                # short window so utterances arriving together share the first batch
+                await asyncio.sleep(self.max_wait)
+            while not self.queue.empty():
+                active.append(self.queue.get_nowait())
+
+            active = [job for job in active if not job.cancelled]
+            if not active:
+                continue
+
+            batch = active[: self.max_batch_size]
+            chunks = [job.chunks[job.next_index] for job in batch]
             try:
-                # The client sends the text input
-                text = data.strip()
-
-                # Generate and stream audio chunks
-                for audio_chunk in processor.generate_stream(text):
-                    client_socket.sendall(audio_chunk)
-
-                # Send end-of-audio signal
-                client_socket.sendall(b"END_OF_AUDIO")
-
-            except Exception as inner_e:
-                print(f"Error during processing: {inner_e}")
-                traceback.print_exc()  # Print the full traceback to diagnose the issue
-                break
-
-    except Exception as e:
-        print(f"Error handling client: {e}")
-        traceback.print_exc()
-    finally:
-        client_socket.close()
-
-
-def start_server(host, port, processor):
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind((host, port))
-    server.listen(5)
-    print(f"Server listening on {host}:{port}")
-
-    while True:
-        client_socket, addr = server.accept()
-        print(f"Accepted connection from {addr}")
-        client_handler = Thread(target=handle_client, args=(client_socket, processor))
-        client_handler.start()
+                waves = await loop.run_in_executor(self.executor, self.processor.sample, chunks)
+            except Exception as e:
+                print(f"Error during processing: {e}")
+                traceback.print_exc()
+                for job in batch:
+                    job.frames.put_nowait(pack_frame(MSG_ERROR, str(e).encode("utf-8")))
+                active = active[len(batch) :]
+                continue
+
+            finished = []
+            for job, wave in zip(batch, waves):
+                job.next_index += 1
+                if job.first_chunk_at is None:
+                    job.first_chunk_at = time.time()
+                wave = job.cross_fade.push(wave)
+                if job.next_index == len(job.chunks):
+                    wave = np.concatenate([wave, job.cross_fade.flush()])
+                    finished.append(job)
+                job.samples += len(wave)
+                if len(wave) > 0:
+                    job.frames.put_nowait(pack_audio(wave))
+
+            for job in finished:
+                summary = {
+                    "audio_length": job.samples / self.processor.sampling_rate,
+                    "first_chunk_time": job.first_chunk_at - job.started_at,
+                    "total_time": time.time() - job.started_at,
+                }
+                job.frames.put_nowait(pack_frame(MSG_END, json.dumps(summary).encode("utf-8")))
+
+            # round-robin: utterances that were not in this batch go first next round
+            served = [job for job in batch if job not in finished]
+            active = active[len(batch) :] + served
+
+    async def serve(self, host, port):
+        inference_task = asyncio.create_task(self._inference_loop())
+        async with websockets.serve(self.handle_client, host, port, max_size=2**20):
+            print(f"Server listening on ws://{host}:{port}")
+            await inference_task
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
     parser.add_argument("--host", default="0.0.0.0")
-    parser.add_argument("--port", default=9998)
+    parser.add_argument("--port", default=9998, type=int)
 
     parser.add_argument(
         "--ckpt_file",
@@ -175,6 +258,7 @@ if __name__ == "__main__":
 
     parser.add_argument("--device", default=None, help="Device to run the model on")
     parser.add_argument("--dtype", default=torch.float32, help="Data type to use for model inference")
+    parser.add_argument("--max_batch_size", default=4, type=int, help="Max utterances sampled together")
 
     args = parser.parse_args()
 
@@ -190,7 +274,8 @@ if __name__ == "__main__":
         )
 
         # Start the server
-        start_server(args.host, args.port, processor)
+        server = StreamingTTSServer(processor, max_batch_size=args.max_batch_size)
+        asyncio.run(server.serve(args.host, args.port))
 
     except KeyboardInterrupt:
         gc.collect()
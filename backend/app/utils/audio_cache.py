@@ -0,0 +1,266 @@
+# backend/app/utils/audio_cache.py
+
+"""
+Audio cache hai tầng cho TTS
+- Tầng memory: LRU giới hạn theo tổng số byte
+- Tầng disk: file FLAC (nén lossless) theo key, giới hạn dung lượng, xóa file ít dùng nhất.
+  FLAC giữ đúng subtype PCM_16/PCM_24 của WAV gốc nên disk hit trả về đúng bytes như memory hit;
+  WAV subtype khác (float, PCM_32, ...) FLAC không biểu diễn được thì lưu nguyên file WAV
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Subtype WAV -> dtype đọc ra khi chuyển qua lại FLAC (đọc int đúng bit depth thì không làm tròn)
+_FLAC_SUBTYPES = {"PCM_16": "int16", "PCM_24": "int32"}
+_DISK_SUFFIXES = (".flac", ".wav")
+
+
+def normalize_text(text: str) -> str:
+    """Chuẩn hóa text cho cache key (NFC + gộp khoảng trắng)"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def make_audio_cache_key(
+    text: str,
+    voice_hash: str,
+    model_checksum: str,
+    speed: float = 1.0,
+    nfe_step: int = 32,
+    cfg_strength: float = 2.0,
+    seed: Optional[int] = None,
+    sway_sampling_coef: Optional[float] = None,
+    sampler: Optional[str] = None,
+    adaptive_tol: Optional[float] = None
+) -> str:
+    """Key của một audio đã synthesize: (text chuẩn hóa, voice, model, tham số sinh)"""
+    payload = json.dumps(
+        [normalize_text(text), voice_hash, model_checksum, round(float(speed), 4), int(nfe_step),
+         round(float(cfg_strength), 4), seed,
+         None if sway_sampling_coef is None else round(float(sway_sampling_coef), 4), sampler,
+         None if adaptive_tol is None else round(float(adaptive_tol), 6)],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """Cache WAV bytes: memory LRU theo byte + disk FLAC theo dung lượng"""
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        cache_dir: Optional[Path] = None,
+        max_disk_bytes: int = 1024 * 1024 * 1024
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        # key -> (kích thước, file) trên disk, theo thứ tự truy cập (cũ nhất trước)
+        self._disk: "OrderedDict[str, Tuple[int, Path]]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0
+        }
+
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._scan_disk()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        Lấy audio theo key
+        Returns: (wav_bytes, tier) với tier là "memory"/"disk", hoặc (None, None) nếu miss
+        """
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return audio, "memory"
+            on_disk = key in self._disk
+
+        if on_disk:
+            audio = self._read_disk(key)
+            if audio is not None:
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self._put_memory(key, audio)
+                return audio, "disk"
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None, None
+
+    def put(self, key: str, audio: bytes):
+        """Lưu audio (WAV bytes) vào cả hai tầng"""
+        with self._lock:
+            self._put_memory(key, audio)
+            on_disk = key in self._disk
+        if self.cache_dir and not on_disk:
+            self._write_disk(key, audio)
+
+    def clear(self, include_disk: bool = True):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            disk_paths = [path for _, path in self._disk.values()] if include_disk else []
+            if include_disk:
+                self._disk.clear()
+                self._disk_bytes = 0
+        for path in disk_paths:
+            path.unlink(missing_ok=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes if self.cache_dir else 0
+            })
+        return stats
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._memory)
+
+    # ------------------------------------------------------------------
+    # Memory tier
+    # ------------------------------------------------------------------
+
+    def _put_memory(self, key: str, audio: bytes):
+        """Gọi khi đã giữ lock"""
+        if len(audio) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._stats["memory_evictions"] += 1
+
+    # ------------------------------------------------------------------
+    # Disk tier
+    # ------------------------------------------------------------------
+
+    def _disk_path(self, key: str, suffix: str = ".flac") -> Path:
+        return self.cache_dir / key[:2] / f"{key}{suffix}"
+
+    def _scan_disk(self):
+        """Nạp index file đã có trên disk (theo mtime, cũ nhất trước)"""
+        entries = []
+        for path in self.cache_dir.glob("*/*"):
+            if path.suffix not in _DISK_SUFFIXES:
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size, path))
+        for _, key, size, path in sorted(entries):
+            self._disk[key] = (size, path)
+            self._disk_bytes += size
+        for path in self._evict_disk():
+            path.unlink(missing_ok=True)
+        if entries:
+            logger.info(f"📀 Audio disk cache: {len(self._disk)} entries, {self._disk_bytes / 1024 / 1024:.1f} MB")
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        import soundfile as sf
+
+        with self._lock:
+            entry = self._disk.get(key)
+        if entry is None:
+            return None
+        path = entry[1]
+        try:
+            if path.suffix == ".wav":
+                audio = path.read_bytes()
+            else:
+                subtype = sf.info(str(path)).subtype
+                data, sample_rate = sf.read(str(path), dtype=_FLAC_SUBTYPES[subtype])
+                buffer = io.BytesIO()
+                sf.write(buffer, data, sample_rate, format="WAV", subtype=subtype)
+                audio = buffer.getvalue()
+            os.utime(path)  # đánh dấu vừa dùng, giữ thứ tự LRU qua restart
+        except Exception as e:
+            logger.warning(f"Failed to read cached audio {path.name}: {e}")
+            with self._lock:
+                entry = self._disk.pop(key, None)
+                if entry is not None:
+                    self._disk_bytes -= entry[0]
+            return None
+        return audio
+
+    def _write_disk(self, key: str, audio: bytes):
+        import soundfile as sf
+
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            subtype = sf.info(io.BytesIO(audio)).subtype
+            if subtype in _FLAC_SUBTYPES:
+                data, sample_rate = sf.read(io.BytesIO(audio), dtype=_FLAC_SUBTYPES[subtype])
+                sf.write(str(tmp_path), data, sample_rate, format="FLAC", subtype=subtype)
+            else:
+                path = self._disk_path(key, ".wav")
+                tmp_path.write_bytes(audio)
+            os.replace(tmp_path, path)
+            size = path.stat().st_size
+        except Exception as e:
+            logger.warning(f"Failed to write cached audio {path.name}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            old = self._disk.pop(key, None)
+            if old is not None:
+                self._disk_bytes -= old[0]
+            self._disk[key] = (size, path)
+            self._disk_bytes += size
+            evicted = self._evict_disk()
+        for evicted_path in evicted:
+            evicted_path.unlink(missing_ok=True)
+
+    def _evict_disk(self):
+        """Bỏ các entry ít dùng nhất khi vượt dung lượng. Returns: list file cần xóa"""
+        evicted = []
+        while self._disk and self._disk_bytes > self.max_disk_bytes:
+            _, (size, path) = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self._stats["disk_evictions"] += 1
+            evicted.append(path)
+        return evicted
@@ -0,0 +1,332 @@
+# backend/app/utils/context_compression.py
+
+"""
+Context compression cho hội thoại dài
+- Tóm tắt cuộn (rolling summary) cho từng session, cập nhật nền sau mỗi turn và lưu cùng session trong store
+- Chọn lịch sử theo độ liên quan (embedding) với câu hỏi hiện tại trong ngân sách token
+"""
+
+import logging
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Hàm embedding: nhận list câu, trả về ma trận (n, d). VD: SentenceTransformer.encode
+EmbedFn = Callable[[List[str]], Any]
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?;])\s+")
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Từ phổ biến không mang nội dung, bỏ qua khi chấm điểm câu
+_STOPWORDS = {
+    "thưa", "chủ", "công", "thần", "là", "và", "của", "có", "không", "những", "các", "một",
+    "này", "đó", "để", "với", "trong", "cho", "thì", "mà", "được", "như", "khi", "cũng",
+    "đã", "sẽ", "rất", "nên", "hãy", "từ", "theo", "về", "ra", "vào", "lại", "nếu"
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Ước lượng số token (tiếng Việt ~3 ký tự/token, cùng cách tính thô với ChatAI)"""
+    return len(text) // 3 + 1
+
+
+def _split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text.replace("\n", " ")) if s.strip()]
+
+
+def _content_words(text: str) -> List[str]:
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS and len(w) > 1]
+
+
+def extract_key_sentence(text: str, max_chars: int = 200) -> str:
+    """Chọn câu mang nhiều thông tin nhất (điểm = tần suất từ nội dung trong cả đoạn)"""
+    sentences = _split_sentences(text)
+    if not sentences:
+        return ""
+    if len(sentences) == 1:
+        return sentences[0][:max_chars]
+
+    freq: Dict[str, int] = {}
+    for word in _content_words(text):
+        freq[word] = freq.get(word, 0) + 1
+
+    def score(sentence: str) -> float:
+        words = _content_words(sentence)
+        if not words:
+            return 0.0
+        return sum(freq.get(w, 0) for w in words) / (len(words) ** 0.5)
+
+    # Bỏ câu mở đầu xã giao ("Thưa chủ công, ...") nếu còn câu khác
+    candidates = sentences[1:] if sentences[0].lower().startswith("thưa chủ công") else sentences
+    return max(candidates, key=score)[:max_chars]
+
+
+class _SessionContext:
+    """Trạng thái nén ngữ cảnh của một session"""
+
+    __slots__ = ("summary_parts", "embeddings", "lock")
+
+    def __init__(self):
+        self.summary_parts: Optional[List[str]] = None  # None = chưa load từ session store
+        self.embeddings: Dict[str, np.ndarray] = {}  # turn key -> embedding
+        self.lock = threading.Lock()
+
+
+class ContextCompressor:
+    """
+    Quản lý tóm tắt cuộn và chọn lịch sử theo độ liên quan cho từng session.
+    Kích thước prompt bị chặn bởi max_summary_chars + history_token_budget,
+    không tăng theo độ dài session. Có session_store thì tóm tắt được ghi cùng session
+    (sống qua restart với backend sqlite), bộ nhớ ở đây chỉ là cache.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Optional[EmbedFn] = None,
+        chat_ai=None,
+        method: str = "extractive",
+        summary_max_tokens: int = 128,
+        max_summary_chars: int = 800,
+        history_token_budget: int = 400,
+        max_sessions: int = 1000,
+        session_store=None
+    ):
+        self.embed_fn = embed_fn
+        self.session_store = session_store
+        self.chat_ai = chat_ai
+        self.method = method if (method != "llm" or chat_ai is not None) else "extractive"
+        self.summary_max_tokens = summary_max_tokens
+        self.max_summary_chars = max_summary_chars
+        self.history_token_budget = history_token_budget
+        self.max_sessions = max_sessions
+
+        self._sessions: "OrderedDict[str, _SessionContext]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Một worker duy nhất: cập nhật tóm tắt tuần tự, không tranh tài nguyên với request chính
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="context-summary")
+
+    def _get_session(self, session_id: str) -> _SessionContext:
+        with self._lock:
+            ctx = self._sessions.get(session_id)
+            if ctx is None:
+                ctx = _SessionContext()
+                self._sessions[session_id] = ctx
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            return ctx
+
+    # ------------------------------------------------------------------
+    # Rolling summary
+    # ------------------------------------------------------------------
+
+    def _load_parts(self, session_id: str, ctx: _SessionContext) -> List[str]:
+        """Các phần tóm tắt của session, load từ session store lần đầu (gọi khi đang giữ ctx.lock)"""
+        if ctx.summary_parts is None:
+            stored = self.session_store.get_summary(session_id) if self.session_store is not None else ""
+            ctx.summary_parts = stored.split("\n") if stored else []
+        return ctx.summary_parts
+
+    def _save_parts(self, session_id: str, ctx: _SessionContext, created_at: Optional[float] = None):
+        """
+        Ghi tóm tắt vào session store (gọi khi đang giữ ctx.lock); mỗi phần một dòng
+        Store từ chối (session đã bị tạo lại sau created_at) -> bỏ cache để lần sau load lại từ store
+        """
+        if self.session_store is None:
+            return
+        if not self.session_store.set_summary(session_id, "\n".join(ctx.summary_parts), created_at=created_at):
+            ctx.summary_parts = None
+
+    def _created_at(self, session_id: str) -> Optional[float]:
+        if self.session_store is None:
+            return None
+        meta = self.session_store.get_meta(session_id)
+        return meta["created_at"] if meta else None
+
+    def get_summary(self, session_id: str) -> str:
+        """Lấy bản tóm tắt hiện tại của session"""
+        ctx = self._get_session(session_id)
+        with ctx.lock:
+            return " ".join(self._load_parts(session_id, ctx))
+
+    def update_async(self, session_id: str, user_message: str, assistant_message: str):
+        """
+        Cập nhật tóm tắt ở background sau mỗi turn
+        Ghi nhận phiên của session lúc xếp hàng: session bị tạo lại (start_conversation cùng id) trước khi
+        update chạy thì tóm tắt của hội thoại cũ bị bỏ, không ghi vào session mới
+        """
+        ctx = self._get_session(session_id)
+        created_at = self._created_at(session_id)
+        self._executor.submit(self._update_safe, session_id, user_message, assistant_message, ctx, created_at)
+
+    def _update_safe(self, session_id: str, user_message: str, assistant_message: str, ctx, created_at):
+        try:
+            self._update(session_id, user_message, assistant_message, ctx, created_at)
+        except Exception as e:
+            logger.warning(f"Context summary update failed for {session_id}: {e}")
+
+    def update(self, session_id: str, user_message: str, assistant_message: str):
+        """Cập nhật tóm tắt đồng bộ (incremental: chỉ xử lý turn mới)"""
+        self._update(session_id, user_message, assistant_message, self._get_session(session_id), None)
+
+    def _update(
+        self,
+        session_id: str,
+        user_message: str,
+        assistant_message: str,
+        ctx: _SessionContext,
+        created_at: Optional[float]
+    ):
+        # ctx giữ từ lúc xếp hàng: sau forget() nó không còn trong _sessions nên không ảnh hưởng session mới
+        if self.method == "llm":
+            with ctx.lock:
+                previous = " ".join(self._load_parts(session_id, ctx))
+            summary = self._summarize_with_llm(previous, user_message, assistant_message)
+            if summary:
+                with ctx.lock:
+                    ctx.summary_parts = [" ".join(summary.split())[: self.max_summary_chars]]
+                    self._save_parts(session_id, ctx, created_at)
+                return
+
+        part = self._summarize_turn_extractive(user_message, assistant_message)
+        with ctx.lock:
+            parts = self._load_parts(session_id, ctx)
+            parts.append(part)
+            # Bỏ dần các phần cũ nhất khi vượt giới hạn
+            while len(parts) > 1 and sum(len(p) + 1 for p in parts) > self.max_summary_chars:
+                parts.pop(0)
+            self._save_parts(session_id, ctx, created_at)
+
+    def _summarize_turn_extractive(self, user_message: str, assistant_message: str) -> str:
+        question = _split_sentences(user_message)
+        question = question[0][:150] if question else " ".join(user_message.split())[:150]
+        advice = extract_key_sentence(assistant_message, max_chars=200)
+        return f"Chủ công hỏi: {question} - Thần khuyên: {advice}"
+
+    def _summarize_with_llm(self, previous: str, user_message: str, assistant_message: str) -> str:
+        prompt = f"""Tóm tắt cuộc trò chuyện dưới đây bằng tiếng Việt, tối đa 3 câu, giữ lại các ý chính chủ công đã hỏi và lời khuyên đã đưa ra.
+
+Tóm tắt trước đó: {previous or "(chưa có)"}
+
+Chủ công hỏi: {user_message[:500]}
+Thần trả lời: {assistant_message[:1200]}
+
+Tóm tắt mới:"""
+        try:
+            return self.chat_ai.complete(
+                prompt,
+                max_tokens=self.summary_max_tokens,
+                temperature=0.2
+            ).strip()
+        except Exception as e:
+            logger.warning(f"LLM summarization failed, falling back to extractive: {e}")
+            return ""
+
+    # ------------------------------------------------------------------
+    # Relevance-based history selection
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _turn_key(turn: Dict[str, Any]) -> str:
+        return turn.get("timestamp") or str(hash((turn.get("user"), turn.get("assistant"))))
+
+    def _embed_turns(self, ctx: _SessionContext, turns: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Embedding các turn, chỉ tính cho turn chưa có trong cache"""
+        keys = [self._turn_key(t) for t in turns]
+        with ctx.lock:
+            missing = [i for i, k in enumerate(keys) if k not in ctx.embeddings]
+        if missing:
+            texts = [f"{turns[i]['user']} {turns[i]['assistant'][:300]}" for i in missing]
+            vectors = np.asarray(self.embed_fn(texts), dtype=np.float32)
+            with ctx.lock:
+                for i, vec in zip(missing, vectors):
+                    ctx.embeddings[keys[i]] = vec / (np.linalg.norm(vec) + 1e-8)
+                # Chỉ giữ embedding của các turn còn trong store
+                live = set(keys)
+                for stale in [k for k in ctx.embeddings if k not in live]:
+                    del ctx.embeddings[stale]
+        with ctx.lock:
+            return np.stack([ctx.embeddings[k] for k in keys])
+
+    def _lexical_scores(self, question: str, turns: List[Dict[str, Any]]) -> List[float]:
+        q_words = set(_content_words(question))
+        scores = []
+        for turn in turns:
+            t_words = set(_content_words(f"{turn['user']} {turn['assistant']}"))
+            scores.append(len(q_words & t_words) / (len(q_words) + 1e-8) if q_words else 0.0)
+        return scores
+
+    def select_history(
+        self,
+        session_id: str,
+        question: str,
+        turns: List[Dict[str, str]],
+        token_budget: Optional[int] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Chọn các turn liên quan nhất tới câu hỏi sao cho vừa ngân sách token.
+        Turn gần nhất luôn được ưu tiên; kết quả đã được nén và giữ thứ tự thời gian.
+        """
+        turns = [t for t in turns if t.get("user") and t.get("assistant")]
+        if not turns:
+            return []
+
+        budget = token_budget or self.history_token_budget
+        scores: List[float]
+        if self.embed_fn is not None:
+            try:
+                ctx = self._get_session(session_id)
+                turn_vectors = self._embed_turns(ctx, turns)
+                q_vec = np.asarray(self.embed_fn([question]), dtype=np.float32)[0]
+                q_vec = q_vec / (np.linalg.norm(q_vec) + 1e-8)
+                scores = (turn_vectors @ q_vec).tolist()
+            except Exception as e:
+                logger.warning(f"Embedding history selection failed, using lexical overlap: {e}")
+                scores = self._lexical_scores(question, turns)
+        else:
+            scores = self._lexical_scores(question, turns)
+
+        # Ưu tiên turn cuối cùng để giữ mạch hội thoại
+        scores[-1] = float("inf")
+        order = sorted(range(len(turns)), key=lambda i: scores[i], reverse=True)
+
+        # Nén từng turn: câu hỏi cắt ngắn + câu trả lời rút gọn còn câu chính
+        compressed = [
+            {"user": t["user"][:200], "assistant": extract_key_sentence(t["assistant"], max_chars=250)}
+            for t in turns
+        ]
+
+        selected = []
+        used = 0
+        for i in order:
+            cost = estimate_tokens(compressed[i]["user"]) + estimate_tokens(compressed[i]["assistant"])
+            if used + cost > budget:
+                continue
+            selected.append(i)
+            used += cost
+
+        return [compressed[i] for i in sorted(selected)]
+
+    def forget(self, session_id: str):
+        """
+        Xóa trạng thái nén của session trong bộ nhớ (tóm tắt trong store đi theo session)
+        Update đang chờ của phiên cũ vẫn chạy nhưng chỉ ghi vào ctx đã bỏ; store từ chối vì created_at khác
+        """
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "method": self.method,
+                "tracked_sessions": len(self._sessions),
+                "max_summary_chars": self.max_summary_chars,
+                "history_token_budget": self.history_token_budget
+            }
@@ -0,0 +1,130 @@
+# backend/app/utils/single_flight.py
+
+"""
+Single-flight request coalescing
+Các request giống hệt nhau (cùng key) đang chạy song song sẽ gắn vào một lần tính toán
+duy nhất và dùng chung kết quả (hoặc exception) của nó.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(value: Any) -> Any:
+    """Chuẩn hóa giá trị để các request tương đương cho ra cùng key"""
+    if isinstance(value, str):
+        return " ".join(value.strip().lower().split())
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def make_key(*parts: Any, **named: Any) -> str:
+    """Tạo key ổn định từ các thành phần request (đã chuẩn hóa)"""
+    payload = json.dumps(
+        {"parts": _normalize(list(parts)), "named": _normalize(named)},
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    """Một lần tính toán đang chạy (phía thread)"""
+
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Gộp các lời gọi trùng key đang chạy đồng thời.
+    - do(): cho code đồng bộ chạy trên nhiều thread
+    - do_async(): cho coroutine trên cùng event loop
+    """
+
+    def __init__(self, name: str = "single_flight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[str, asyncio.Future] = {}  # key -> task đang chạy
+        self._stats = {"executions": 0, "coalesced": 0}
+
+    def do(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Chạy fn nếu chưa có lời gọi cùng key, ngược lại chờ và dùng chung kết quả"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["executions"] += 1
+                leader = True
+
+        if not leader:
+            logger.info(f"🔗 [{self.name}] Attached to in-flight request {key[:12]}")
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    async def do_async(self, key: str, coro_fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Bản async của do(): coroutine chạy thành task riêng, leader và follower cùng await task đó.
+        shield: một bên bị hủy (client ngắt kết nối) không hủy lời gọi chung của các bên còn lại
+        """
+        task = self._async_calls.get(key)
+        if task is not None:
+            self._stats["coalesced"] += 1
+            logger.info(f"🔗 [{self.name}] Attached to in-flight request {key[:12]}")
+        else:
+            task = asyncio.ensure_future(coro_fn(*args, **kwargs))
+            self._async_calls[key] = task
+            self._stats["executions"] += 1
+            task.add_done_callback(lambda t: self._finish_async(key, t))
+
+        return await asyncio.shield(task)
+
+    def _finish_async(self, key: str, task: "asyncio.Future"):
+        if self._async_calls.get(key) is task:
+            del self._async_calls[key]
+        if not task.cancelled():
+            task.exception()  # đánh dấu đã lấy, tránh cảnh báo khi mọi bên đã bỏ đi
+
+    def in_flight(self) -> int:
+        """Số lời gọi đang chạy"""
+        with self._lock:
+            return len(self._calls) + len(self._async_calls)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "in_flight": self.in_flight()}
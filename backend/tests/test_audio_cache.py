@@ -0,0 +1,82 @@
+import io
+import os
+import time
+
+import numpy as np
+import pytest
+
+sf = pytest.importorskip("soundfile")
+
+from app.utils.audio_cache import AudioCache
+
+
+def _wav(seconds: float = 0.5, subtype: str = "PCM_16", seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    data = (0.3 * rng.standard_normal(int(24000 * seconds))).astype(np.float32)
+    buffer = io.BytesIO()
+    sf.write(buffer, data, 24000, format="WAV", subtype=subtype)
+    return buffer.getvalue()
+
+
+def test_memory_lru_is_bounded_by_bytes():
+    a, b, c = _wav(seed=1), _wav(seed=2), _wav(seed=3)
+    cache = AudioCache(max_memory_bytes=len(a) * 2 + 10)
+    cache.put("a", a)
+    cache.put("b", b)
+    assert cache.get("a") == (a, "memory")  # a mới dùng, b thành cũ nhất
+    cache.put("c", c)
+
+    assert cache.get("b") == (None, None)
+    assert cache.get("a")[0] == a and cache.get("c")[0] == c
+    stats = cache.get_stats()
+    assert stats["memory_bytes"] == len(a) + len(c)
+    assert stats["memory_evictions"] == 1
+
+    cache.put("a", a)  # ghi lại cùng key không đếm byte hai lần
+    assert cache.get_stats()["memory_bytes"] == len(a) + len(c)
+
+
+@pytest.mark.parametrize("subtype", ["PCM_16", "PCM_24", "FLOAT"])
+def test_disk_hit_returns_the_original_bytes(tmp_path, subtype):
+    audio = _wav(subtype=subtype)
+    AudioCache(max_memory_bytes=0, cache_dir=tmp_path).put("k1", audio)
+
+    restarted = AudioCache(max_memory_bytes=len(audio) * 2, cache_dir=tmp_path)
+    assert restarted.get("k1") == (audio, "disk")
+    assert restarted.get("k1") == (audio, "memory")
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = AudioCache(max_memory_bytes=0, cache_dir=tmp_path, max_disk_bytes=10**9)
+    for i, key in enumerate(("k1", "k2", "k3")):
+        cache.put(key, _wav(seed=i))
+    sizes = {key: size for key, (size, _) in cache._disk.items()}
+    assert cache.get("k1")[1] == "disk"  # k1 mới dùng, k2 thành cũ nhất
+
+    cache.max_disk_bytes = sizes["k1"] + sizes["k3"] + sizes["k2"] // 2
+    cache.put("k4", _wav(seed=4))
+
+    assert cache.get("k2") == (None, None)
+    assert cache.get("k4")[1] == "disk"
+    stats = cache.get_stats()
+    assert stats["disk_bytes"] == sum(size for size, _ in cache._disk.values()) <= cache.max_disk_bytes
+    assert stats["disk_evictions"] >= 1
+    on_disk = {p.stem for p in tmp_path.glob("*/*.flac")}
+    assert on_disk == set(cache._disk)
+
+
+def test_restart_rescan_keeps_lru_order_and_limit(tmp_path):
+    cache = AudioCache(max_memory_bytes=0, cache_dir=tmp_path)
+    for i, key in enumerate(("k1", "k2", "k3")):
+        cache.put(key, _wav(seed=i))
+    now = time.time()
+    for age, key in ((30, "k1"), (20, "k2"), (10, "k3")):
+        _, path = cache._disk[key]
+        os.utime(path, (now - age, now - age))
+    sizes = {key: size for key, (size, _) in cache._disk.items()}
+
+    restarted = AudioCache(max_memory_bytes=0, cache_dir=tmp_path, max_disk_bytes=sizes["k2"] + sizes["k3"])
+    assert list(restarted._disk) == ["k2", "k3"]
+    assert restarted.get_stats()["disk_bytes"] == sizes["k2"] + sizes["k3"]
+    assert restarted.get("k1") == (None, None)
+    assert not any(p.stem == "k1" for p in tmp_path.glob("*/*"))
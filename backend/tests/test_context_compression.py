@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+from app.core.session_store import InMemorySessionStore, SQLiteSessionStore
+from app.utils.context_compression import ContextCompressor
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield InMemorySessionStore()
+    else:
+        store = SQLiteSessionStore(db_path=str(tmp_path / "sessions.db"))
+        yield store
+        store.close()
+
+
+def _drain(compressor):
+    compressor._executor.submit(lambda: None).result(timeout=5)
+
+
+def test_summary_update_is_persisted(store):
+    compressor = ContextCompressor(session_store=store)
+    store.create("s1", "zhuge_liang")
+    compressor.update_async("s1", "Làm sao giữ thành?", "Thưa chủ công, hãy đóng cửa thành và chờ viện binh.")
+    _drain(compressor)
+    assert "giữ thành" in store.get_summary("s1")
+    assert "giữ thành" in compressor.get_summary("s1")
+
+
+def test_queued_update_does_not_leak_into_recreated_session(store):
+    """create -> update_async (còn trong hàng đợi) -> tạo lại cùng id: tóm tắt cũ không được ghi vào session mới"""
+    compressor = ContextCompressor(session_store=store)
+    store.create("s1", "zhuge_liang")
+    compressor.get_summary("s1")  # ctx đã load vào cache
+
+    gate = threading.Event()
+    compressor._executor.submit(gate.wait, 5)  # giữ worker để update nằm trong hàng đợi
+    compressor.update_async("s1", "Làm sao giữ thành?", "Thưa chủ công, hãy đóng cửa thành và chờ viện binh.")
+
+    # như CharacterChatService.start_conversation
+    store.create("s1", "zhuge_liang")
+    compressor.forget("s1")
+    gate.set()
+    _drain(compressor)
+
+    assert store.get_summary("s1") == ""
+    assert compressor.get_summary("s1") == ""
@@ -0,0 +1,78 @@
+import itertools
+from pathlib import Path
+from types import SimpleNamespace
+
+from app.core.greeting_bank import GreetingBank
+from app.models.characters import PREDEFINED_CHARACTERS
+
+
+class _FakeChatAI:
+    def __init__(self):
+        self.config = SimpleNamespace(model_file="toy.gguf", temperature=0.7)
+        self._counter = itertools.count()
+
+    def tokenize(self, text, add_bos=True):
+        return [1, 2, 3]
+
+    def complete(self, prompt, **kwargs):
+        return f"Thưa chủ công, ta là lời chào số {next(self._counter)}."
+
+
+class _FakePromptBuilder:
+    def build_system_prompt(self, character):
+        return f"system {character.id}"
+
+    def get_prefix_token_ids(self, character, tokenize):
+        return tokenize(self.build_system_prompt(character))
+
+    def enhance_response_with_character_traits(self, response, character):
+        return response
+
+    def validate_response(self, text, character):
+        return True, []
+
+    def build_follow_up_questions(self, character, context):
+        return ["Chủ công muốn hỏi gì thêm?"]
+
+
+def _bank(tmp_path):
+    return GreetingBank(
+        chat_ai=_FakeChatAI(),
+        prompt_builder=_FakePromptBuilder(),
+        bank_dir=tmp_path,
+        bank_size=2,
+        synthesize_fn=lambda text, voice: text.encode("utf-8")
+    )
+
+
+def test_rebuild_writes_new_audio_files_and_removes_old(tmp_path):
+    """Sinh lại bank không ghi đè audio đang phục vụ; audio cũ bị xóa sau khi swap"""
+    character = PREDEFINED_CHARACTERS["zhuge_liang"]
+    bank = _bank(tmp_path)
+    bank.build(character)
+    old_entry = bank.get_greeting(character.id)
+    old_file = old_entry["audio_path"]
+    old_bytes = open(old_file, "rb").read()
+
+    bank.build(character)
+    new_entry = bank.get_greeting(character.id)
+    assert new_entry["audio_path"] != old_file
+    assert not Path(old_file).exists()
+    assert open(new_entry["audio_path"], "rb").read() != old_bytes
+
+    files = {p.name for p in (tmp_path / character.id).glob("*.wav")}
+    assert len(files) == 3  # 2 lời chào + 1 follow-up của bank hiện tại
+    for name in files:
+        assert bank.get_audio_path(character.id, name) is not None
+
+
+def test_load_all_reports_stale_banks_without_building(tmp_path):
+    character = PREDEFINED_CHARACTERS["zhuge_liang"]
+    bank = _bank(tmp_path)
+    assert [c.id for c in bank.load_all([character])] == [character.id]
+    assert bank.get_greeting(character.id) is None
+
+    bank.build(character)
+    fresh = _bank(tmp_path)
+    assert fresh.load_all([character]) == []
+    assert fresh.get_greeting(character.id) is not None
@@ -0,0 +1,159 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("x_transformers")
+
+CLONE_VOICE_PATH = Path(__file__).resolve().parent.parent / "app" / "services" / "cloneVoice"
+if str(CLONE_VOICE_PATH) not in sys.path:
+    sys.path.insert(0, str(CLONE_VOICE_PATH))
+
+
+@pytest.fixture(scope="module")
+def toy_tts():
+    """DiT nhỏ với trọng số ngẫu nhiên (float64 để sai khác chỉ còn do padding, không do làm tròn)"""
+    from infer import utils_infer
+    from model import CFM, DiT
+
+    torch.manual_seed(0)
+    vocab = {c: i for i, c in enumerate(" abcdefghijklmnopqrstuvwxyz.,")}
+    model = CFM(
+        transformer=DiT(dim=64, depth=2, heads=2, ff_mult=2, text_dim=32, conv_layers=2, text_num_embeds=len(vocab)),
+        mel_spec_kwargs=dict(n_fft=1024, hop_length=256, win_length=1024, n_mel_channels=100, target_sample_rate=24000),
+        vocab_char_map=vocab,
+    )
+    for p in model.parameters():  # khởi tạo mặc định có adaLN-zero, output gần như hằng
+        torch.nn.init.normal_(p, std=0.2)
+    model = model.eval()
+
+    audio = 0.05 * torch.randn(1, 24000)
+    texts = ["hello world.", "a much longer chunk of text, with more words in it."]
+    chunks = utils_infer.build_chunk_requests((audio, 24000), "ref text. ", texts, device="cpu", seed=7)
+    for chunk in chunks:  # mel tham chiếu tính sẵn ở float32 (filterbank của torchaudio không đổi dtype)
+        chunk.cond = model.mel_spec(chunk.cond).permute(0, 2, 1).to(torch.float64)
+    return utils_infer, model.to(torch.float64), chunks
+
+
+def test_batched_mels_match_solo(toy_tts):
+    """Mel của một chunk không phụ thuộc chunk khác trong batch (cache key không chứa batch)"""
+    utils_infer, model, chunks = toy_tts
+    solo = [utils_infer.sample_chunk_mels([chunk], model, nfe_step=4)[0] for chunk in chunks]
+    batched = utils_infer.sample_chunk_mels(chunks, model, nfe_step=4)
+    for a, b in zip(solo, batched):
+        assert a.shape == b.shape
+        torch.testing.assert_close(a, b, rtol=0, atol=1e-6)
+
+
+def test_duration_buckets_match_unpadded(toy_tts):
+    """Pad độ dài lên bucket (torch.compile) không làm đổi mel"""
+    utils_infer, model, chunks = toy_tts
+    unpadded = [utils_infer.sample_chunk_mels([chunk], model, nfe_step=4)[0] for chunk in chunks]
+    model.duration_buckets = (512, 1024)
+    try:
+        bucketed = [utils_infer.sample_chunk_mels([chunk], model, nfe_step=4)[0] for chunk in chunks]
+    finally:
+        model.duration_buckets = None
+    for a, b in zip(unpadded, bucketed):
+        torch.testing.assert_close(a, b, rtol=0, atol=1e-6)
+
+
+def test_vocos_batch_matches_solo(toy_tts):
+    """Vocode cả batch (có pad) cho cùng wave như vocode từng mel riêng"""
+    utils_infer, _, _ = toy_tts
+    from vocos import Vocos
+    from vocos.feature_extractors import MelSpectrogramFeatures
+    from vocos.heads import ISTFTHead
+    from vocos.models import VocosBackbone
+
+    torch.manual_seed(0)
+    vocoder = Vocos(MelSpectrogramFeatures(), VocosBackbone(100, 64, 128, 3), ISTFTHead(64, 1024, 256)).eval()
+    mels = [torch.randn(100, n) for n in (40, 97, 13)]
+    solo = [utils_infer.vocode_mel_batch([mel], vocoder)[0] for mel in mels]
+    batched = utils_infer.vocode_mel_batch(mels, vocoder)
+    for a, b in zip(solo, batched):
+        assert a.shape == b.shape
+        torch.testing.assert_close(a, b, rtol=0, atol=1e-5)
+
+
+def test_remove_silence_edges_all_silent(toy_tts):
+    """Clip toàn im lặng bị cắt thành rỗng (như pydub), không lỗi reshape"""
+    utils_infer, _, _ = toy_tts
+    import numpy as np
+
+    assert utils_infer.remove_silence_edges(np.zeros(24000, dtype=np.float32), 24000).shape == (0,)
+    assert utils_infer.remove_silence_edges(np.zeros(0, dtype=np.float32), 24000).shape == (0,)
+
+
+def test_training_keeps_unmasked_text_embedding(toy_tts):
+    """Mask theo độ dài chỉ áp dụng khi inference; lúc train text embedding giữ nguyên như checkpoint đã học"""
+    _, model, _ = toy_tts
+    dit = model.transformer
+    cond = torch.randn(2, 40, 100, dtype=torch.float64)
+    text = torch.randint(0, 20, (2, 30))
+    mask = torch.arange(40)[None, :] < torch.tensor([25, 40])[:, None]
+    dit.train()
+    try:
+        with torch.no_grad():
+            masked = dit.prepare(cond, text, mask=mask)["context"]
+            unmasked = dit.prepare(cond, text)["context"]
+    finally:
+        dit.eval()
+    torch.testing.assert_close(masked, unmasked, rtol=0, atol=0)
+
+
+def _solve(sampler, fn, steps, **kwargs):
+    from model.cfm import solve_flow
+
+    calls = []
+
+    def counted(t, x):
+        calls.append(float(t))
+        return fn(t, x)
+
+    t = torch.linspace(0, 1, steps + 1, dtype=torch.float64)
+    x0 = torch.ones(2, 3, 4, dtype=torch.float64)
+    trajectory = solve_flow(counted, x0, t, sampler, **kwargs)
+    return trajectory, len(calls)
+
+
+@pytest.mark.parametrize("sampler", ["euler", "midpoint", "heun", "adaptive"])
+def test_samplers_are_exact_on_straight_flow(sampler):
+    """Vận tốc không đổi (flow thẳng): mọi sampler cho đúng x0 + v"""
+    trajectory, _ = _solve(sampler, lambda t, x: torch.full_like(x, 2.0), steps=8)
+    torch.testing.assert_close(trajectory[-1], torch.full((2, 3, 4), 3.0, dtype=torch.float64))
+
+
+def test_sampler_orders_on_exponential_flow():
+    """dx/dt = x, x(1) = e: euler bậc 1, midpoint/heun bậc 2"""
+    import math
+
+    def error(sampler, steps):
+        trajectory, _ = _solve(sampler, lambda t, x: x, steps=steps)
+        return abs(float(trajectory[-1].flatten()[0]) - math.e)
+
+    for sampler, order in (("euler", 1), ("midpoint", 2), ("heun", 2)):
+        ratio = error(sampler, 8) / error(sampler, 16)
+        assert 2 ** order * 0.8 < ratio < 2 ** order * 1.25, (sampler, ratio)
+    assert error("heun", 8) < error("euler", 8) / 10
+    assert error("midpoint", 8) < error("euler", 8) / 10
+
+
+def test_sampler_evaluation_counts():
+    flow = lambda t, x: x  # noqa: E731
+    assert _solve("euler", flow, steps=8)[1] == 8
+    assert _solve("midpoint", flow, steps=8)[1] == 16
+    assert _solve("heun", flow, steps=8)[1] == 9
+
+
+def test_adaptive_stops_early_on_straight_flow():
+    trajectory, calls = _solve("adaptive", lambda t, x: torch.full_like(x, 2.0), steps=16, adaptive_tol=0.05)
+    assert calls < 16
+    assert len(trajectory) < 17
+    torch.testing.assert_close(trajectory[-1], torch.full((2, 3, 4), 3.0, dtype=torch.float64))
+
+
+def test_unknown_sampler_is_rejected():
+    with pytest.raises(ValueError):
+        _solve("rk4", lambda t, x: x, steps=4)
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("chromadb")
+
+from app.core.rag_agent import RAGAgent
+from app.models.characters import PREDEFINED_CHARACTERS, AdviceRequest
+
+
+class _SlowChatAI:
+    """LLM giả: sinh mất một lúc (đồng bộ, như llama.cpp) và đếm số lần sinh"""
+
+    def __init__(self, delay: float = 0.3):
+        self.config = SimpleNamespace(model_file="toy.gguf", temperature=0.7, top_p=0.9, top_k=40, max_tokens=64)
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def chat(self, prompt, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return "Ta khuyên ngươi hãy kiên nhẫn."
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setattr(RAGAgent, "_initialize", lambda self: None)
+    agent = RAGAgent()
+    monkeypatch.setattr(agent, "retrieve_relevant_context", lambda query, character_id, top_k=None: [])
+    return agent
+
+
+def test_overlapping_identical_advice_requests_generate_once(agent):
+    """Request trùng đến khi lần sinh đầu còn chạy phải gắn vào nó (event loop không bị chặn)"""
+    character = PREDEFINED_CHARACTERS["zhuge_liang"]
+    chat_ai = _SlowChatAI()
+    request = AdviceRequest(user_question="Làm sao để kiên nhẫn?", character_id=character.id)
+
+    async def run():
+        async def delayed(delay):
+            await asyncio.sleep(delay)
+            return await agent.get_advice(request, character, chat_ai)
+
+        return await asyncio.gather(*(delayed(0.1 * i) for i in range(3)))
+
+    responses = asyncio.run(run())
+    assert chat_ai.calls == 1
+    assert len({r.advice for r in responses}) == 1
@@ -0,0 +1,112 @@
+import sqlite3
+import time
+
+import pytest
+
+from app.core.session_store import InMemorySessionStore, SQLiteSessionStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    stores = []
+
+    def _make(**kwargs):
+        if request.param == "memory":
+            store = InMemorySessionStore(**kwargs)
+        else:
+            store = SQLiteSessionStore(db_path=str(tmp_path / "sessions.db"), **kwargs)
+        stores.append(store)
+        return store
+
+    yield _make
+    for store in stores:
+        if isinstance(store, SQLiteSessionStore):
+            store.close()
+
+
+def test_idle_sessions_expire(make_store):
+    store = make_store(idle_ttl_seconds=0.05)
+    store.create("s1", "zhuge_liang")
+    assert store.exists("s1")
+    time.sleep(0.1)
+    assert not store.exists("s1")
+    assert store.get_turns("s1") == []
+    assert store.get_stats()["evicted_ttl"] == 1
+
+
+def test_least_recently_used_session_is_evicted(make_store):
+    store = make_store(max_sessions=2)
+    store.create("s1", "zhuge_liang")
+    store.create("s2", "zhuge_liang")
+    time.sleep(0.01)
+    store.append_turn("s1", {"user": "hỏi", "assistant": "đáp"})  # s1 vừa dùng, s2 cũ nhất
+    store.create("s3", "zhuge_liang")
+
+    assert store.exists("s1") and store.exists("s3")
+    assert not store.exists("s2")
+    assert len(store) == 2
+
+
+def test_turns_are_capped_per_session(make_store):
+    store = make_store(max_turns_per_session=2)
+    store.create("s1", "zhuge_liang")
+    for i in range(3):
+        total = store.append_turn("s1", {"user": f"q{i}", "assistant": f"a{i}"})
+    assert total == 3
+    assert [t["user"] for t in store.get_turns("s1")] == ["q1", "q2"]
+    assert store.get_meta("s1")["total_turns"] == 3
+
+
+def test_recreate_resets_turns_and_summary(make_store):
+    store = make_store()
+    store.create("s1", "zhuge_liang")
+    store.append_turn("s1", {"user": "q", "assistant": "a"})
+    assert store.set_summary("s1", "tóm tắt")
+    created_at = store.get_meta("s1")["created_at"]
+
+    store.create("s1", "zhuge_liang")
+    assert store.get_turns("s1") == []
+    assert store.get_summary("s1") == ""
+    assert not store.set_summary("s1", "cũ", created_at=created_at)
+    assert store.get_meta("s1")["created_at"] > created_at
+
+
+def test_invalid_turn_cap_is_rejected():
+    with pytest.raises(ValueError):
+        InMemorySessionStore(max_turns_per_session=0)
+
+
+def test_sqlite_migrates_database_without_summary_column(tmp_path):
+    """Database tạo trước khi có cột summary vẫn mở được, session cũ giữ nguyên"""
+    db_path = tmp_path / "sessions.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.executescript(
+        """
+        CREATE TABLE sessions (
+            session_id TEXT PRIMARY KEY,
+            character_id TEXT,
+            created_at REAL NOT NULL,
+            last_activity REAL NOT NULL,
+            total_turns INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE turns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL REFERENCES sessions(session_id) ON DELETE CASCADE,
+            payload TEXT NOT NULL
+        );
+        """
+    )
+    now = time.time()
+    conn.execute("INSERT INTO sessions VALUES ('old', 'zhuge_liang', ?, ?, 1)", (now, now))
+    conn.execute("INSERT INTO turns (session_id, payload) VALUES ('old', '{\"user\": \"q\", \"assistant\": \"a\"}')")
+    conn.commit()
+    conn.close()
+
+    store = SQLiteSessionStore(db_path=str(db_path))
+    try:
+        assert store.get_turns("old") == [{"user": "q", "assistant": "a"}]
+        assert store.get_summary("old") == ""
+        assert store.set_summary("old", "tóm tắt")
+        assert store.get_summary("old") == "tóm tắt"
+    finally:
+        store.close()
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.utils.single_flight import SingleFlight, make_key
+
+
+def test_make_key_normalizes_equivalent_requests():
+    assert make_key("  Làm sao  giữ thành? ", top_k=5) == make_key("làm sao giữ thành?", top_k=5)
+    assert make_key("a", temperature=0.7) != make_key("a", temperature=0.8)
+
+
+def test_concurrent_threads_share_one_execution():
+    flight = SingleFlight("test")
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.2)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", work))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ["result"] * 4
+    assert len(calls) == 1
+    assert flight.get_stats()["coalesced"] == 3
+
+
+def test_async_follower_survives_leader_cancellation():
+    """Leader bị hủy (client ngắt kết nối) không làm hỏng lời gọi chung của follower"""
+    flight = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return "result"
+
+    async def run():
+        leader = asyncio.ensure_future(flight.do_async("k", work))
+        await asyncio.sleep(0.05)
+        follower = asyncio.ensure_future(flight.do_async("k", work))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == "result"
+    assert len(calls) == 1
+    assert flight.in_flight() == 0
+
+
+def test_async_error_is_shared_and_key_is_released():
+    flight = SingleFlight("test")
+
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise ValueError("boom")
+
+    async def run():
+        results = await asyncio.gather(flight.do_async("k", fail), flight.do_async("k", fail), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+        assert flight.in_flight() == 0
+
+        async def ok():
+            return "again"
+
+        return await flight.do_async("k", ok)
+
+    assert asyncio.run(run()) == "again"
+    assert flight.get_stats()["executions"] == 2
@@ -0,0 +1,117 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.tts_scheduler import TTSQueueFullError, TTSScheduler
+
+
+class _GatedSampler:
+    """sample_fn giả: batch đầu tiên chờ gate (để các request sau xếp hàng), ghi lại mọi batch"""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.entered = threading.Event()
+        self.batches = []
+
+    def __call__(self, chunks, **params):
+        self.batches.append(([c.name for c in chunks], params))
+        self.entered.set()
+        self.gate.wait(5)
+        return [f"{c.name}@{params.get('nfe_step')}" for c in chunks]
+
+
+def _chunks(prefix, durations):
+    return [SimpleNamespace(name=f"{prefix}{i}", duration=d) for i, d in enumerate(durations)]
+
+
+@pytest.fixture
+def sampler():
+    sampler = _GatedSampler()
+    yield sampler
+    sampler.gate.set()
+
+
+def _scheduler(sampler, **kwargs):
+    kwargs.setdefault("max_wait_ms", 5)
+    return TTSScheduler(sampler, **kwargs)
+
+
+def test_chunks_are_batched_only_with_matching_params(sampler):
+    scheduler = _scheduler(sampler, max_batch_size=8)
+    try:
+        blocker = scheduler.submit(_chunks("x", [100]), {"nfe_step": 32})
+        assert sampler.entered.wait(5)
+
+        a = scheduler.submit(_chunks("a", [100, 120]), {"nfe_step": 32})
+        b = scheduler.submit(_chunks("b", [110]), {"nfe_step": 16})
+        c = scheduler.submit(_chunks("c", [90]), {"nfe_step": 32})
+        sampler.gate.set()
+
+        assert a.result(5) == ["a0@32", "a1@32"]
+        assert b.result(5) == ["b0@16"]
+        assert c.result(5) == ["c0@32"]
+        assert blocker.result(5) == ["x0@32"]
+    finally:
+        scheduler.shutdown()
+
+    batches = [(sorted(names), params) for names, params in sampler.batches[1:]]
+    assert (["a0", "a1", "c0"], {"nfe_step": 32}) in batches
+    assert (["b0"], {"nfe_step": 16}) in batches
+    assert len(batches) == 2
+
+
+def test_batch_respects_frame_budget(sampler):
+    scheduler = _scheduler(sampler, max_batch_size=8, max_batch_frames=250)
+    try:
+        scheduler.submit(_chunks("x", [10]), {})
+        assert sampler.entered.wait(5)
+        future = scheduler.submit(_chunks("a", [100, 100, 100]), {})
+        sampler.gate.set()
+        assert len(future.result(5)) == 3
+    finally:
+        scheduler.shutdown()
+    assert all(len(names) * 100 <= 250 for names, _ in sampler.batches[1:])
+    assert scheduler.get_stats()["batches"] == 3
+
+
+def test_full_queue_applies_backpressure(sampler):
+    scheduler = _scheduler(sampler, max_queue_chunks=2)
+    try:
+        running = scheduler.submit(_chunks("x", [10]), {})
+        assert sampler.entered.wait(5)
+        queued = scheduler.submit(_chunks("a", [10, 10]), {})
+
+        with pytest.raises(TTSQueueFullError):
+            scheduler.submit(_chunks("b", [10]), {}, block=False)
+        start = time.time()
+        with pytest.raises(TTSQueueFullError):
+            scheduler.submit(_chunks("b", [10]), {}, timeout=0.05)
+        assert time.time() - start >= 0.04
+        assert scheduler.get_stats()["rejected_requests"] == 2
+
+        # Một submit đang chờ được nhận ngay khi worker lấy chunk ra khỏi hàng đợi
+        waiting = {}
+        thread = threading.Thread(target=lambda: waiting.setdefault("f", scheduler.submit(_chunks("c", [10]), {})))
+        thread.start()
+        sampler.gate.set()
+        thread.join(5)
+        assert waiting["f"].result(5) == ["c0@None"]
+        assert running.result(5) and queued.result(5)
+    finally:
+        scheduler.shutdown()
+
+
+def test_failed_batch_fails_every_request_in_it():
+    def sample_fn(chunks, **params):
+        raise RuntimeError("out of memory")
+
+    scheduler = TTSScheduler(sample_fn, max_wait_ms=5)
+    try:
+        future = scheduler.submit(_chunks("a", [10, 10]), {})
+        with pytest.raises(RuntimeError, match="out of memory"):
+            future.result(5)
+        assert scheduler.get_stats()["failed_requests"] == 1
+    finally:
+        scheduler.shutdown()
@@ -29,7 +29,7 @@ def demo_character_conversation():
         
         # Start conversation
         print("🔄 Đang khởi tạo cuộc trò chuyện...")
-        success, greeting, session_id = chat_service.start_conversation("zhuge_liang")
+        success, greeting, session_id, _ = chat_service.start_conversation("zhuge_liang")
         
         if not success:
             print(f"❌ Khởi tạo thất bại: {greeting}")
@@ -0,0 +1,72 @@
+# scripts/setup/build_greeting_bank.py
+
+"""
+Script sinh sẵn greeting bank cho các nhân vật (chạy offline)
+Sinh K lời chào đã validate (kèm audio TTS nếu có --with-audio) và lưu vào data/greetings
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add backend directory to Python path
+backend_dir = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_dir))
+
+from app.core.ai_models import get_chat_ai
+from app.core.advanced_prompt_builder import get_qwen_prompt_builder
+from app.core.greeting_bank import GreetingBank, create_tts_synthesize_fn
+from app.models.characters import PREDEFINED_CHARACTERS
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build precomputed greeting bank")
+    parser.add_argument("--k", type=int, default=5, help="Number of greetings per character")
+    parser.add_argument("--with-audio", action="store_true", help="Also synthesize TTS audio")
+    parser.add_argument("--characters", nargs="*", default=None, help="Character ids (default: all)")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the bank is up to date")
+    return parser.parse_args()
+
+
+def main():
+    """Main function"""
+    args = parse_args()
+
+    chat_ai = get_chat_ai()
+    if not chat_ai.is_loaded and not chat_ai.load_model():
+        logger.error("Failed to load chat model!")
+        return False
+
+    bank = GreetingBank(
+        chat_ai=chat_ai,
+        prompt_builder=get_qwen_prompt_builder(),
+        bank_size=args.k,
+        synthesize_fn=create_tts_synthesize_fn() if args.with_audio else None
+    )
+
+    character_ids = args.characters or list(PREDEFINED_CHARACTERS.keys())
+    success = True
+    for character_id in character_ids:
+        character = PREDEFINED_CHARACTERS.get(character_id)
+        if character is None:
+            logger.error(f"Unknown character: {character_id}")
+            success = False
+            continue
+
+        if not args.force and bank.load(character):
+            logger.info(f"Greeting bank for {character.name} is up to date, skipping")
+            continue
+
+        if bank.build(character) == 0:
+            logger.error(f"No greetings generated for {character.name}")
+            success = False
+
+    return success
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
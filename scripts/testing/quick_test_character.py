@@ -25,7 +25,7 @@ def test_character_response():
         chat_service = get_character_chat_service()
         
         # Start conversation
-        success, greeting, session_id = chat_service.start_conversation("zhuge_liang")
+        success, greeting, session_id, _ = chat_service.start_conversation("zhuge_liang")
         
         if not success:
             print(f"❌ Failed to start: {greeting}")